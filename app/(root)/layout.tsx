@@ -3,6 +3,7 @@
 import Sidebar from "@/components/Sidebar";
 import RightSidebar from "@/components/RightSideBar";
 import { useState, useEffect } from "react";
+import { subscribeDashboardStream } from "@/lib/dashboardStream";
 
 type AlarmData = {
   Symbol: string;
@@ -18,29 +19,11 @@ export default function RootLayout({
 }) {
   const [alarms, setAlarms] = useState<AlarmData[]>([]);
 
-  // ✅ Fetch alarms only
-  const fetchAlarms = async (): Promise<AlarmData[]> => {
-    try {
-      const response = await fetch("http://localhost:8080/api/alarms");
-      if (!response.ok) throw new Error("Failed to fetch alarms");
-      return await response.json();
-    } catch (error) {
-      console.error("Error fetching alarms:", error);
-      return [];
-    }
-  };
-
-  // ✅ Fetch periodically (every minute)
+  // ✅ Alarms pushed from the backend stream (snapshot first, then only new ones)
   useEffect(() => {
-    const updateAlarms = async () => {
-      const fetchedAlarms = await fetchAlarms();
-      setAlarms(fetchedAlarms);
-    };
-
-    updateAlarms(); // Initial fetch
-    const intervalId = setInterval(updateAlarms, 10 * 1000);
-
-    return () => clearInterval(intervalId);
+    return subscribeDashboardStream("alarms", (rows) => {
+      setAlarms(rows as unknown as AlarmData[]);
+    });
   }, []);
 
   return (
@@ -10,6 +10,7 @@ import {
   TableCell,
   TableCaption,
 } from "@/components/ui/table";
+import { subscribeDashboardStream } from "@/lib/dashboardStream";
 
 type LastRow = Record<string, string | number>;
 
@@ -17,37 +18,24 @@ export const LastRowsTable: React.FC = () => {
   const [data, setData] = React.useState<LastRow[]>([]);
   const [error, setError] = React.useState<string | null>(null);
 
-  const fetchData = async () => {
-    try {
-      const res = await fetch("http://127.0.0.1:8080/api/tables/last_rows");
-      if (!res.ok) throw new Error("Failed to fetch table data");
-      const json = await res.json();
-
-      // Convert object to array and sort by Relatr descending
-      const rows: LastRow[] = Object.values(json.last_rows || []).filter(Boolean) as LastRow[];
-      rows.sort((a, b) => (b.Rvol as number) - (a.Rvol as number));
-
-      setData(rows);
-            setError(null); // Clear any previous error
-        } catch (err: unknown) {
-            if (err instanceof Error) {
-            setError(err.message);
-            } else {
-            setError(String(err));
-            }
-
-        }
-        };
-
-
   React.useEffect(() => {
-    // Initial fetch in the background
-    fetchData();
+    // Last rows are pushed by the backend stream whenever a table gets a new row
+    return subscribeDashboardStream("last_rows", (lastRows) => {
+      try {
+        // Convert object to array and sort by Relatr descending
+        const rows: LastRow[] = Object.values(lastRows || {}).filter(Boolean) as LastRow[];
+        rows.sort((a, b) => (b.Rvol as number) - (a.Rvol as number));
 
-    // Fetch every 10 seconds
-    const intervalId = setInterval(fetchData, 10000);
-
-    return () => clearInterval(intervalId);
+        setData(rows);
+        setError(null); // Clear any previous error
+      } catch (err: unknown) {
+        if (err instanceof Error) {
+          setError(err.message);
+        } else {
+          setError(String(err));
+        }
+      }
+    });
   }, []);
 
   const displayedColumns = ["Symbol", "Time", "Relatr", "Rvol"];
@@ -1,12 +1,6 @@
 import React, { useEffect, useState } from "react";
 import { Card, CardContent } from "@/components/ui/card";
-
-
-// Interface for fetching tables
-interface TableResponse {
-  tables: string[];
-}
-
+import { subscribeDashboardStream } from "@/lib/dashboardStream";
 
 
 const TablesList: React.FC = () => {
@@ -19,30 +13,13 @@ const TablesList: React.FC = () => {
   const [stopLevels, setStopLevels] = useState<string[]>([]); // State for fetched stop levels
   const [apiResponse, setApiResponse] = useState<string | null>(null); // State for API response
 
-  // Fetch tables (tickers) from backend
-  const fetchTables = async () => {
-    try {
-      const response = await fetch("http://127.0.0.1:8080/api/tables");
-      if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-      const data: TableResponse = await response.json();
-      const upperTables = data.tables.map((t) => t.toUpperCase());
-      setTables(upperTables);
+  // Tables (tickers) pushed by the backend stream whenever the set of tables changes
+  useEffect(() => {
+    return subscribeDashboardStream("tables", (tableNames) => {
+      setTables(tableNames.map((t) => t.toUpperCase()));
       setError(null); // Clear any previous error
-    } catch (err: unknown) {
-      if (err instanceof Error) {
-        setError(err.message);
-      } else {
-        setError(String(err));
-      }
-    } finally {
       setLoading(false);
-    }
-  };
-
-  useEffect(() => {
-    fetchTables();
-    const intervalId = setInterval(fetchTables, 10000); // Fetch every 10 seconds
-    return () => clearInterval(intervalId);
+    });
   }, []);
 
   // Adjust font size based on the length of table name
@@ -101,7 +101,9 @@ const PositionTable = ({ onComplete }: { onComplete: () => void }) => {
       const data = await response.json();
       console.log("Order response:", data);
           // Determine color based on entry_allowed
-      const colorClass = data.entry_allowed ? "bg-green-600" : "bg-red-600";
+      // "unknown": the order may have been sent, so it is marked sent to block a duplicate retry
+      const colorClass =
+        data.status === "unknown" ? "bg-yellow-600" : data.entry_allowed ? "bg-green-600" : "bg-red-600";
 
       // Show popup with color
       setPopupMessage({ text: data.message, colorClass });
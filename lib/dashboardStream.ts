@@ -0,0 +1,146 @@
+// Shared connection to the backend's server-sent events stream (/api/stream).
+// All dashboard components subscribe through here so one browser tab keeps
+// only one open stream (each stream holds a backend worker thread).
+// The backend sends a snapshot first and then only deltas; this module folds
+// them into the current state and hands listeners the full, up-to-date value.
+
+const API_URL = "http://127.0.0.1:8080/api";
+const STREAM_URL = `${API_URL}/stream`;
+
+// While the stream is down the dashboard falls back to the old REST polling
+const FALLBACK_POLL_MS = 10000;
+const REOPEN_DELAY_MS = 5000;
+
+type Row = Record<string, string | number>;
+
+type AlarmsPayload = { reset: boolean; alarms: Row[] };
+type LastRowsPayload = { reset: boolean; rows: Record<string, Row | null>; removed: string[] };
+type TablesPayload = { tables: string[] };
+
+export type DashboardState = {
+  alarms: Row[];
+  last_rows: Record<string, Row | null>;
+  tables: string[];
+};
+
+export type DashboardEvent = keyof DashboardState;
+
+type Listener = (value: DashboardState[DashboardEvent]) => void;
+
+const state: Partial<DashboardState> = {};
+const listeners: { [K in DashboardEvent]: Set<Listener> } = {
+  alarms: new Set(),
+  last_rows: new Set(),
+  tables: new Set(),
+};
+let source: EventSource | null = null;
+let fallbackTimer: ReturnType<typeof setInterval> | null = null;
+let reopenTimer: ReturnType<typeof setTimeout> | null = null;
+
+const publish = (event: DashboardEvent) => {
+  const value = state[event];
+  if (value !== undefined) listeners[event].forEach((listener) => listener(value));
+};
+
+const getJson = async (path: string) => {
+  const response = await fetch(`${API_URL}${path}`);
+  if (!response.ok) throw new Error(`${path}: HTTP ${response.status}`);
+  return response.json();
+};
+
+const pollOnce = async () => {
+  const [alarms, lastRows, tables] = await Promise.allSettled([
+    getJson("/alarms"),
+    getJson("/tables/last_rows"),
+    getJson("/tables"),
+  ]);
+  if (alarms.status === "fulfilled") {
+    state.alarms = alarms.value;
+    publish("alarms");
+  }
+  if (lastRows.status === "fulfilled") {
+    state.last_rows = lastRows.value.last_rows;
+    publish("last_rows");
+  }
+  if (tables.status === "fulfilled") {
+    state.tables = tables.value.tables;
+    publish("tables");
+  }
+};
+
+const startFallback = () => {
+  if (fallbackTimer) return;
+  console.warn("Dashboard stream unavailable, polling instead");
+  pollOnce().catch((err) => console.error("Dashboard poll failed:", err));
+  fallbackTimer = setInterval(() => {
+    pollOnce().catch((err) => console.error("Dashboard poll failed:", err));
+  }, FALLBACK_POLL_MS);
+};
+
+const stopFallback = () => {
+  if (fallbackTimer) clearInterval(fallbackTimer);
+  fallbackTimer = null;
+};
+
+const openStream = () => {
+  // EventSource reconnects by itself; the backend then sends a fresh snapshot
+  source = new EventSource(STREAM_URL);
+
+  source.onopen = () => stopFallback();
+
+  source.onerror = () => {
+    startFallback();
+    // CLOSED: the browser gave up (e.g. an HTTP error), open a new stream later ourselves
+    if (source && source.readyState === EventSource.CLOSED && !reopenTimer) {
+      source.close();
+      reopenTimer = setTimeout(() => {
+        reopenTimer = null;
+        if (source) openStream();
+      }, REOPEN_DELAY_MS);
+    }
+  };
+
+  source.addEventListener("alarms", (e) => {
+    const data: AlarmsPayload = JSON.parse((e as MessageEvent).data);
+    state.alarms = data.reset ? data.alarms : [...(state.alarms ?? []), ...data.alarms];
+    publish("alarms");
+  });
+
+  source.addEventListener("last_rows", (e) => {
+    const data: LastRowsPayload = JSON.parse((e as MessageEvent).data);
+    const rows = data.reset ? { ...data.rows } : { ...(state.last_rows ?? {}), ...data.rows };
+    data.removed.forEach((table) => delete rows[table]);
+    state.last_rows = rows;
+    publish("last_rows");
+  });
+
+  source.addEventListener("tables", (e) => {
+    const data: TablesPayload = JSON.parse((e as MessageEvent).data);
+    state.tables = data.tables;
+    publish("tables");
+  });
+};
+
+export const subscribeDashboardStream = <K extends DashboardEvent>(
+  event: K,
+  listener: (value: DashboardState[K]) => void
+): (() => void) => {
+  listeners[event].add(listener as Listener);
+  if (!source) openStream();
+
+  // Late subscribers get the current state right away
+  const current = state[event];
+  if (current !== undefined) listener(current as DashboardState[K]);
+
+  return () => {
+    listeners[event].delete(listener as Listener);
+    const remaining = Object.values(listeners).reduce((sum, set) => sum + set.size, 0);
+    if (remaining === 0 && source) {
+      source.close();
+      source = null;
+      stopFallback();
+      if (reopenTimer) clearTimeout(reopenTimer);
+      reopenTimer = null;
+    }
+  };
+};
@@ -1,7 +1,8 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import asyncio
 import subprocess
+import time
+import numpy as np
 from dataclasses import asdict
 from waitress import serve
 from backend_store import exit_requests
@@ -15,20 +16,34 @@ logger.info("Application backend starting")
 
 
 from pathlib import Path
-from common.calculate import calculate_position_size
+from datetime import date
+from common.calculate import calculate_position_size, calculate_position_sizes
 from common.read_configs_in import *
 from database.db_functions import *
 from alpacaAPI import process_open_orders
 from ibclient import *
 from helpers.handle_place_order import *
 from helpers.handle_open_risks import handle_open_risk
-from helpers.detect_stoplevel import detect_stoplevel
-from helpers.handle_executions import is_entry_allowed
-from helpers.utils import log_scan_results, sanitize_for_json
+from helpers.detect_stoplevel import StopLevelService
+from helpers.handle_executions import ExecutionIndex, is_entry_allowed
+from helpers.utils import sanitize_for_json
 from helpers.handle_rvol_operations import *
-from scanner.scan import run_scanner
+from scanner.scan import get_presets, run_scanner
+from scanner.scan_results import ScanResultCache, build_multi_scan_results, build_scan_results, size_scan_rows
+from scanner.scanner_presets import SCANNER_PRESETS
+from scanner.live_scanner import LiveScanner
 from helpers.handle_market_scan import *
-from portfoliomanager.manager import PortfolioManager
+from portfoliomanager.manager import PortfolioManager, run_automated_exit
+from ibsession.session import IBSession, JobOutcomeUnknown
+from ibsession.quote_service import QuoteService
+from ibsession.contract_cache import contract_cache
+from ibsession.live_bars import LiveBarEngine
+from portfoliomanager.portfolio_state import PortfolioState
+from portfoliomanager.risk_engine import RiskEngine
+from database.bar_store import BarStore
+from common.volume_profile import VolumeProfileStore
+from common.indicators import IndicatorEngine
+from helpers.dashboard_feed import DashboardFeed, alarm_cursor, parse_alarm_cursor, serialize_alarm
 
 
 
@@ -36,6 +51,109 @@ from portfoliomanager.manager import PortfolioManager
 project_config = read_project_config(filename='config.json')
 database_config = read_database_config(filename="database.ini", section="livestream")
 
+# One shared IB connection for the whole process, all IB work is queued to it
+ib_session = IBSession(
+    host=project_config["host"],
+    port=project_config["port"],
+    client_id=project_config["clientId"],
+    poll_interval=project_config.get("ib_poll_interval", 0.05),
+    health_interval=project_config.get("ib_health_interval", 10.0),
+)
+
+# Positions / orders / account values kept current from IB streaming events
+portfolio_state = PortfolioState()
+ib_session.add_connect_callback(portfolio_state.attach)
+
+# Portfolio risk totals, updated on every position / order / account / price event
+risk_engine = RiskEngine(portfolio_state, project_config)
+ib_session.add_connect_callback(risk_engine.attach)
+
+# Qualified contracts survive restarts, IB is only asked for new symbols
+if project_config.get("contract_cache_file"):
+    contract_cache.configure(project_config["contract_cache_file"])
+
+# Streaming quotes shared by all price lookups, idle lines are released (LRU + TTL)
+quote_service = QuoteService(
+    max_lines=project_config.get("quote_max_lines", 80),
+    ttl=project_config.get("quote_ttl_seconds", 300),
+)
+ib_session.add_connect_callback(quote_service.attach)
+
+# Last fill per symbol for the order-entry frequency check
+execution_index = ExecutionIndex()
+ib_session.add_connect_callback(execution_index.attach)
+
+# Upper bound for the single IB job behind /api/place-order
+ORDER_ENTRY_TIMEOUT = project_config.get("order_entry_timeout", 5.0)
+
+# Local intraday bar cache, closed sessions are never downloaded twice
+bar_store = BarStore(project_config.get("bar_cache_dir", "bar_cache"))
+
+# Per-symbol average volume curves, rebuilt once per session
+volume_profiles = VolumeProfileStore(
+    lookback=project_config.get("rvol_lookback_days", 5),
+    method=project_config.get("rvol_method", "mean"),
+)
+
+# Keep-up-to-date bars for watched symbols, RVOL and indicators updated on every bar
+live_bars = LiveBarEngine(
+    volume_profiles, bar_store=bar_store,
+    max_symbols=project_config.get("live_bar_max_symbols", 40),
+    indicators=IndicatorEngine(
+        ema_period=project_config.get("ema_period", 9),
+        atr_period=project_config.get("atr_period", 14),
+    ),
+)
+ib_session.add_connect_callback(live_bars.attach)
+
+# Bars read per ticker table when its indicators are first needed
+INDICATOR_SEED_ROWS = project_config.get("indicator_seed_rows", 500)
+
+
+def load_indicator_rows(ticker: str):
+    """IndicatorEngine loader: the latest rows of the ticker's table."""
+    return fetch_last_n_rows(database_config, ticker, INDICATOR_SEED_ROWS)
+
+
+# VWAP / EMA / ATR per ticker table, seeded once and then extended from the feed's last rows
+table_indicators = IndicatorEngine(
+    ema_period=project_config.get("ema_period", 9),
+    atr_period=project_config.get("atr_period", 14),
+    loader=load_indicator_rows,
+)
+
+# Pushes new alarms / last rows / table changes to the dashboard over SSE
+dashboard_feed = DashboardFeed(
+    database_config, interval=project_config.get("dashboard_feed_interval", 1.0), indicators=table_indicators,
+    full_poll_interval=project_config.get("dashboard_full_poll_interval", 30.0),
+)
+dashboard_feed.add_listener(table_indicators.on_last_rows)
+
+# Rolling bar windows per ticker for /api/stoplevel, extended from the feed's last rows
+stop_levels = StopLevelService(
+    database_config, window=project_config.get("stop_window_bars", 60), indicators=table_indicators
+)
+dashboard_feed.add_listener(stop_levels.on_last_rows)
+
+# Max alarms returned per /api/alarms?since= call
+ALARMS_PAGE_SIZE = project_config.get("alarms_page_size", 500)
+
+# Scanner results per preset; identical concurrent scans share one run
+# RVOL minute keys are in exchange time, the same slots as the volume profiles
+SCANNER_TIME_ZONE = volume_profiles.exchange_tz
+scan_cache = ScanResultCache(
+    ttl=project_config.get("scan_cache_ttl", 30),
+    stale_ttl=project_config.get("scan_cache_stale_seconds", 300),
+)
+
+# Streaming scanner subscriptions, only new entrants get enriched
+live_scanner = LiveScanner(
+    ib_session, SCANNER_TIME_ZONE, bar_store=bar_store, volume_profiles=volume_profiles, live_bars=live_bars,
+    refresh_after=project_config.get("live_scan_refresh_seconds", 300),
+    idle_timeout=project_config.get("live_scan_idle_seconds", 600),
+)
+ib_session.add_connect_callback(live_scanner.attach)
+
 app = Flask(__name__)
 CORS(app)
 
@@ -102,25 +220,76 @@ def save_input_tickers():
 
 @app.route("/api/alarms", methods=['GET'])
 def get_alarms():
+    """
+    Alarms, oldest first.
+
+    - /api/alarms                   today's alarms as a list
+    - /api/alarms?date=YYYY-MM-DD   one day, date=all for the whole table
+    - /api/alarms?since=<cursor>    only alarms after the cursor:
+                                    {"alarms": [...], "cursor": "<next cursor>", "has_more": bool}
+      An empty since starts from today. Pass the returned cursor back to get the next rows;
+      it identifies the last alarm exactly, so alarms sharing its timestamp are not skipped.
+    """
     try:
-        # Fetch alarms using your helper
-        alarms = fetch_alarms(database_config)
+        since = request.args.get("since")
+        day = request.args.get("date")
+        on_date = None if day == "all" else (day or date.today().isoformat())
+
+        # --- Cursor mode: only what is new since the last call ---
+        if since is not None:
+            try:
+                limit = int(request.args.get("limit", ALARMS_PAGE_SIZE))
+            except ValueError:
+                return jsonify({"error": f"Invalid limit: {request.args.get('limit')}"}), 400
+            if limit < 1:
+                return jsonify({"error": "limit must be positive"}), 400
+            limit = min(limit, ALARMS_PAGE_SIZE)
+
+            if since:
+                try:
+                    after_date, after_time, inclusive, after_key = parse_alarm_cursor(since)
+                except ValueError:
+                    return jsonify({"error": f"Invalid since cursor: {since}"}), 400
+                alarms = fetch_alarms_after(
+                    database_config, after_date, after_time, inclusive=inclusive, limit=limit, after_key=after_key
+                )
+            else:
+                alarms = fetch_alarms_after(database_config, on_date=on_date, limit=limit)
+
+            if alarms is None:
+                logger.error("Failed to fetch alarms.")
+                return jsonify({"error": "Failed to fetch alarms."}), 500
+
+            alarms = [serialize_alarm(a) for a in alarms]
+            cursor = alarm_cursor(alarms[-1]) if alarms else since
+            return jsonify({"alarms": alarms, "cursor": cursor, "has_more": len(alarms) == limit}), 200
+
+        # --- List mode: one day (today by default) ---
+        alarms = fetch_alarms_after(database_config, on_date=on_date)
 
         if alarms is None:
             logger.error("Failed to fetch alarms.")
             return jsonify({"error": "Failed to fetch alarms."}), 500
 
         # Convert any date/time objects to strings
-        for alarm in alarms:
-            for key in ['Date', 'Time']:
-                if key in alarm and not isinstance(alarm[key], str):
-                    alarm[key] = str(alarm[key])
-
-        return jsonify(alarms), 200
+        return jsonify([serialize_alarm(a) for a in alarms]), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/stream", methods=['GET'])
+def dashboard_stream():
+    """
+    Server-sent events stream for the dashboard.
+    Events: 'alarms', 'last_rows' and 'tables'; each starts with a full snapshot
+    and then only carries what changed.
+    """
+    return Response(
+        dashboard_feed.stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route("/api/tables", methods=['GET'])
 def get_table_names():
     """
@@ -246,16 +415,8 @@ def deactivate_by_orderid():
         }), 500
 @app.route("/api/open-orders", methods=['GET'])
 def get_orders_data():
-    ib = IB()
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
     try:
-
-        ib.connect(host = project_config["host"],
-                    port = project_config["port"], 
-                    clientId = project_config["clientId"])
-        
-        orders = process_open_orders(ib, project_config,database_config)
+        orders = ib_session.run(process_open_orders, project_config, database_config, quotes=quote_service, timeout=60)
 
         if not orders:
             return jsonify({
@@ -275,34 +436,107 @@ def get_orders_data():
         logger.error("Error fetching Alpaca orders: %s", e)
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-    finally:
-        ib.disconnect()
-        loop.close()
+def check_portfolio_risk(order):
+    """risk_check for submit_order_fast: what-if of the sized order against the portfolio caps."""
+    result = risk_engine.what_if(order.symbol, order.action, order.position_size, order.entry_price, order.stop_price)
+    return result.allowed, "; ".join(result.reasons)
+
+@app.route("/api/portfolio-risk", methods=['GET', 'POST'])
+def get_portfolio_risk():
+    """
+    GET:  portfolio open risk, risk % of NetLiquidation, margin headroom and per-symbol breakdown.
+    POST: what-if for a proposed order {symbol, entry_price, stop_price[, position_size]};
+          without position_size it is sized with calculate_position_size.
+    """
+    try:
+        if request.method == 'GET':
+            return jsonify({"status": "success", "data": risk_engine.snapshot(), "state": portfolio_state.freshness()}), 200
+
+        data = request.get_json() or {}
+        entry_price = float(data["entry_price"])
+        stop_price = float(data["stop_price"])
+        size = data.get("position_size") or calculate_position_size(entry_price, stop_price, project_config["Risk"])
+        if not size:
+            return jsonify({"status": "error", "message": "Could not size the order"}), 400
+
+        action = "BUY" if entry_price > stop_price else "SELL"
+        result = risk_engine.what_if(data["symbol"], action, size, entry_price, stop_price)
+        return jsonify({"status": "success", "position_size": size, "what_if": asdict(result)}), 200
+
+    except KeyError as e:
+        return jsonify({"status": "error", "message": f"Missing field: {e}"}), 400
+    except Exception as e:
+        logger.error("Error computing portfolio risk: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/api/position-sizes", methods=['POST'])
+def get_position_sizes():
+    """
+    Size a whole list at once (watchlist, scanner table, order list).
+    Body: {"entry_prices": [...], "stop_prices": [...],
+           "risk": number or list (default config Risk),
+           "symbols": [...] optional, echoed back per row,
+           "lot_size": int (default config lot_size or 1),
+           "max_notional": number or list (default config max_notional)}
+    Rows that cannot be sized get position_size 0 and a reason.
+    """
+    try:
+        data = request.get_json() or {}
+        entry_prices = data.get("entry_prices") or []
+        stop_prices = data.get("stop_prices") or []
+        if len(entry_prices) != len(stop_prices):
+            return jsonify({"status": "error", "message": "entry_prices and stop_prices must have the same length"}), 400
+
+        sizes = calculate_position_sizes(
+            [np.nan if p is None else p for p in entry_prices],
+            [np.nan if p is None else p for p in stop_prices],
+            data.get("risk", project_config["Risk"]),
+            lot_size=data.get("lot_size", project_config.get("lot_size", 1)),
+            max_notional=data.get("max_notional", project_config.get("max_notional")),
+        )
+        symbols = data.get("symbols")
+        if symbols is not None and len(symbols) == len(sizes):
+            sizes.insert(0, "symbol", symbols)
+
+        return jsonify({"status": "success", "data": sanitize_for_json(sizes.to_dict(orient="records"))}), 200
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error("Error calculating position sizes: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/api/prewarm-quotes", methods=['POST'])
+def prewarm_quotes():
+    """
+    Subscribe quotes for symbols the user is about to trade so /api/place-order
+    reads a live ask. Symbols of /api/open-orders are warmed by that call already.
+    Body: {"symbols": ["AAPL", ...]}
+    """
+    try:
+        symbols = (request.get_json() or {}).get("symbols") or []
+        asks = ib_session.run(quote_service.get_ask_prices, symbols)
+        return jsonify({"status": "success", "subscribed": quote_service.subscribed(), "ask": asks}), 200
+
+    except Exception as e:
+        logger.error("Error pre-warming quotes: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route("/api/place-order", methods=['POST'])
 def place_order():
+    received = time.perf_counter()
     data = request.json  # Get POST JSON data from Flask
 
-    ib = IB()
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
     try:
-        # Connect synchronously using the new loop
-        ib.connect(
-            host=project_config["host"],
-            port=project_config["port"], 
-            clientId=project_config["clientId"]
-        )
-
         # --- Parse order request ---
         order = handle_place_order_request(data)  # Returns Order dataclass
 
-        # --- Fetch executed trades ---
-        executions_df = get_executed_trades(ib)
-        
-        # --- Determine if entry allowed ---
-        entry_allowed, message = is_entry_allowed(executions_df, order.symbol, project_config)
+        # --- Determine if entry allowed (in memory, fed by IB execution events) ---
+        if execution_index.is_ready():
+            entry_allowed, message = execution_index.check_entry(order.symbol, project_config)
+        else:
+            executions_df = ib_session.run(get_executed_trades, priority=True)
+            entry_allowed, message = is_entry_allowed(executions_df, order.symbol, project_config)
 
         if not entry_allowed:
             # Entry not allowed → return JSON with message, skip order placement
@@ -314,57 +548,55 @@ def place_order():
             }), 200
 
         # --- Proceed with order placement ---
-        # Fetch latest ask price if available
-        order.entry_price = get_last_ask_price(ib, order.symbol)
-
-        # Recalculate position size
-        order.position_size = calculate_position_size(
-            entry_price=order.entry_price,
-            stop_price=order.stop_price,
-            risk=project_config["Risk"]
-        )
-
-        # Place bracket order using dataclass attributes
-        parent, stoploss = place_bracket_order(
-            ib=ib,
-            order=order
+        # One IB job: live ask → position size → both bracket legs, no ack wait
+        # Portfolio risk caps are checked from memory after sizing, before transmit
+        parent, stoploss, transmit_ms, block_message = ib_session.run(
+            submit_order_fast, order, quote_service, project_config["Risk"],
+            risk_check=check_portfolio_risk,
+            timeout=ORDER_ENTRY_TIMEOUT, priority=True,
         )
+        latency_ms = (time.perf_counter() - received) * 1000
+        logger.info(f"Order entry {order.symbol}: {latency_ms:.1f} ms click-to-transmit")
 
         # Return success response
         return jsonify({
-            "order_placed": True,
-            "entry_allowed": True,
-            "message": message,
+            "order_placed": parent is not None,
+            "entry_allowed": block_message is None,
+            "message": block_message or message,
             "order": order.__dict__,  # Convert dataclass to dict
             "parent_orderId": getattr(parent, 'orderId', None),
-            "stop_orderId": getattr(stoploss, 'orderId', None)
+            "stop_orderId": getattr(stoploss, 'orderId', None),
+            "latency_ms": round(latency_ms, 1),
+            "transmit_ms": round(transmit_ms, 1)
         }), 200
 
+    except JobOutcomeUnknown as e:
+        # The order job had started: it may still transmit, a retry could send a duplicate
+        logger.error("Order entry %s outcome unknown: %s", order.symbol, e)
+        return jsonify({
+            "status": "unknown",
+            "order_placed": None,
+            "entry_allowed": True,
+            "message": f"Order for {order.symbol} may have been sent, check open orders before retrying",
+            "symbol": order.symbol
+        }), 202
+
     except Exception as e:
         logger.error("Error placing order: %s", str(e))
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        ib.disconnect()
-        loop.close()
-
 @app.route("/api/ib_accountdata", methods=['GET'])
 def get_ib_data():
-    ib = IB()
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
     try:
-        ib.connect(
-            host=project_config["host"],
-            port=project_config["port"],
-            clientId=project_config["clientId"]
-        )
-
-        # Pull data
-        positions_df = get_positions(ib)
-        orders_df = get_stop_orders(ib)
-        account_summary = get_account_summary(ib)
+        # Pull data from the streaming snapshot, poll IB only until it is ready
+        if portfolio_state.is_ready():
+            positions_df = portfolio_state.positions_df()
+            orders_df = portfolio_state.orders_df()
+            account_summary = portfolio_state.account_summary()
+        else:
+            positions_df = ib_session.run(get_positions)
+            orders_df = ib_session.run(get_stop_orders)
+            account_summary = ib_session.run(get_account_summary)
         risk_levels = handle_open_risk(positions_df, orders_df,account_summary)
         #  NEW: All account summary values
         
@@ -373,7 +605,8 @@ def get_ib_data():
             "positions": positions_df.to_dict(orient="records"),
             "orders": orders_df.to_dict(orient="records"),
             "risk_levels": risk_levels.to_dict(orient="records"),
-            "account_summary": account_summary
+            "account_summary": account_summary,
+            "state": portfolio_state.freshness()
         }
 
         return jsonify(response), 200
@@ -381,129 +614,191 @@ def get_ib_data():
     except Exception as e:
         logger.error(f"Error fetching IB account data: {e}")
         return jsonify({"error": str(e)}), 500
-
-    finally:
-        ib.disconnect()
-        loop.close()
     
 @app.route("/api/stoplevel", methods=['GET'])
 def get_stop_level():
     """
-    Fetches the stop level based on the last 10 rows from the specified table (ticker).
+    Stop level for a ticker, answered from the in-memory bar windows.
     :param ticker: The ticker (table name) to query.
+    :param method: lowest_low (default), atr, swing_low, vwap_band, vwap or ema.
+    :param n: Bars to look at (default 10).
+    Other query parameters (offset, multiplier, strength, k) are passed to the method.
     :return: JSON response with the stop level or an error message.
     """
     ticker = request.args.get('ticker')  # e.g., 'AAPL'
     if not ticker:
         return jsonify({"error": "Ticker is required"}), 400
 
-    stop_level = detect_stoplevel(database_config, ticker, n=10)
+    method = request.args.get('method', 'lowest_low')
+
+    try:
+        n = int(request.args.get('n', 10))
+        params = {k: float(v) for k, v in request.args.items() if k in ("offset", "multiplier", "strength", "k")}
+        stop_level = stop_levels.stop_level(ticker, method=method, n=n, **params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     if stop_level is None:
         return jsonify({"error": "Failed to calculate the stop level"}), 500
 
-    # Convert stop level to float
-    try:
-        stop_level_float = float(stop_level)
-    except ValueError:
-        return jsonify({"error": "Invalid stop level value"}), 500
-
     # Return stop level as a float (calculable number)
-    return jsonify({"stop_level": stop_level_float}), 200
+    return jsonify({"stop_level": stop_level, "method": method}), 200
+
+
+@app.route("/api/indicators", methods=['GET'])
+def get_indicators():
+    """
+    Running VWAP / EMA / ATR / cumulative volume for a ticker (?ticker=AAPL),
+    from its database table, or from live bars with source=live.
+    """
+    ticker = request.args.get('ticker')
+    if not ticker:
+        return jsonify({"error": "Ticker is required"}), 400
+
+    engine = live_bars.indicators if request.args.get('source') == 'live' else table_indicators
+    values = engine.get(ticker)
+    if values is None:
+        return jsonify({"error": f"No indicator data for {ticker}"}), 404
+    return jsonify(sanitize_for_json({"ticker": ticker.upper(), **values})), 200
 
 
 @app.route("/api/ib_scanner", methods=['GET'])
 def get_ibscanner_data():
+    """
+    Enriched scanner results for a preset (?preset=...).
+    Other query parameters override ScannerSubscription fields (e.g. numberOfRows=10).
+    Results are cached per preset + overrides; refresh=1 forces a new scan.
+    """
     preset_name = request.args.get("preset")
+    force = request.args.get("refresh") in ("1", "true")
+    overrides = {k: parse_scan_override(v) for k, v in request.args.items() if k not in ("preset", "refresh")}
+
+    try:
+        get_presets(preset_name)  # unknown presets fail fast instead of being cached
+
+        results, cache_info = scan_cache.get(
+            ScanResultCache.make_key(preset_name, overrides),
+            lambda: build_scan_results(
+                ib_session, preset_name, SCANNER_TIME_ZONE, overrides,
+                bar_store=bar_store, volume_profiles=volume_profiles, live_bars=live_bars,
+            ),
+            force=force,
+        )
+        return jsonify({"results": size_scanner_table(results), "cache": cache_info})
 
-    ib = IB()
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    except Exception as e:
+        logger.exception("Error in IB scanner endpoint")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/ib_scanner/multi", methods=['GET'])
+def get_multi_scanner_data():
+    """
+    Several presets in one call (?presets=high_activity_scan,gap_up_scan,gap_down_scan,
+    default all presets), merged by symbol with the presets / ranks that hit it.
+    Each unique symbol is enriched once. Cached like /api/ib_scanner; refresh=1 forces a new scan.
+    """
+    presets = [p for p in (request.args.get("presets") or "").split(",") if p] or list(SCANNER_PRESETS)
+    force = request.args.get("refresh") in ("1", "true")
+    overrides = {k: parse_scan_override(v) for k, v in request.args.items() if k not in ("presets", "refresh")}
 
     try:
-        ib.connect(
-            host=project_config["host"],
-            port=project_config["port"],
-            clientId=project_config["clientId"]
+        for preset_name in presets:
+            get_presets(preset_name)  # unknown presets fail fast instead of being cached
+
+        results, cache_info = scan_cache.get(
+            ScanResultCache.make_key("+".join(sorted(presets)), overrides),
+            lambda: build_multi_scan_results(
+                ib_session, presets, SCANNER_TIME_ZONE, overrides,
+                bar_store=bar_store, volume_profiles=volume_profiles, live_bars=live_bars,
+            ),
+            force=force,
         )
+        return jsonify({"presets": presets, "results": size_scanner_table(results), "cache": cache_info})
 
-        # Run IB scanner
-        sub, df_scan = run_scanner(ib, preset_name)
-        if df_scan is None or df_scan.empty:
-            logger.warning(f"Scanner returned NO RESULTS for preset '{preset_name}'")
-            return jsonify({"results": []})
-        # Extract clean data (rank + symbol + contract dict)
-        clean_data = handle_scandata_from_ib(df_scan)
-
-        logger.info(f"Scanner returned {len(clean_data)} results for preset '{preset_name}'")
-
-        # Fetch snapshot last prices and yesterday close
-        snapshot = fetch_snapshot_prices(ib, clean_data)
-        yclose   = fetch_yesterday_close(ib, clean_data)
-    # -------------------------------
-        # Compute RVOL and print results
-        # -------------------------------
-        time_zone = "Europe/Helsinki"  # or your project-config timezone
-        rvol_map = compute_rvol_from_clean_data(ib, clean_data, time_zone)
-
-        # Print RVOL results
-        for symbol, rvol_info in rvol_map.items():
-            logger.info(f"{symbol}: RVOL={rvol_info.get('rvol')}, "
-                f"Current Volume={rvol_info.get('current_volume')}, "
-                f"Avg Volume={rvol_info.get('avg_volume')}")
-
-
-
-        # Merge into results in desired order
-        flat_results = []
-        for item in clean_data:
-            symbol = item.get("symbol")
-            rank = item.get("rank")
-            contract = item.get("contract")  # keep untouched
-
-            last_price = snapshot["Symbol"].get(symbol, {}).get("last_price")
-            yesterday_close = yclose["Symbol"].get(symbol, {}).get("yesterday_close")
-
-            if last_price is not None and yesterday_close:
-                change_pct = round((last_price - yesterday_close) / yesterday_close * 100, 2)
-            else:
-                change_pct = None
-
-            # Get RVOL info
-            rvol_info = rvol_map.get(symbol, {})
-            rvol = rvol_info.get("rvol")
-            current_volume = rvol_info.get("current_volume")
-            avg_volume = rvol_info.get("avg_volume")
-
-
-            # Build final dictionary
-            flat_item = {
-                "contract": contract,
-                "last_price": last_price,
-                "rank": rank,
-                "symbol": symbol,
-                "yesterday_close": yesterday_close,
-                "change": change_pct,
-                "rvol": rvol,
-                "current_volume": current_volume,
-                "avg_volume": avg_volume
-            }
-
-            flat_results.append(flat_item)
-        # Sanitize results before returning to UI
-        clean_output = sanitize_for_json(flat_results)
-        # Dump readable results into ib_scanner.log
-        log_scan_results(preset_name, clean_output)
-        logger.info(f"Final scanner results prepared with {len(clean_output)} entries.")
-        return jsonify({"results": clean_output})
+    except Exception as e:
+        logger.exception("Error in multi-preset scanner endpoint")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/ib_scanner/live", methods=['GET', 'DELETE'])
+def live_scanner_data():
+    """
+    GET:    ranks of a continuously updated preset (?preset=...), starting the
+            streaming subscription on first use. Rows show enriched=false until
+            their snapshot / close / RVOL data has been fetched.
+    DELETE: stop the preset's subscription.
+    """
+    preset_name = request.args.get("preset")
+
+    try:
+        if request.method == 'DELETE':
+            live_scanner.stop(preset_name)
+            return jsonify({"status": "success", "live": live_scanner.live_presets()}), 200
+
+        data = live_scanner.read(preset_name)
+        if data is None:
+            live_scanner.start(preset_name)
+            data = live_scanner.read(preset_name)
+        data["results"] = size_scanner_table(data["results"])
+        return jsonify(data), 200
 
     except Exception as e:
-        logger.exception("Error in IB scanner endpoint")
+        logger.exception("Error in live scanner endpoint")
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        ib.disconnect()
-        loop.close()
+
+@app.route("/api/live-rvol", methods=['GET', 'POST', 'DELETE'])
+def live_rvol():
+    """
+    GET:    live RVOL of the watched symbols (?symbol=AAPL for one).
+    POST:   {"symbols": [...]} start keep-up-to-date bars for them.
+    DELETE: {"symbols": [...]} stop them.
+    """
+    try:
+        if request.method == 'GET':
+            symbol = request.args.get("symbol")
+            if symbol:
+                data = live_bars.rvol(symbol)
+                if data is None:
+                    return jsonify({"error": f"{symbol} is not watched"}), 404
+                return jsonify(sanitize_for_json({"symbol": symbol.upper(), **data})), 200
+            return jsonify(sanitize_for_json(live_bars.snapshot())), 200
+
+        symbols = (request.get_json(silent=True) or {}).get("symbols") or []
+        if not symbols:
+            return jsonify({"status": "error", "message": "symbols missing"}), 400
+
+        if request.method == 'DELETE':
+            watched = ib_session.run(live_bars.unwatch, symbols)
+        else:
+            watched = ib_session.run_async(live_bars.watch_async, symbols, timeout=120)
+        return jsonify({"status": "success", "watched": watched}), 200
+
+    except Exception as e:
+        logger.exception("Error in live RVOL endpoint")
+        return jsonify({"error": str(e)}), 500
+
+
+def size_scanner_table(results: list) -> list:
+    """Position size per scanner row (ATR stop from live bars), one batch for the whole table."""
+    return sanitize_for_json(size_scan_rows(
+        results,
+        project_config["Risk"],
+        lot_size=project_config.get("lot_size", 1),
+        max_notional=project_config.get("max_notional"),
+        atr_multiplier=project_config.get("scanner_stop_atr_multiplier", 1.5),
+    ))
+
+
+def parse_scan_override(value: str):
+    """Query string value → int / float when numeric, else the string."""
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
 
 
 
@@ -553,46 +848,22 @@ def portfolio_manager():
 
     # Overextension to the upside exit
     if alarm_type == "euforia" and symbol in exit_requests:
-        ib = IB()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
         try:
-            # ---- IB CONNECT (SAFE) ----
-            ib.connect(
-                host=project_config["host"],
-                port=project_config["port"],
-                clientId=project_config["clientId"],
-                timeout=5
-            )
-
             # ---- HANDLE SYMBOL EXIT ----
-            manager = PortfolioManager(ib)
-            status = manager.handle_automated_exit(symbol)
+            status = ib_session.run(run_automated_exit, symbol, portfolio_state, priority=True)
             # 🔁 RESET EXIT REQUEST
             exit_requests.discard(symbol)
 
+            return jsonify({"status": status, "symbol": symbol})
+
         except Exception as e:
             logger.exception(f"Error in portfolio_manager endpoint euforia exit{symbol}")
             return jsonify({"status": "error", "error": str(e), "symbol": symbol}), 500
         
     elif alarm_type == "endofday_exit" and symbol in exit_requests:
-        ib = IB()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
         try:
-            # ---- IB CONNECT (SAFE) ----
-            ib.connect(
-                host=project_config["host"],
-                port=project_config["port"],
-                clientId=project_config["clientId"],
-                timeout=5
-            )
-
             # ---- HANDLE SYMBOL EXIT ----
-            manager = PortfolioManager(ib)
-            status = manager.handle_automated_exit(symbol)
+            status = ib_session.run(run_automated_exit, symbol, portfolio_state, priority=True)
             # 🔁 RESET EXIT REQUEST
             exit_requests.discard(symbol)
 
@@ -602,8 +873,6 @@ def portfolio_manager():
             logger.exception(f"Error in portfolio_manager endpoint endofday exit {symbol}")
             return jsonify({"status": "error", "error": str(e), "symbol": symbol}), 500
 
-        finally:
-            ib.disconnect()
     else:
         return jsonify({"status": "no close order sent", "symbol": symbol})
 
@@ -614,7 +883,12 @@ def portfolio_manager():
 
 # Run Flask and IB API simultaneously
 if __name__ == "__main__":
+    # Connect to IB once, before the first request comes in
+    ib_session.start()
+    # Time / alarms indexes are built in the background, never by a request
+    start_index_builder(database_config)
     # Serve the app with Waitress on all interfaces
-    serve(app, host="0.0.0.0", port=8080)
+    # Each open dashboard stream holds one worker thread, leave room for the regular routes
+    serve(app, host="0.0.0.0", port=8080, threads=project_config.get("waitress_threads", 16))
     # Run Flask app (use built-in dev server for development)
     #app.run(host="0.0.0.0", port=8080, debug=True)
\ No newline at end of file
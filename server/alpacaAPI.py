@@ -66,10 +66,11 @@ def get_auto_orders(database_config):
 
 
 
-def process_open_orders(ib, project_config, database_config):
+def process_open_orders(ib, project_config, database_config, quotes=None):
     """
     Fetch open Alpaca orders and DB auto orders,
     combine them, enrich with prices, and calculate position sizes.
+    quotes: shared QuoteService, so repeated calls reuse live subscriptions.
     """
 
     # --- Fetch Alpaca orders ---
@@ -110,7 +111,8 @@ def process_open_orders(ib, project_config, database_config):
     processed_orders = handle_orders_data(
         combined_orders,
         ib,
-        project_config
+        project_config,
+        quotes=quotes
     )
 
     return processed_orders
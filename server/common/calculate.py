@@ -20,30 +20,105 @@ def calculate_position_size(entry_price, stop_price, risk):
         return None
     
 
+# Why a batch position size is 0 (see calculate_position_sizes)
+SIZE_OK = "ok"
+SIZE_INVALID_INPUT = "invalid_input"        # NaN / non-positive entry, stop, risk or max_notional
+SIZE_ZERO_DISTANCE = "zero_distance"        # entry == stop
+SIZE_BELOW_LOT = "below_lot"                # risk allows less than one lot
+
+
+def calculate_position_sizes(entry_prices, stop_prices, risk, lot_size: int = 1, max_notional=None) -> pd.DataFrame:
+    """
+    Vectorized calculate_position_size for whole watchlists / order lists.
+
+    entry_prices, stop_prices : array-likes of equal length
+    risk                      : scalar or array, money at risk per position
+    lot_size                  : sizes are rounded down to a multiple of this
+    max_notional              : optional scalar or array cap on size * entry
+                                (NaN = no cap for that row, <= 0 is invalid input)
+
+    Returns one row per input with columns
+    ['entry_price', 'stop_price', 'risk', 'direction', 'risk_per_unit',
+     'position_size', 'notional', 'capped', 'reason'].
+    direction is BUY when entry > stop, SELL when entry < stop. Invalid rows get
+    position_size 0 and a reason instead of raising.
+    """
+    entry = np.asarray(entry_prices, dtype=float)
+    stop = np.asarray(stop_prices, dtype=float)
+    if entry.shape != stop.shape:
+        raise ValueError(f"entry_prices and stop_prices differ in length: {entry.shape} vs {stop.shape}")
+    risk = np.broadcast_to(np.asarray(risk, dtype=float), entry.shape)
+    lot_size = max(int(lot_size or 1), 1)
+
+    risk_per_unit = np.abs(entry - stop)
+    valid = (
+        np.isfinite(entry) & np.isfinite(stop) & np.isfinite(risk)
+        & (entry > 0) & (stop > 0) & (risk > 0)
+    )
+    zero_distance = valid & (risk_per_unit == 0)
+    sizable = valid & ~zero_distance
+
+    raw = np.zeros(entry.shape)
+    np.divide(risk, risk_per_unit, out=raw, where=sizable)
+
+    capped = np.zeros(entry.shape, dtype=bool)
+    if max_notional is not None:
+        cap = np.broadcast_to(np.asarray(max_notional, dtype=float), entry.shape)
+        bad_cap = np.isfinite(cap) & (cap <= 0)
+        valid &= ~bad_cap
+        zero_distance &= valid
+        sizable &= valid
+        raw[~sizable] = 0.0
+
+        cap_units = np.full(entry.shape, np.inf)
+        np.divide(cap, entry, out=cap_units, where=sizable & np.isfinite(cap))
+        capped = sizable & (raw > cap_units)
+        raw = np.minimum(raw, cap_units)
+
+    # never negative, whatever the inputs
+    sizes = np.maximum(np.floor(raw / lot_size) * lot_size, 0).astype(np.int64)
+
+    reason = np.full(entry.shape, SIZE_OK, dtype=object)
+    reason[sizable & (sizes == 0)] = SIZE_BELOW_LOT
+    reason[zero_distance] = SIZE_ZERO_DISTANCE
+    reason[~valid] = SIZE_INVALID_INPUT
+
+    return pd.DataFrame({
+        "entry_price": entry,
+        "stop_price": stop,
+        "risk": risk,
+        "direction": np.where(entry > stop, "BUY", np.where(entry < stop, "SELL", None)),
+        "risk_per_unit": risk_per_unit,
+        "position_size": sizes,
+        "notional": np.round(sizes * np.nan_to_num(entry), 2),
+        "capped": capped,
+        "reason": reason,
+    })
+
 
 def calculate_avg_volume_model(day5_history_datas: pd.DataFrame)-> pd.DataFrame:
     """
     Combine 5 days of intraday data and calculate the average volume
-    for each Symbol-Time combination.
+    for each Symbol-Minute (time-of-day key) combination.
 
     Parameters
     ----------
     day5_history_datas : list[pd.DataFrame]
         List of 5 daily DataFrames with columns:
-        ['Symbol', 'Date', 'Time', 'Open', 'High', 'Low', 'Close', 'Volume']
+        ['Symbol', 'Date', 'Minute', 'Open', 'High', 'Low', 'Close', 'Volume']
 
     Returns
     -------
     pd.DataFrame
         A single DataFrame (average day model) with columns:
-        ['Symbol', 'Time', 'Avg_volume']
+        ['Symbol', 'Minute', 'Avg_volume']
     """
     # Combine all 5 days
     all_data = pd.concat(day5_history_datas, ignore_index=True)
 
-    # Group by Symbol and Time, compute mean volume
+    # Group by Symbol and Minute, compute mean volume
     avg_volume_df = (
-        all_data.groupby(['Symbol', 'Time'], as_index=False)['Volume']
+        all_data.groupby(['Symbol', 'Minute'], as_index=False)['Volume']
         .mean()
         .rename(columns={'Volume': 'Avg_volume'})
     )
@@ -0,0 +1,325 @@
+import logging
+import threading
+from datetime import date, datetime, time as dt_time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EMA_PERIOD = 9
+ATR_PERIOD = 14
+
+# Per-key state row of IndicatorEngine. The c_* slots hold the values after
+# the last completed bar, the others include the bar still forming, so an
+# update of that bar is recomputed from c_* instead of applied twice.
+(
+    _SESSION, _EPOCH, _COUNT,
+    _C_PV, _C_VOL, _C_EMA, _C_ATR, _C_CLOSE,
+    _PV, _VOL, _EMA, _ATR, _CLOSE, _VWAP,
+) = range(14)
+_STATE_WIDTH = 14
+
+
+def session_cumsum(values: np.ndarray, sessions: Optional[np.ndarray] = None) -> np.ndarray:
+    """Cumulative sum that restarts wherever the session value changes."""
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    total = np.cumsum(values)
+    if sessions is None or not len(values):
+        return total
+
+    sessions = np.asarray(sessions)
+    starts = np.r_[True, sessions[1:] != sessions[:-1]]
+    first = np.maximum.accumulate(np.where(starts, np.arange(len(values)), 0))
+    return total - (total - values)[first]
+
+
+def compute_indicators(high, low, close, volume, sessions=None,
+                       ema_period: int = EMA_PERIOD, atr_period: int = ATR_PERIOD) -> Dict[str, np.ndarray]:
+    """
+    Vectorized indicators over a whole bar history (oldest first).
+
+      - vwap        session VWAP of the typical price (H+L+C)/3
+      - ema         EMA(ema_period) of Close, seeded with the first close
+      - atr         Wilder ATR(atr_period), seeded with the first High-Low
+      - cum_volume  session cumulative volume
+
+    VWAP and cumulative volume restart when `sessions` changes, EMA and ATR
+    run across sessions. IndicatorEngine.update produces the same values bar by bar.
+    """
+    high, low, close, volume = (np.asarray(col, dtype=np.float64) for col in (high, low, close, volume))
+
+    typical = (high + low + close) / 3
+    cum_pv = session_cumsum(typical * volume, sessions)
+    cum_volume = session_cumsum(volume, sessions)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vwap = np.where(cum_volume > 0, cum_pv / cum_volume, np.nan)
+
+    prev_close = np.r_[np.nan, close[:-1]]
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+    return {
+        "vwap": vwap,
+        "ema": pd.Series(close).ewm(span=ema_period, adjust=False).mean().to_numpy(),
+        "atr": pd.Series(true_range).ewm(alpha=1 / atr_period, adjust=False).mean().to_numpy(),
+        "cum_volume": cum_volume,
+        "cum_pv": cum_pv,
+    }
+
+
+def add_indicators(df: pd.DataFrame, sessions=None,
+                   ema_period: int = EMA_PERIOD, atr_period: int = ATR_PERIOD) -> pd.DataFrame:
+    """
+    Add VWAP, EMA<n>, ATR and Cum_volume columns to an intraday DataFrame
+    (High / Low / Close / Volume). Sessions default to the 'Date' column when present.
+    """
+    if df is None:
+        return df
+
+    if sessions is None and "Date" in df.columns:
+        sessions = df["Date"].to_numpy()
+
+    values = compute_indicators(
+        df["High"].to_numpy(), df["Low"].to_numpy(), df["Close"].to_numpy(), df["Volume"].to_numpy(),
+        sessions=sessions,
+        ema_period=ema_period, atr_period=atr_period,
+    )
+    df["VWAP"] = values["vwap"]
+    df[f"EMA{ema_period}"] = values["ema"]
+    df["ATR"] = values["atr"]
+    df["Cum_volume"] = values["cum_volume"]
+    return df
+
+
+class IndicatorEngine:
+    """
+    Streaming VWAP / EMA / ATR / cumulative volume per key (ticker).
+
+    Every key owns one row of a float64 state matrix, so an update is a
+    handful of scalar operations on that row. update() accepts the same bar
+    repeatedly while it is forming; a bar with a newer epoch completes the
+    previous one. A bar from a new session restarts VWAP and cumulative
+    volume.
+
+    seed() loads a history with the vectorized compute_indicators(). With a
+    `loader` (key -> bar rows) get() seeds unknown keys lazily, and
+    on_last_rows() can be registered with DashboardFeed.add_listener to keep
+    the seeded keys current. Safe from any thread.
+    """
+
+    def __init__(self, ema_period: int = EMA_PERIOD, atr_period: int = ATR_PERIOD,
+                 loader: Optional[Callable[[str], Optional[List[dict]]]] = None, capacity: int = 64):
+        if ema_period < 1 or atr_period < 1:
+            raise ValueError(f"Indicator periods must be positive, got EMA {ema_period} / ATR {atr_period}")
+
+        self.ema_period = ema_period
+        self.atr_period = atr_period
+        self.loader = loader
+
+        self._alpha = 2.0 / (ema_period + 1)
+        self._state = np.full((capacity, _STATE_WIDTH), np.nan)
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []              # rows released by forget()
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def update(self, key: str, epoch: float, high: float, low: float, close: float, volume: float,
+               session: Optional[float] = None) -> None:
+        """Apply one bar in O(1). `session` defaults to the UTC day of `epoch`."""
+        if session is None:
+            session = epoch // 86400
+        with self._lock:
+            row = self._row_locked(key.upper())
+            self._apply_locked(row, float(epoch), float(session), high, low, close, volume)
+
+    def seed(self, key: str, epochs, high, low, close, volume, sessions=None) -> None:
+        """Replace the key's state with a history (oldest first), vectorized."""
+        epochs, high, low, close, volume = (
+            np.asarray(col, dtype=np.float64) for col in (epochs, high, low, close, volume)
+        )
+        n = len(epochs)
+        if sessions is None:
+            sessions = epochs // 86400
+        sessions = np.asarray(sessions, dtype=np.float64)
+
+        with self._lock:
+            row = self._row_locked(key.upper())
+            self._state[row] = np.nan
+            if not n:
+                return
+
+            values = compute_indicators(high, low, close, volume, sessions, self.ema_period, self.atr_period)
+            state = self._state[row]
+            state[_SESSION], state[_EPOCH], state[_COUNT] = sessions[-1], epochs[-1], n - 1
+            state[_PV], state[_VOL] = values["cum_pv"][-1], values["cum_volume"][-1]
+            state[_EMA], state[_ATR], state[_CLOSE] = values["ema"][-1], values["atr"][-1], close[-1]
+            state[_VWAP] = values["vwap"][-1]
+
+            if n > 1:
+                same_session = sessions[-2] == sessions[-1]
+                state[_C_PV] = values["cum_pv"][-2] if same_session else 0.0
+                state[_C_VOL] = values["cum_volume"][-2] if same_session else 0.0
+                state[_C_EMA], state[_C_ATR], state[_C_CLOSE] = values["ema"][-2], values["atr"][-2], close[-2]
+            else:
+                state[_C_PV] = state[_C_VOL] = 0.0
+
+    def seed_rows(self, key: str, rows: Iterable[dict]) -> None:
+        """Seed from database bar rows (High / Low / Close / Volume with Time and optionally Date)."""
+        bars = sorted(
+            (self.row_key(r) + (r.get("High"), r.get("Low"), r.get("Close"), r.get("Volume")) for r in rows),
+            key=lambda b: b[1],
+        )
+        if not bars:
+            self.seed(key, [], [], [], [], [])
+            return
+        sessions, epochs, high, low, close, volume = (
+            np.array([np.nan if v is None else float(v) for v in col]) for col in zip(*bars)
+        )
+        self.seed(key, epochs, high, low, close, volume, sessions)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Latest {"vwap", "ema", "atr", "cum_volume", "close"} for a key, None when unknown."""
+        key = key.upper()
+        with self._lock:
+            row = self._rows.get(key)
+            if row is not None:
+                return self._values_locked(row)
+
+        if self.loader is None:
+            return None
+        try:
+            rows = self.loader(key)
+            if rows is None:
+                return None
+            self.seed_rows(key, rows)
+        except Exception as e:
+            logger.error(f"Could not load indicator history for {key}: {e}")
+            return None
+
+        with self._lock:
+            row = self._rows.get(key)
+            return self._values_locked(row) if row is not None else None
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {key: self._values_locked(row) for key, row in self._rows.items()}
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            row = self._rows.pop(key.upper(), None)
+            if row is not None:
+                self._state[row] = np.nan
+                self._free.append(row)
+
+    def on_last_rows(self, last_rows: dict) -> None:
+        """DashboardFeed listener: apply each seeded table's newest row."""
+        with self._lock:
+            tracked = {key: self._rows[key] for key in (k.upper() for k in last_rows) if key in self._rows}
+        for table, last in last_rows.items():
+            row = tracked.get(table.upper())
+            if row is None or not last:
+                continue
+            try:
+                session, epoch = self.row_key(last)
+                values = [_number(last.get(c)) for c in ("High", "Low", "Close", "Volume")]
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Indicator update skipped for {table}: {e}")
+                continue
+            if np.isnan(values[2]):
+                continue
+            with self._lock:
+                if self._rows.get(table.upper()) == row:
+                    self._apply_locked(row, epoch, session, *values)
+
+    @staticmethod
+    def row_key(row: dict) -> Tuple[float, float]:
+        """(session, epoch) of a database bar row from its Time (datetime, or time-of-day with Date)."""
+        stamp = row.get("Time")
+        day = row.get("Date")
+        if isinstance(stamp, str):
+            stamp = datetime.fromisoformat(stamp) if "-" in stamp else dt_time.fromisoformat(stamp)
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+
+        if isinstance(stamp, datetime):
+            day = day or stamp.date()
+            epoch = stamp.timestamp()
+        elif isinstance(stamp, dt_time):
+            day = day or date.today()
+            epoch = datetime.combine(day, stamp).timestamp()
+        else:
+            raise ValueError(f"Unsupported bar time {stamp!r}")
+        return float(day.toordinal()), epoch
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _row_locked(self, key: str) -> int:
+        row = self._rows.get(key)
+        if row is None:
+            row = self._free.pop() if self._free else len(self._rows)
+            if row >= len(self._state):
+                grown = np.full((len(self._state) * 2, _STATE_WIDTH), np.nan)
+                grown[:len(self._state)] = self._state
+                self._state = grown
+            self._rows[key] = row
+        return row
+
+    def _apply_locked(self, row: int, epoch: float, session: float,
+                      high: float, low: float, close: float, volume: float) -> None:
+        state = self._state[row]
+        last_epoch = state[_EPOCH]
+
+        if not np.isnan(last_epoch):
+            if epoch < last_epoch:
+                return
+            if epoch > last_epoch:
+                # the forming bar is complete, its values become the base of the new one
+                new_session = session != state[_SESSION]
+                state[_C_PV] = 0.0 if new_session else state[_PV]
+                state[_C_VOL] = 0.0 if new_session else state[_VOL]
+                state[_C_EMA], state[_C_ATR], state[_C_CLOSE] = state[_EMA], state[_ATR], state[_CLOSE]
+                state[_COUNT] += 1
+        else:
+            state[_COUNT] = 0
+            state[_C_PV] = state[_C_VOL] = 0.0
+
+        volume = volume if volume == volume else 0.0
+        typical = (high + low + close) / 3
+        state[_PV] = state[_C_PV] + typical * volume
+        state[_VOL] = state[_C_VOL] + volume
+        state[_VWAP] = state[_PV] / state[_VOL] if state[_VOL] > 0 else np.nan
+
+        if state[_COUNT] == 0:
+            state[_EMA] = close
+            state[_ATR] = high - low
+        else:
+            prev_close = state[_C_CLOSE]
+            true_range = np.fmax(high - low, np.fmax(abs(high - prev_close), abs(low - prev_close)))
+            state[_EMA] = state[_C_EMA] + self._alpha * (close - state[_C_EMA])
+            state[_ATR] = state[_C_ATR] + (true_range - state[_C_ATR]) / self.atr_period
+
+        state[_SESSION], state[_EPOCH], state[_CLOSE] = session, epoch, close
+
+    def _values_locked(self, row: int) -> Optional[dict]:
+        state = self._state[row]
+        if np.isnan(state[_EPOCH]):
+            return None
+        return {
+            "vwap": _optional(state[_VWAP]),
+            "ema": _optional(state[_EMA]),
+            "atr": _optional(state[_ATR]),
+            "cum_volume": _optional(state[_VOL]),
+            "close": _optional(state[_CLOSE]),
+        }
+
+
+def _number(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
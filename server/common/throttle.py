@@ -0,0 +1,44 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket used to pace requests to IB.
+
+    `capacity` tokens allow a burst, after which requests are released at
+    `rate` tokens per second. Meant to be awaited from the IB event loop,
+    so no thread locking is needed.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("TokenBucket needs rate > 0 and capacity >= 1")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Wait until one token is available and take it."""
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            wait = (1 - self._tokens) / self.rate
+            logger.debug(f"TokenBucket empty, waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
@@ -0,0 +1,168 @@
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# One slot per minute of the exchange-timezone day, so the whole
+# extended-hours session (04:00-20:00 ET) fits without wrapping.
+SLOTS_PER_DAY = 1440
+
+LOOKBACK_CHOICES = (5, 10, 20)
+METHOD_CHOICES = ("mean", "median")
+
+
+def minute_of_day(epochs: np.ndarray, exchange_tz: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (session date as datetime64[D], minute-of-day slot) for every epoch."""
+    local = pd.to_datetime(epochs, unit="s", utc=True).tz_convert(ZoneInfo(exchange_tz)).tz_localize(None)
+    values = local.values
+    days = values.astype("datetime64[D]")
+    minutes = ((values - days) // np.timedelta64(1, "m")).astype(np.int64)
+    return days, minutes
+
+
+@dataclass
+class VolumeProfile:
+    """
+    Average volume per minute-of-day slot (exchange time) for one symbol.
+    avg[m] is the baseline volume of the bar starting at minute m, averaged
+    over the days with a bar in that slot (0 when none had one),
+    cum_avg[m] the baseline cumulative volume up to and including that bar.
+    """
+    symbol: str
+    session: date
+    lookback: int
+    method: str
+    days_used: int
+    avg: np.ndarray
+    cum_avg: np.ndarray
+
+    def rvol(self, cum_volume: float, minute: int) -> Optional[float]:
+        """Relative volume at `minute` for the current session's cumulative volume."""
+        baseline = self.cum_avg[minute]
+        if not baseline or np.isnan(baseline):
+            return 0.0
+        return round(float(cum_volume / baseline), 2)
+
+
+class VolumeProfileStore:
+    """
+    Builds each symbol's average volume curve once per session and keeps it
+    as dense NumPy arrays indexed by minute-of-day, so RVOL becomes an array
+    lookup plus a cumulative sum instead of a groupby + merge on every scan.
+    """
+
+    def __init__(self, exchange_tz: str = "America/New_York", lookback: int = 5, method: str = "mean"):
+        self._validate(lookback, method)
+        self.exchange_tz = exchange_tz
+        self.lookback = lookback
+        self.method = method
+        self._profiles: Dict[Tuple[str, int, str], VolumeProfile] = {}
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def get(self, symbol: str, lookback: Optional[int] = None, method: Optional[str] = None) -> Optional[VolumeProfile]:
+        """Profile built for the current session, or None if it still needs building."""
+        key = (symbol, lookback or self.lookback, method or self.method)
+        with self._lock:
+            profile = self._profiles.get(key)
+        if profile is None or profile.session != self._today():
+            return None
+        return profile
+
+    def build(
+        self,
+        symbol: str,
+        prior_bars: np.ndarray,
+        lookback: Optional[int] = None,
+        method: Optional[str] = None,
+    ) -> Optional[VolumeProfile]:
+        """
+        Build the profile from prior-session bars (BAR_DTYPE array from the bar store).
+        Only the most recent `lookback` sessions are used.
+        """
+        lookback = lookback or self.lookback
+        method = method or self.method
+        self._validate(lookback, method)
+
+        if prior_bars is None or not len(prior_bars):
+            logger.warning(f"No prior sessions to build a volume profile for {symbol}")
+            return None
+
+        days, minutes = minute_of_day(prior_bars["epoch"], self.exchange_tz)
+        unique_days = np.unique(days)[-lookback:]
+        mask = np.isin(days, unique_days)
+        day_idx = np.searchsorted(unique_days, days[mask])
+
+        grid = np.zeros((len(unique_days), SLOTS_PER_DAY), dtype=np.float64)
+        np.add.at(grid, (day_idx, minutes[mask]), prior_bars["volume"][mask])
+        has_bar = np.zeros(grid.shape, dtype=bool)
+        has_bar[day_idx, minutes[mask]] = True
+
+        # Like the groupby mean it replaces: each slot averages only the days
+        # that had a bar there, a missing bar is not a zero-volume minute
+        counts = has_bar.sum(axis=0)
+        traded = counts > 0
+        avg = np.zeros(SLOTS_PER_DAY, dtype=np.float64)
+        if method == "median":
+            avg[traded] = np.nanmedian(np.where(has_bar, grid, np.nan)[:, traded], axis=0)
+        else:
+            avg[traded] = grid.sum(axis=0)[traded] / counts[traded]
+
+        profile = VolumeProfile(
+            symbol=symbol,
+            session=self._today(),
+            lookback=lookback,
+            method=method,
+            days_used=len(unique_days),
+            avg=avg,
+            cum_avg=np.cumsum(avg),
+        )
+
+        with self._lock:
+            self._profiles[(symbol, lookback, method)] = profile
+
+        if len(unique_days) < lookback:
+            logger.info(f"Volume profile for {symbol} built from {len(unique_days)}/{lookback} sessions")
+        return profile
+
+    def get_or_build(self, symbol: str, prior_bars: np.ndarray, **kwargs) -> Optional[VolumeProfile]:
+        return self.get(symbol, **kwargs) or self.build(symbol, prior_bars, **kwargs)
+
+    def rvol_for_session(self, profile: VolumeProfile, today_bars: np.ndarray) -> dict:
+        """
+        RVOL of the current session's bars against the profile:
+        cumulative volume so far divided by the baseline cumulative volume at the last bar.
+        """
+        if today_bars is None or not len(today_bars):
+            return {"rvol": None, "current_volume": None, "avg_volume": None}
+
+        _, minutes = minute_of_day(today_bars["epoch"][-1:], self.exchange_tz)
+        minute = int(minutes[0])
+
+        return {
+            "rvol": profile.rvol(float(today_bars["volume"].sum()), minute),
+            "current_volume": float(today_bars["volume"][-1]),
+            "avg_volume": float(profile.avg[minute]),
+        }
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _today(self) -> date:
+        return datetime.now(ZoneInfo(self.exchange_tz)).date()
+
+    @staticmethod
+    def _validate(lookback: int, method: str) -> None:
+        if lookback not in LOOKBACK_CHOICES:
+            raise ValueError(f"lookback must be one of {LOOKBACK_CHOICES}, got {lookback}")
+        if method not in METHOD_CHOICES:
+            raise ValueError(f"method must be one of {METHOD_CHOICES}, got {method}")
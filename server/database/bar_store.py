@@ -0,0 +1,201 @@
+import logging
+import math
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from helpers.handle_dataframes import bars_to_columns
+
+logger = logging.getLogger(__name__)
+
+# One row per bar, epoch is the bar start in UTC seconds
+BAR_DTYPE = np.dtype([
+    ("epoch", "i8"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+])
+
+BAR_SIZE_SECONDS = {
+    "1 min": 60,
+    "2 mins": 120,
+    "3 mins": 180,
+    "5 mins": 300,
+    "15 mins": 900,
+    "30 mins": 1800,
+    "1 hour": 3600,
+}
+
+# IB accepts durations in seconds up to one day, longer gaps are requested in days
+MAX_SECONDS_DURATION = 86400
+
+
+def bars_to_array(bars) -> np.ndarray:
+    """Convert a list of IBKR bar objects into a BAR_DTYPE structured array."""
+    columns = bars_to_columns(bars)
+    arr = np.empty(len(columns["epoch"]), dtype=BAR_DTYPE)
+    for name in BAR_DTYPE.names:
+        arr[name] = columns[name]
+    return arr
+
+
+def session_dates(epochs: np.ndarray, exchange_tz: str) -> np.ndarray:
+    """Exchange-timezone calendar date of every epoch, as numpy datetime64[D]."""
+    local = pd.to_datetime(epochs, unit="s", utc=True).tz_convert(ZoneInfo(exchange_tz))
+    return local.tz_localize(None).values.astype("datetime64[D]")
+
+
+class BarStore:
+    """
+    Local cache of intraday bars keyed by (symbol, bar size, session date).
+
+    Closed sessions are immutable: they are written once to
+    <root>/<bar size>/<symbol>/<YYYY-MM-DD>.npy and afterwards only read
+    (memory-mapped). The current session lives in memory and is topped up
+    with only the bars newer than the last cached timestamp.
+
+    Symbols are case-insensitive: every public method upper-cases them, so
+    the memory keys and the directory names always match.
+
+    Not thread-safe; use it from the IB session thread.
+    """
+
+    def __init__(self, root_dir: str, exchange_tz: str = "America/New_York"):
+        self.root = Path(root_dir)
+        self.exchange_tz = exchange_tz
+        self._closed: Dict[Tuple[str, str], Dict[date, np.ndarray]] = {}
+        self._current: Dict[Tuple[str, str], np.ndarray] = {}
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def plan_duration(self, symbol: str, bar_size: str, days: int) -> str:
+        """
+        IB durationStr needed to bring (symbol, bar_size) up to date for `days` sessions.
+        Only the gap after the last cached bar is requested.
+        """
+        symbol = symbol.upper()
+        last_epoch = self.last_epoch(symbol, bar_size)
+        if last_epoch is None or len(self._closed_for(symbol, bar_size)) < days - 1:
+            return f"{days} D"
+
+        bar_seconds = BAR_SIZE_SECONDS.get(bar_size, 60)
+        gap = int(time.time()) - last_epoch + bar_seconds
+        if gap <= MAX_SECONDS_DURATION:
+            return f"{max(gap, bar_seconds)} S"
+        return f"{min(days, math.ceil(gap / 86400) + 1)} D"
+
+    def merge(self, symbol: str, bar_size: str, bars) -> None:
+        """
+        Merge freshly fetched IB bars into the store.
+        Bars from closed sessions are persisted once, the current session replaces
+        everything cached from the first fetched bar onwards (the last bar may have grown).
+        """
+        symbol = symbol.upper()
+        new = bars_to_array(bars) if not isinstance(bars, np.ndarray) else bars
+        if not len(new):
+            return
+
+        key = (symbol, bar_size)
+        closed = self._closed_for(symbol, bar_size)
+        today = self._today()
+
+        current = self._current.get(key)
+        if current is not None and len(current):
+            current = current[current["epoch"] < new["epoch"][0]]
+            new = np.concatenate([current, new])
+
+        dates = session_dates(new["epoch"], self.exchange_tz)
+        for day in np.unique(dates):
+            day_bars = new[dates == day]
+            session = day.item()
+
+            if session >= today:
+                self._current[key] = day_bars
+            elif session not in closed:
+                closed[session] = self._write(symbol, bar_size, session, day_bars)
+
+        # a session that ended since the last merge becomes immutable
+        current = self._current.get(key)
+        if current is not None and len(current):
+            session = session_dates(current["epoch"][:1], self.exchange_tz)[0].item()
+            if session < today:
+                if session not in closed:
+                    closed[session] = self._write(symbol, bar_size, session, current)
+                del self._current[key]
+
+    def sessions(self, symbol: str, bar_size: str, days: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (current session, prior sessions) for the last `days` sessions.
+        When no current session is cached the most recent closed one is returned as current.
+        """
+        symbol = symbol.upper()
+        key = (symbol, bar_size)
+        closed = self._closed_for(symbol, bar_size)
+        ordered = [closed[d] for d in sorted(closed)]
+
+        current = self._current.get(key)
+        if current is None or not len(current):
+            if not ordered:
+                return np.empty(0, dtype=BAR_DTYPE), np.empty(0, dtype=BAR_DTYPE)
+            current, ordered = ordered[-1], ordered[:-1]
+
+        prior = ordered[-(days - 1):] if days > 1 else []
+        prior_arr = np.concatenate(prior) if prior else np.empty(0, dtype=BAR_DTYPE)
+        return np.asarray(current), prior_arr
+
+    def last_epoch(self, symbol: str, bar_size: str) -> Optional[int]:
+        symbol = symbol.upper()
+        current = self._current.get((symbol, bar_size))
+        if current is not None and len(current):
+            return int(current["epoch"][-1])
+
+        closed = self._closed_for(symbol, bar_size)
+        if not closed:
+            return None
+        return int(closed[max(closed)]["epoch"][-1])
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _today(self) -> date:
+        return datetime.now(ZoneInfo(self.exchange_tz)).date()
+
+    def _dir(self, symbol: str, bar_size: str) -> Path:
+        return self.root / bar_size.replace(" ", "_") / symbol
+
+    def _closed_for(self, symbol: str, bar_size: str) -> Dict[date, np.ndarray]:
+        """Lazily index (and memory-map) the closed sessions already on disk."""
+        key = (symbol, bar_size)
+        if key not in self._closed:
+            sessions = {}
+            directory = self._dir(symbol, bar_size)
+            if directory.is_dir():
+                for path in directory.glob("*.npy"):
+                    try:
+                        sessions[date.fromisoformat(path.stem)] = np.load(path, mmap_mode="r")
+                    except Exception as e:
+                        logger.warning(f"Skipping unreadable bar cache file {path}: {e}")
+            self._closed[key] = sessions
+        return self._closed[key]
+
+    def _write(self, symbol: str, bar_size: str, session: date, bars: np.ndarray) -> np.ndarray:
+        directory = self._dir(symbol, bar_size)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{session.isoformat()}.npy"
+        tmp = path.with_suffix(".tmp.npy")
+        try:
+            np.save(tmp, np.ascontiguousarray(bars))
+            tmp.replace(path)
+            logger.debug(f"Cached {len(bars)} {bar_size} bars for {symbol} {session}")
+            return np.load(path, mmap_mode="r")
+        except Exception as e:
+            logger.error(f"Failed to write bar cache {path}: {e}")
+            return bars
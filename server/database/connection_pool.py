@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Pool settings can be given in the same database.ini section as the
+# connection parameters, they are removed before calling psycopg2.connect.
+POOL_OPTIONS = {
+    "pool_min": 1,
+    "pool_max": 8,
+    "pool_timeout": 10.0,        # seconds to wait for a free connection
+    "pool_validate_after": 5.0,  # validate connections idle longer than this
+}
+
+_pools: Dict[tuple, "ConnectionPool"] = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL connection pool shared by all db_functions.
+
+    - at most `maxconn` connections exist, callers wait up to `timeout` for one
+    - connections run in autocommit so nothing is left "idle in transaction"
+    - connections idle longer than `validate_after` are checked with SELECT 1
+      on checkout; a dead one (e.g. after a database restart) is replaced
+      transparently and every other idle connection is dropped with it
+    """
+
+    def __init__(
+        self,
+        connect_kwargs: dict,
+        minconn: int = 1,
+        maxconn: int = 8,
+        timeout: float = 10.0,
+        validate_after: float = 5.0,
+    ):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size min={minconn} max={maxconn}")
+
+        self.connect_kwargs = connect_kwargs
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_after = validate_after
+
+        self._idle: deque = deque()     # (connection, returned_at), most recent last
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+
+        for _ in range(minconn):
+            try:
+                self._idle.append((self._connect(), time.monotonic()))
+            except Exception as e:
+                logger.error(f"Could not pre-open pool connection: {e}")
+                break
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def getconn(self):
+        """Check out a live connection, waiting for a free slot if the pool is full."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise Exception(f"No database connection available within {self.timeout}s")
+
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+
+                if item is None:
+                    return self._connect()
+
+                conn, returned_at = item
+                if conn.closed:
+                    continue
+                if time.monotonic() - returned_at < self.validate_after or self._is_alive(conn):
+                    return conn
+
+                logger.warning("Dropping dead pooled database connections (database restarted?)")
+                self._close_quietly(conn)
+                self._discard_idle()
+
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn) -> None:
+        """Return a connection to the pool; broken ones are closed instead."""
+        try:
+            if conn.closed:
+                return
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def closeall(self) -> None:
+        self._discard_idle()
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        conn.autocommit = True
+        return conn
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard_idle(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def get_pool(database_config: dict) -> ConnectionPool:
+    """Return the process-wide pool for this database config, creating it on first use."""
+    key = tuple(sorted((k, str(v)) for k, v in database_config.items()))
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            connect_kwargs = {k: v for k, v in database_config.items() if k not in POOL_OPTIONS}
+            options = {k: database_config.get(k, default) for k, default in POOL_OPTIONS.items()}
+            pool = ConnectionPool(
+                connect_kwargs,
+                minconn=int(options["pool_min"]),
+                maxconn=int(options["pool_max"]),
+                timeout=float(options["pool_timeout"]),
+                validate_after=float(options["pool_validate_after"]),
+            )
+            _pools[key] = pool
+            logger.info(f"Created database connection pool (min={options['pool_min']}, max={options['pool_max']})")
+        return pool
+
+
+def release_connection(database_config: dict, conn: Optional[object]) -> None:
+    """Give a connection obtained through get_connection_and_cursor back to its pool."""
+    if conn is not None:
+        get_pool(database_config).putconn(conn)
@@ -1,13 +1,43 @@
 import psycopg2
+import hashlib
 import logging
+import threading
+import time
 from decimal import Decimal
+from psycopg2 import sql
+from database.connection_pool import get_pool, release_connection
 
 logger = logging.getLogger(__name__)
 
+# Ticker tables = every public table except these
+TICKER_TABLES_FILTER = """
+                WHERE table_schema = 'public'
+                AND table_name NOT ILIKE '%volume_model%'
+                AND table_name NOT IN ('livedata', 'alarms','orders')
+"""
+
+# Cached ticker table list + generated last-row query, per database config.
+# Refreshed whenever fetch_all_table_names runs, when the catalog signature
+# returned with every last-row query changes (CREATE/DROP TABLE), or after TABLE_CACHE_TTL.
+TABLE_CACHE_TTL = 300
+_table_cache = {}
+_table_cache_lock = threading.Lock()
+
+# Index backing the incremental / current-day alarm queries (see ensure_indexes)
+ALARMS_INDEX = "alarms_date_time_idx"
+
+# (config, index name) pairs whose CREATE INDEX was already attempted, failed ones
+# included, so the DDL runs at most once per process and never on a request
+_index_attempted = set()
+_index_lock = threading.Lock()
+
 
 def get_connection_and_cursor(database_config):
-    """Create and return a database connection and cursor."""
-    conn = psycopg2.connect(**database_config)
+    """
+    Check out a pooled database connection and return it with a new cursor.
+    Give the connection back with release_connection(database_config, conn).
+    """
+    conn = get_pool(database_config).getconn()
     if not conn:
         logger.error("Failed to connect to database.")
         raise Exception("Failed to connect to database.")
@@ -19,23 +49,28 @@ def fetch_last_n_rows(database_config, table_name, n):
     Retrieve the last 'n' rows from the specified table and return it as a list of dictionaries.
     
     :param database_config: Database connection config.
-    :param table_name: The name of the table to query.
+    :param table_name: The name of the table to query (matched case-insensitively to an existing ticker table).
     :param n: The number of rows to fetch (default is 10).
     :return: List of dictionaries with table rows or None in case of error.
     """
+    table = resolve_table_name(database_config, table_name)
+    if table is None:
+        logger.error(f"Unknown ticker table {table_name}")
+        return None
+
     conn = None
     cur = None
     try:
         # Use the helper function to get a connection and cursor
         conn, cur = get_connection_and_cursor(database_config)
 
-        # SQL query to fetch the last n rows from the specified table
-        select_query = f"""
-            SELECT * FROM {table_name}
+        # SQL query to fetch the last n rows from the specified table (served by the "Time" index)
+        select_query = sql.SQL("""
+            SELECT * FROM {table}
             ORDER BY "Time" DESC
-            LIMIT {n};
-        """
-        cur.execute(select_query)
+            LIMIT %s;
+        """).format(table=sql.Identifier(table))
+        cur.execute(select_query, (int(n),))
         rows = cur.fetchall()
 
         # Get column names dynamically
@@ -54,10 +89,84 @@ def fetch_last_n_rows(database_config, table_name, n):
         # Always close database resources safely
         if cur:
             cur.close()
-        if conn:
-            conn.close()
+        release_connection(database_config, conn)
+
+
+def resolve_table_name(database_config, name):
+    """
+    Map a ticker (e.g. 'AAPL') to its exact ticker table name from the cached table list.
+    Returns None for names that are not ticker tables, so user input never reaches SQL as is.
+    """
+    if not name:
+        return None
+    cached = _get_table_cache(database_config)
+    if cached is None:
+        return None
+    tables = cached["tables"]
+    if name in tables:
+        return name
+    matches = [t for t in tables if t.lower() == name.lower()]
+    return matches[0] if matches else None
+
+
+def ensure_indexes(database_config, tables=None):
+    """
+    Create the alarms ("Date", "Time") index and the "Time" index of each ticker
+    table (all of them when tables is None). CREATE INDEX CONCURRENTLY does not
+    block writers. Each index is attempted once per process, failed ones too.
+    Runs at startup and, for tables that show up later, from the table cache,
+    both on a background thread (start_index_builder).
+    """
+    if tables is None:
+        tables = fetch_all_table_names(database_config) or []
+
+    key = _cache_key(database_config)
+    wanted = [("alarms", ALARMS_INDEX, ("Date", "Time"))]
+    wanted += [(table, f"{table}_time_idx", ("Time",)) for table in tables]
+    with _index_lock:
+        wanted = [w for w in wanted if (key, w[1]) not in _index_attempted]
+        _index_attempted.update((key, w[1]) for w in wanted)
+
+    for table, index, columns in wanted:
+        _create_index_concurrently(database_config, table, index, columns)
+
+
+def start_index_builder(database_config, tables=None):
+    """Run ensure_indexes on a daemon thread so no request waits for DDL."""
+    thread = threading.Thread(
+        target=ensure_indexes, args=(database_config, tables), name="db-indexes", daemon=True
+    )
+    thread.start()
+    return thread
 
 
+def _create_index_concurrently(database_config, table, index, columns):
+    conn = None
+    cur = None
+    try:
+        # pooled connections are autocommit, CONCURRENTLY cannot run inside a transaction
+        conn, cur = get_connection_and_cursor(database_config)
+        cur.execute(sql.SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} ({columns});").format(
+            index=sql.Identifier(index),
+            table=sql.Identifier(table),
+            columns=sql.SQL(", ").join(sql.Identifier(c) for c in columns),
+        ))
+        logger.info(f"Index {index} in place")
+        return True
+
+    except Exception as e:
+        logger.error(f"Could not create index {index} on {table}, not retrying: {e}")
+        # A failed concurrent build leaves an INVALID index that IF NOT EXISTS would skip
+        try:
+            cur.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {index};").format(index=sql.Identifier(index)))
+        except Exception:
+            pass
+        return False
+
+    finally:
+        if cur:
+            cur.close()
+        release_connection(database_config, conn)
 
 def fetch_alarms(database_config):
     """
@@ -95,8 +204,68 @@ def fetch_alarms(database_config):
         # Always close database resources safely
         if cur:
             cur.close()
-        if conn:
-            conn.close()
+        release_connection(database_config, conn)
+
+
+def fetch_alarms_after(database_config, after_date=None, after_time=None, inclusive=False, on_date=None, limit=None,
+                       after_key=None):
+    """
+    Retrieve alarms newer than the (Date, Time) watermark, oldest first.
+    inclusive=True also returns alarms exactly at the watermark.
+    after_key=(Symbol, Alarm) makes the watermark a unique row: only alarms after
+    (Date, Time, Symbol, Alarm) are returned, so a page can end inside a timestamp.
+    on_date limits the result to one day, limit caps the number of rows.
+    Without a watermark or day all alarms are returned.
+    """
+    conn = None
+    cur = None
+    try:
+        conn, cur = get_connection_and_cursor(database_config)
+
+        conditions = []
+        params = []
+        if after_date is not None and after_key is not None:
+            conditions.append('("Date", "Time", "Symbol", "Alarm") > (%s, %s, %s, %s)')
+            params.extend([after_date, after_time, *after_key])
+        elif after_date is not None:
+            operator = ">=" if inclusive else ">"
+            conditions.append(f'("Date", "Time") {operator} (%s, %s)')
+            params.extend([after_date, after_time])
+        if on_date is not None:
+            conditions.append('"Date" = %s')
+            params.append(on_date)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        limit_clause = "LIMIT %s" if limit is not None else ""
+        if limit is not None:
+            params.append(int(limit))
+
+        # Both filters and the ordering are served by the ("Date", "Time") index,
+        # Symbol / Alarm only order rows sharing a timestamp (the cursor's tiebreaker)
+        select_query = f"""
+            SELECT "Symbol", "Time", "Alarm", "Date"
+            FROM alarms
+            {where}
+            ORDER BY "Date" ASC, "Time" ASC, "Symbol" ASC, "Alarm" ASC
+            {limit_clause};
+        """
+        cur.execute(select_query, params)
+
+        rows = cur.fetchall()
+
+        # Get column names dynamically
+        columns = [desc[0] for desc in cur.description]
+
+        return [dict(zip(columns, row)) for row in rows]
+
+    except Exception as e:
+        logger.error(f"Error fetching alarms after {after_date} {after_time}: {e}")
+        return None
+
+    finally:
+        if cur:
+            cur.close()
+        release_connection(database_config, conn)
 
 
 # skip livedata and alarms table
@@ -110,13 +279,11 @@ def fetch_all_table_names(database_config):
         conn, cur = get_connection_and_cursor(database_config)
 
         # SQL command to list all table names in the public schema
-        select_query = """
+        select_query = f"""
                 SELECT table_name
                 FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name NOT ILIKE '%volume_model%'
-                AND table_name NOT IN ('livedata', 'alarms','orders')
-                ORDER BY table_name;
+                {TICKER_TABLES_FILTER}
+                ORDER BY table_name COLLATE "C";
         """
 
         cur.execute(select_query)
@@ -125,6 +292,8 @@ def fetch_all_table_names(database_config):
         # Convert to simple list of table names
         table_names = [row[0] for row in rows]
 
+        _store_table_cache(database_config, table_names)
+
         logger.debug(f"Fetched {len(table_names)} tables.")
         return table_names
 
@@ -135,8 +304,119 @@ def fetch_all_table_names(database_config):
     finally:
         if cur:
             cur.close()
-        if conn:
-            conn.close()
+        release_connection(database_config, conn)
+
+
+def _cache_key(database_config):
+    return tuple(sorted((k, str(v)) for k, v in database_config.items()))
+
+
+def _tables_signature(table_names):
+    """
+    Same value as the md5(string_agg(...)) computed in the last-row query.
+    Both sort by byte order (COLLATE "C"), whatever the database locale.
+    """
+    ordered = sorted(table_names, key=lambda name: name.encode())
+    return hashlib.md5(",".join(ordered).encode()).hexdigest()
+
+
+def _store_table_cache(database_config, table_names, excluded=None):
+    """
+    Cache the table list and pre-build the single last-row query for it.
+    excluded: tables that break the query (e.g. no "Time" column), left out of it.
+    Without it the previous exclusions are kept as long as the catalog signature is the same.
+    """
+    key = _cache_key(database_config)
+    signature = _tables_signature(table_names)
+    if excluded is None:
+        with _table_cache_lock:
+            previous = _table_cache.get(key)
+        excluded = previous["excluded"] if previous and previous["signature"] == signature else ()
+    excluded = frozenset(excluded)
+
+    parts = [
+        sql.SQL(
+            """SELECT {name} AS table_name,
+                   (SELECT row_to_json(t) FROM (SELECT * FROM {table} ORDER BY "Time" DESC LIMIT 1) t) AS row"""
+        ).format(name=sql.Literal(table), table=sql.Identifier(table))
+        for table in table_names
+        if table not in excluded
+    ]
+    # Catalog signature rides along in the same round trip to detect DDL changes
+    parts.append(sql.SQL(
+        """SELECT NULL AS table_name,
+               to_json(md5(coalesce(string_agg(table_name::text, ',' ORDER BY table_name::text COLLATE "C"), '')))
+           FROM information_schema.tables """ + TICKER_TABLES_FILTER
+    ))
+
+    with _table_cache_lock:
+        _table_cache[key] = {
+            "tables": list(table_names),
+            "signature": signature,
+            "excluded": excluded,
+            "query": sql.SQL(" UNION ALL ").join(parts),
+            "fetched_at": time.monotonic(),
+        }
+
+    # Tables created since startup get their "Time" index off the request path
+    with _index_lock:
+        new_tables = [t for t in table_names if (key, f"{t}_time_idx") not in _index_attempted]
+    if new_tables:
+        start_index_builder(database_config, new_tables)
+
+
+def invalidate_table_cache(database_config=None):
+    """Forget the cached table list (all configs when database_config is None)."""
+    with _table_cache_lock:
+        if database_config is None:
+            _table_cache.clear()
+        else:
+            _table_cache.pop(_cache_key(database_config), None)
+
+
+def _get_table_cache(database_config):
+    with _table_cache_lock:
+        cached = _table_cache.get(_cache_key(database_config))
+    if cached and time.monotonic() - cached["fetched_at"] < TABLE_CACHE_TTL:
+        return cached
+
+    if fetch_all_table_names(database_config) is None:
+        return None
+    with _table_cache_lock:
+        return _table_cache.get(_cache_key(database_config))
+
+
+def fetch_change_token(database_config):
+    """
+    Cheap change check for the dashboard feed: one catalog query over the
+    write counters of the alarms and ticker tables (pg_stat_user_tables).
+    The token changes when a row is written or a table is created / dropped,
+    so the full alarm and last-row queries can be skipped while it holds.
+    Returns None on error (callers then poll in full).
+    """
+    conn = None
+    cur = None
+    try:
+        conn, cur = get_connection_and_cursor(database_config)
+        cur.execute("""
+            SELECT md5(coalesce(string_agg(
+                       relname || ':' || (n_tup_ins + n_tup_upd + n_tup_del),
+                       ',' ORDER BY relname COLLATE "C"), ''))
+            FROM pg_stat_user_tables
+            WHERE schemaname = 'public'
+            AND relname NOT ILIKE '%volume_model%'
+            AND relname NOT IN ('livedata', 'orders');
+        """)
+        return cur.fetchone()[0]
+
+    except Exception as e:
+        logger.warning(f"Error fetching change token: {e}")
+        return None
+
+    finally:
+        if cur:
+            cur.close()
+        release_connection(database_config, conn)
 
 
 def fetch_last_row_from_each_table(database_config):
@@ -144,27 +424,87 @@ def fetch_last_row_from_each_table(database_config):
     Fetch the last row from each table in the public schema
     (excluding 'livedata' and 'alarms').
     Returns a dictionary with table names as keys and last row as values.
+
+    All tables are read in one round trip with a generated UNION ALL query.
+    The table list is cached and invalidated when the catalog changes.
+    """
+    for attempt in range(2):
+        cached = _get_table_cache(database_config)
+        if cached is None:
+            return None
+        if not cached["tables"]:
+            logger.warning("No tables found to fetch data from.")
+            return {}
+
+        conn = None
+        cur = None
+        try:
+            conn, cur = get_connection_and_cursor(database_config)
+            cur.execute(cached["query"])
+            rows = cur.fetchall()
+
+        except psycopg2.errors.UndefinedTable as e:
+            logger.info(f"Ticker table dropped, refreshing table list: {e}")
+            invalidate_table_cache(database_config)
+            continue
+
+        except Exception as e:
+            logger.warning(f"Single-query last rows failed, falling back to per-table queries: {e}")
+            failed = []
+            last_rows = _fetch_last_row_per_table(database_config, cached["tables"], failed)
+            if last_rows is not None and failed:
+                # Rebuild the single query without them, until the table list changes
+                logger.warning(f"Leaving {failed} out of the last-row query")
+                _store_table_cache(database_config, cached["tables"], excluded=cached["excluded"].union(failed))
+            return last_rows
+
+        finally:
+            if cur:
+                cur.close()
+            release_connection(database_config, conn)
+
+        last_rows = {}
+        signature = None
+        for table, row in rows:
+            if table is None:
+                signature = row
+            else:
+                last_rows[table] = row
+
+        if signature != cached["signature"] and attempt == 0:
+            logger.info("Ticker table list changed, refreshing.")
+            invalidate_table_cache(database_config)
+            continue
+
+        for table in cached["excluded"]:
+            last_rows[table] = None
+        return last_rows
+
+    # Catalog kept changing under us, answer with the slow path this time
+    return _fetch_last_row_per_table(database_config, fetch_all_table_names(database_config) or [])
+
+
+def _fetch_last_row_per_table(database_config, table_names, failed=None):
+    """
+    One query per table. Only used when the single UNION ALL query fails,
+    e.g. because one table has no "Time" column.
+    Tables whose own query fails are appended to `failed` when given.
     """
     last_rows = {}
     conn = None
     cur = None
     try:
-        table_names = fetch_all_table_names(database_config)
-        if not table_names:
-            logger.warning("No tables found to fetch data from.")
-            return last_rows
-
         conn, cur = get_connection_and_cursor(database_config)
 
         for table in table_names:
             try:
                 # Query to get the last row based on primary key or insertion order
-                query = f"""
+                query = sql.SQL("""
                     SELECT *
                     FROM {table}
                     ORDER BY "Time" DESC
                     LIMIT 1;
-                """
+                """).format(table=sql.Identifier(table))
                 cur.execute(query)
                 row = cur.fetchone()
                 if row:
@@ -184,6 +524,8 @@ def fetch_last_row_from_each_table(database_config):
 
             except Exception as e:
                 last_rows[table] = None
+                if failed is not None:
+                    failed.append(table)
 
         return last_rows
 
@@ -194,8 +536,7 @@ def fetch_last_row_from_each_table(database_config):
     finally:
         if cur:
             cur.close()
-        if conn:
-            conn.close()
+        release_connection(database_config, conn)
 
 
 
@@ -244,8 +585,7 @@ def fetch_active_open_orders(database_config):
         # Always close database resources safely
         if cur:
             cur.close()
-        if conn:
-            conn.close()
+        release_connection(database_config, conn)
 
 
 def update_order_status(database_config, order_id, new_status):
@@ -278,5 +618,4 @@ def update_order_status(database_config, order_id, new_status):
     finally:
         if cur:
             cur.close()
-        if conn:
-            conn.close()
\ No newline at end of file
+        release_connection(database_config, conn)
\ No newline at end of file
@@ -0,0 +1,290 @@
+import base64
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional
+
+from database.db_functions import fetch_alarms_after, fetch_change_token, fetch_last_row_from_each_table
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_alarm(alarm: dict) -> dict:
+    """Convert the alarm's date/time objects to strings for JSON."""
+    for key in ['Date', 'Time']:
+        if key in alarm and not isinstance(alarm[key], str):
+            alarm[key] = str(alarm[key])
+    return alarm
+
+
+def alarm_cursor(alarm: dict) -> str:
+    """
+    Cursor of an alarm for /api/alarms?since=, e.g. '2025-01-31T15:42:10|WyJBQVBMIiwgIlZXQVAiXQ'.
+    (Date, Time) is not unique, so Symbol and Alarm follow as URL-safe base64 JSON.
+    """
+    key = json.dumps([alarm["Symbol"], alarm["Alarm"]]).encode()
+    return f"{alarm['Date']}T{alarm['Time']}|{base64.urlsafe_b64encode(key).decode().rstrip('=')}"
+
+
+def parse_alarm_cursor(since: str):
+    """
+    Split a since-cursor into (date, time, inclusive, key) for fetch_alarms_after.
+    Accepts an alarm_cursor() value, a bare 'YYYY-MM-DDTHH:MM:SS[.ffffff]' timestamp
+    (= everything after it) or a bare date (= everything after that day started).
+    key is (Symbol, Alarm) or None. Raises ValueError for anything else.
+    """
+    if "T" not in since:
+        day = date.fromisoformat(since)
+        return day.isoformat(), "00:00:00", True, None
+
+    stamp, _, encoded = since.partition("|")
+    parsed = datetime.fromisoformat(stamp)
+
+    key = None
+    if encoded:
+        try:
+            key = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+        except Exception:
+            raise ValueError(f"Invalid cursor key: {encoded}")
+        if not isinstance(key, list) or len(key) != 2:
+            raise ValueError(f"Invalid cursor key: {encoded}")
+        key = tuple(key)
+
+    return parsed.date().isoformat(), parsed.time().isoformat(), False, key
+
+
+def format_sse(event: str, data) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class DashboardFeed:
+    """
+    Pushes dashboard deltas to connected browsers (server-sent events).
+
+    One background thread polls the database for every subscriber together:
+      - alarms:     today's alarms, then only rows after the last seen (Date, Time) watermark;
+                    a new day sends a reset and starts over from that day's alarms
+      - last_rows:  the single-query last row of every ticker table, diffed
+                    against the previous poll so only changed rows are sent
+      - tables:     sent when the set of ticker tables changes
+    Each tick first reads a cheap change token (fetch_change_token); the alarm and
+    last-row queries only run when it moved, or every full_poll_interval seconds.
+    The thread only runs while somebody is subscribed, so an idle dashboard
+    causes no database load; when it stops all cached state is dropped. New subscribers first get a full snapshot.
+    Database I/O, listeners and indicator loads run without the subscriber lock,
+    so streams, heartbeats and unsubscribes never wait on a poll.
+    In-process consumers can register add_listener(fn); fn(last_rows) gets the
+    full last-row dict after every successful poll.
+    With an IndicatorEngine, every new alarm carries its symbol's current
+    VWAP / EMA / ATR / cumulative volume under "Indicators".
+    """
+
+    def __init__(self, database_config: dict, interval: float = 1.0, max_queue: int = 1000, indicators=None,
+                 full_poll_interval: float = 30.0):
+        self.database_config = database_config
+        self.interval = interval
+        self.max_queue = max_queue
+        self.indicators = indicators
+        self.full_poll_interval = full_poll_interval
+
+        self._subscribers: List[queue.Queue] = []
+        self._lock = threading.Lock()        # subscribers and the published snapshot
+        self._poll_lock = threading.Lock()   # one poll at a time; taken before _lock, never inside it
+        self._thread: Optional[threading.Thread] = None
+
+        self._alarms: List[dict] = []
+        self._alarm_day: Optional[date] = None         # day the alarm snapshot / watermark belong to
+        self._alarm_watermark = None
+        self._alarms_at_watermark = set()
+        self._last_rows: Optional[Dict[str, Optional[dict]]] = None
+        self._change_token: Optional[str] = None
+        self._full_poll_at = 0.0
+        self._listeners: List[Callable[[Dict[str, Optional[dict]]], None]] = []
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def subscribe(self) -> queue.Queue:
+        """Register a client; its queue starts with a full snapshot."""
+        client: queue.Queue = queue.Queue(maxsize=self.max_queue)
+
+        # Under the poll lock no delta can be computed between the snapshot and the registration
+        with self._poll_lock:
+            events = self._poll() if self._last_rows is None else []
+
+            with self._lock:
+                self._broadcast_locked(events)
+                client.put(("alarms", {"reset": True, "alarms": list(self._alarms)}))
+                client.put(("last_rows", {"reset": True, "rows": dict(self._last_rows or {}), "removed": []}))
+                client.put(("tables", {"tables": sorted(self._last_rows or {})}))
+                self._subscribers.append(client)
+
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="dashboard-feed", daemon=True)
+                    self._thread.start()
+
+        return client
+
+    def add_listener(self, listener: Callable[[Dict[str, Optional[dict]]], None]) -> None:
+        """Call listener(last_rows) after every poll (on the feed thread)."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, client: queue.Queue) -> None:
+        with self._lock:
+            if client in self._subscribers:
+                self._subscribers.remove(client)
+
+    def stream(self, heartbeat: float = 15.0):
+        """Generator of SSE strings for one Flask streaming response."""
+        client = self.subscribe()
+        try:
+            while True:
+                try:
+                    event, data = client.get(timeout=heartbeat)
+                except queue.Empty:
+                    if not self._is_subscribed(client):
+                        return  # dropped as too slow, the browser reconnects for a fresh snapshot
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            self.unsubscribe(client)
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _is_subscribed(self, client: queue.Queue) -> bool:
+        with self._lock:
+            return client in self._subscribers
+
+    def _run(self) -> None:
+        logger.info("Dashboard feed started")
+        while True:
+            time.sleep(self.interval)
+            with self._poll_lock:
+                with self._lock:
+                    if not self._subscribers:
+                        # Drop the cached snapshot so the next subscriber starts fresh
+                        self._last_rows = None
+                        self._reset_alarms_locked()
+                        self._thread = None
+                        logger.info("Dashboard feed stopped, no subscribers")
+                        return
+                try:
+                    events = self._poll()
+                except Exception as e:
+                    logger.error(f"Dashboard feed poll failed: {e}")
+                    continue
+                # Still under the poll lock, so a new subscriber's snapshot never already holds these deltas
+                if events:
+                    with self._lock:
+                        self._broadcast_locked(events)
+
+    def _poll(self) -> list:
+        """
+        Poll the database once and return the (event, data) deltas.
+        Caller holds _poll_lock; _lock is only taken to publish the new snapshot.
+        """
+        events = []
+
+        # --- A new day starts a new alarm snapshot ---
+        today = date.today()
+        if self._alarm_day != today:
+            if self._alarm_day is not None:
+                logger.info(f"Dashboard feed: new day {today}, resetting alarms")
+                events.append(("alarms", {"reset": True, "alarms": []}))
+            with self._lock:
+                self._reset_alarms_locked()
+            self._alarm_day = today
+            self._change_token = None
+
+        # --- Nothing written since the last poll: skip the heavy queries ---
+        # Read before them, so a write that lands during this poll moves the next token
+        token = fetch_change_token(self.database_config)
+        now = time.monotonic()
+        if (
+            token is not None and token == self._change_token
+            and self._last_rows is not None and now < self._full_poll_at
+        ):
+            return events
+
+        # --- Alarms from the watermark on ---
+        # Inclusive, so alarms written later with the same (Date, Time) are not lost;
+        # the ones already sent at the watermark are filtered out below.
+        if self._alarm_watermark is None:
+            fetched = fetch_alarms_after(self.database_config, on_date=today)
+        else:
+            fetched = fetch_alarms_after(self.database_config, *self._alarm_watermark, inclusive=True)
+
+        new_alarms = [
+            a for a in (fetched or [])
+            if (a["Date"], a["Time"]) != self._alarm_watermark
+            or (a["Symbol"], a["Alarm"]) not in self._alarms_at_watermark
+        ]
+
+        if new_alarms:
+            watermark = (new_alarms[-1]["Date"], new_alarms[-1]["Time"])
+            if watermark != self._alarm_watermark:
+                self._alarm_watermark = watermark
+                self._alarms_at_watermark = set()
+            self._alarms_at_watermark.update(
+                (a["Symbol"], a["Alarm"]) for a in new_alarms if (a["Date"], a["Time"]) == watermark
+            )
+            new_alarms = [serialize_alarm(a) for a in new_alarms]
+
+        # --- Last rows, only what changed ---
+        last_rows = fetch_last_row_from_each_table(self.database_config)
+        if last_rows is not None:
+            previous = self._last_rows or {}
+            changed = {t: row for t, row in last_rows.items() if previous.get(t) != row or t not in previous}
+            removed = [t for t in previous if t not in last_rows]
+
+            if changed or removed:
+                events.append(("last_rows", {"reset": False, "rows": changed, "removed": removed}))
+            if set(previous) != set(last_rows) and self._last_rows is not None:
+                events.append(("tables", {"tables": sorted(last_rows)}))
+
+            for listener in self._listeners:
+                try:
+                    listener(last_rows)
+                except Exception as e:
+                    logger.error(f"Dashboard feed listener {listener} failed: {e}")
+
+        # After the listeners, so the values include this poll's last rows
+        if self.indicators is not None:
+            for alarm in new_alarms:
+                alarm["Indicators"] = self.indicators.get(alarm["Symbol"])
+
+        if new_alarms:
+            events.insert(1 if events and events[0][0] == "alarms" else 0,
+                          ("alarms", {"reset": False, "alarms": new_alarms}))
+
+        with self._lock:
+            self._alarms.extend(new_alarms)
+            if last_rows is not None:
+                self._last_rows = last_rows
+
+        # Only a complete poll may be skipped next time
+        if last_rows is not None and fetched is not None:
+            self._change_token = token
+            self._full_poll_at = now + self.full_poll_interval
+        return events
+
+    def _reset_alarms_locked(self) -> None:
+        self._alarms = []
+        self._alarm_day = None
+        self._alarm_watermark = None
+        self._alarms_at_watermark = set()
+
+    def _broadcast_locked(self, events: list) -> None:
+        for client in list(self._subscribers):
+            try:
+                for event in events:
+                    client.put_nowait(event)
+            except queue.Full:
+                logger.warning("Dashboard feed client too slow, disconnecting it")
+                self._subscribers.remove(client)
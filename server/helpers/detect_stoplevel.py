@@ -1,9 +1,25 @@
 import logging
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, time as dt_time
 from decimal import Decimal
-from database.db_functions import fetch_last_n_rows
+from typing import Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+from database.db_functions import fetch_last_n_rows, resolve_table_name
 
 logger = logging.getLogger(__name__)
 
+STOP_METHODS = ("lowest_low", "atr", "swing_low", "vwap_band", "vwap", "ema")
+
+# Answered from the IndicatorEngine's running values instead of the bar window
+INDICATOR_STOP_METHODS = ("vwap", "ema")
+
+# Bars kept per symbol; every method looks at most this far back
+STOP_WINDOW = 60
+
 def detect_stoplevel(database_config, table_name, n):
     """
     Fetch the last 'n' rows from a given table and calculate the stop level
@@ -48,3 +64,223 @@ def detect_stoplevel(database_config, table_name, n):
     except Exception as e:
         logger.error(f"Error in detect_stoplevel: {e}")
         return None
+
+
+def _bar_time(row: dict):
+    """Sortable bar time: datetime (Date + time-of-day combined when both exist), else the time-of-day."""
+    stamp = row.get("Time")
+    day = row.get("Date")
+    try:
+        if isinstance(stamp, str):
+            stamp = datetime.fromisoformat(stamp) if "-" in stamp else dt_time.fromisoformat(stamp)
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+    except ValueError:
+        return None
+
+    if isinstance(stamp, dt_time) and isinstance(day, date):
+        return datetime.combine(day, stamp)
+    if isinstance(stamp, (datetime, dt_time)):
+        return stamp.replace(tzinfo=None) if isinstance(stamp, datetime) else stamp
+    return None
+
+
+def _number(value) -> float:
+    if value is None:
+        return np.nan
+    return float(value)
+
+
+class StopLevelService:
+    """
+    Stop levels answered from memory.
+
+    Keeps a rolling window of the latest bars per ticker table as
+    (Time, High, Low, Close, Volume) rows. A window is loaded once from the
+    database (indexed "Time" query) and then extended incrementally from the
+    dashboard feed's last rows (register on_last_rows with
+    DashboardFeed.add_listener). When the feed is not running a window older
+    than `max_age` seconds is reloaded on the next request.
+
+    Methods (all long-side stops, below price):
+      - lowest_low   lowest Low of the last n bars - offset (the original rule)
+      - atr          last Close - multiplier * ATR(n)
+      - swing_low    most recent pivot low (lower than `strength` bars on both sides) - offset
+      - vwap_band    VWAP of the last n bars - k * volume-weighted std of the typical price
+      - vwap         session VWAP - offset     (needs `indicators`, an IndicatorEngine)
+      - ema          EMA - offset              (needs `indicators`)
+    """
+
+    def __init__(self, database_config: dict, window: int = STOP_WINDOW, max_age: float = 5.0, indicators=None):
+        self.database_config = database_config
+        self.window = window
+        self.max_age = max_age
+        self.indicators = indicators
+
+        self._bars: Dict[str, Deque[Tuple]] = {}       # table -> (Time, High, Low, Close, Volume)
+        self._updated: Dict[str, float] = {}           # table -> monotonic time of last refresh
+        self._feed_seen: Optional[float] = None
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def on_last_rows(self, last_rows: dict) -> None:
+        """DashboardFeed listener: append / replace the newest bar of every tracked table."""
+        now = time.monotonic()
+        with self._lock:
+            self._feed_seen = now
+            for table, bars in list(self._bars.items()):
+                row = last_rows.get(table)
+                if not row:
+                    continue
+                applied = self._add_bar_locked(bars, self._bar(row))
+                if applied is None:
+                    # Time went backwards (new session, other format): reload on the next request
+                    logger.info(f"Bar time of {table} went backwards, dropping its stop window")
+                    del self._bars[table]
+                    self._updated.pop(table, None)
+                elif applied:
+                    self._updated[table] = now
+
+    def stop_level(self, ticker: str, method: str = "lowest_low", n: int = 10, **params) -> Optional[float]:
+        """Stop level for a ticker with one of STOP_METHODS, None when it cannot be computed."""
+        if method not in STOP_METHODS:
+            raise ValueError(f"Unknown stop method '{method}', use one of {STOP_METHODS}")
+
+        table = resolve_table_name(self.database_config, ticker)
+        if table is None:
+            logger.error(f"No ticker table for {ticker}")
+            return None
+
+        if method in INDICATOR_STOP_METHODS:
+            try:
+                level = self._indicator_stop(table, method, **params)
+            except TypeError as e:
+                raise ValueError(f"Invalid parameters for {method}: {e}")
+            if level is None:
+                logger.warning(f"{method} stop not available for {ticker}")
+                return None
+            level = round(float(level), 2)
+            logger.info(f"{ticker} {method} stop level: {level}")
+            return level
+
+        bars = self._window(table)
+        if bars is None or len(bars) == 0:
+            return None
+
+        n = max(1, min(int(n), len(bars)))
+        _, high, low, close, volume = zip(*bars)
+        high, low, close, volume = (np.asarray(col, dtype=float) for col in (high, low, close, volume))
+
+        try:
+            level = getattr(self, f"_{method}")(high[-n:], low[-n:], close[-n:], volume[-n:], close, **params)
+        except TypeError as e:
+            raise ValueError(f"Invalid parameters for {method}: {e}")
+
+        if level is None or not np.isfinite(level):
+            logger.warning(f"{method} stop not available for {ticker}")
+            return None
+
+        level = round(float(level), 2)
+        logger.info(f"{ticker} {method} stop level: {level}")
+        return level
+
+    # ----------------------------
+    # STOP METHODS
+    # ----------------------------
+    @staticmethod
+    def _lowest_low(high, low, close, volume, all_close, offset: float = 0.02):
+        return np.nanmin(low) - offset
+
+    @staticmethod
+    def _atr(high, low, close, volume, all_close, multiplier: float = 1.5):
+        # Previous close for the first bar of the slice comes from the full window
+        prev_close = all_close[-len(close) - 1:-1] if len(all_close) > len(close) else np.r_[np.nan, close[:-1]]
+        true_range = np.nanmax(np.vstack([
+            high - low,
+            np.abs(high - prev_close),
+            np.abs(low - prev_close),
+        ]), axis=0)
+        return close[-1] - multiplier * np.nanmean(true_range)
+
+    @staticmethod
+    def _swing_low(high, low, close, volume, all_close, offset: float = 0.02, strength: int = 2):
+        strength = max(1, int(strength))
+        for i in range(len(low) - 1 - strength, strength - 1, -1):
+            left = low[i - strength:i]
+            right = low[i + 1:i + 1 + strength]
+            if low[i] < left.min() and low[i] <= right.min():
+                return low[i] - offset
+        # No confirmed pivot in the window, fall back to the lowest low
+        return np.nanmin(low) - offset
+
+    @staticmethod
+    def _vwap_band(high, low, close, volume, all_close, k: float = 1.0):
+        typical = (high + low + close) / 3
+        valid = np.isfinite(typical) & np.isfinite(volume) & (volume > 0)
+        if not valid.any():
+            return None
+        weights = volume[valid]
+        vwap = np.average(typical[valid], weights=weights)
+        std = np.sqrt(np.average((typical[valid] - vwap) ** 2, weights=weights))
+        return vwap - k * std
+
+    def _indicator_stop(self, table: str, method: str, offset: float = 0.02) -> Optional[float]:
+        if self.indicators is None:
+            raise ValueError(f"Stop method '{method}' needs the indicator engine")
+        values = self.indicators.get(table)
+        if not values or values.get(method) is None:
+            return None
+        return values[method] - offset
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _window(self, table: str):
+        now = time.monotonic()
+        with self._lock:
+            bars = self._bars.get(table)
+            updated = self._updated.get(table, 0.0)
+            if bars is not None and now - updated <= self.max_age:
+                return list(bars)
+
+        # Not tracked yet or no feed updates lately: reload from the database
+        rows = fetch_last_n_rows(self.database_config, table, self.window)
+        if rows is None:
+            return None
+
+        bars = deque((self._bar(r) for r in reversed(rows)), maxlen=self.window)
+        with self._lock:
+            self._bars[table] = bars
+            self._updated[table] = now
+            return list(bars)
+
+    @staticmethod
+    def _bar(row: dict) -> Tuple:
+        return (
+            _bar_time(row),
+            _number(row.get("High")),
+            _number(row.get("Low")),
+            _number(row.get("Close")),
+            _number(row.get("Volume")),
+        )
+
+    @staticmethod
+    def _add_bar_locked(bars: Deque[Tuple], bar: Tuple) -> Optional[bool]:
+        """True when the bar was applied, False when it is unusable, None when time went backwards."""
+        if bar[0] is None:
+            return False
+        if not bars:
+            bars.append(bar)
+            return True
+        try:
+            if bar[0] == bars[-1][0]:
+                bars[-1] = bar      # same bar updated in place
+                return True
+            if bar[0] > bars[-1][0]:
+                bars.append(bar)
+                return True
+        except TypeError:
+            pass                    # datetime vs time-of-day: the Time format changed
+        return None
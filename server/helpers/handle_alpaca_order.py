@@ -4,8 +4,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-from ibclient import get_last_ask_price
-from common.calculate import calculate_position_size
+from common.calculate import SIZE_OK, calculate_position_sizes
+from ibsession.quote_service import QuoteService
 
 @dataclass
 class Order:
@@ -14,14 +14,18 @@ class Order:
     stop_price: float
     latest_price: float = 0.0   # default 0.0, will be updated from IB
     position_size: int = 0       # default 0, calculated later
+    size_reason: str = SIZE_OK   # why position_size is 0 (see calculate_position_sizes)
 
 
-def handle_orders_data(open_orders: list, ib, project_config: dict) -> List[Order]:
+def handle_orders_data(open_orders: list, ib, project_config: dict, quotes: QuoteService = None) -> List[Order]:
     """
     Process Alpaca + DB orders: fetch latest prices and calculate position sizes.
+    Prices for all orders come from one batched quote request.
     """
     processed_orders: List[Order] = []
 
+    # --- Normalize orders first so every symbol is known before quoting ---
+    pending = []
     for order in open_orders:
         try:
             raw_id = order.get("id") or order.get("Id")
@@ -43,34 +47,7 @@ def handle_orders_data(open_orders: list, ib, project_config: dict) -> List[Orde
             if effective_stop <= 0:
                 continue
 
-            latest_price = float(get_last_ask_price(ib, symbol) or 0.0)
-            if latest_price <= 0:
-                continue
-
-            position_size = calculate_position_size(
-                latest_price,
-                effective_stop,
-                project_config["Risk"]
-            )
-
-            processed_order = Order(
-                id=order_id,
-                symbol=symbol,
-                stop_price=effective_stop,
-                latest_price=latest_price,
-                position_size=position_size
-            )
-
-            processed_orders.append(processed_order)
-
-            logger.info(
-                "Processed %s | ID: %s | Stop: %.2f | Last: %.2f | Pos: %d",
-                symbol,
-                order_id,
-                effective_stop,
-                latest_price,
-                position_size
-            )
+            pending.append((order_id, symbol, effective_stop))
 
         except Exception as e:
             logger.error(
@@ -80,4 +57,51 @@ def handle_orders_data(open_orders: list, ib, project_config: dict) -> List[Orde
             )
             continue
 
-    return processed_orders
\ No newline at end of file
+    if not pending:
+        return processed_orders
+
+    # --- One batch of quotes, reusing live subscriptions ---
+    owns_quotes = quotes is None
+    if owns_quotes:
+        quotes = QuoteService()
+    try:
+        ask_prices = quotes.get_ask_prices(ib, [symbol for _, symbol, _ in pending])
+    finally:
+        if owns_quotes:
+            quotes.close(ib)
+
+    # --- Size every order in one vectorized pass ---
+    latest_prices = [float(ask_prices.get(symbol.upper()) or 0.0) for _, symbol, _ in pending]
+    sizes = calculate_position_sizes(
+        latest_prices,
+        [effective_stop for _, _, effective_stop in pending],
+        project_config["Risk"],
+        lot_size=project_config.get("lot_size", 1),
+        max_notional=project_config.get("max_notional"),
+    )
+
+    for (order_id, symbol, effective_stop), latest_price, size in zip(pending, latest_prices, sizes.itertuples()):
+        if latest_price <= 0:
+            continue
+        if size.reason != SIZE_OK:
+            logger.warning("%s: position size 0 (%s)", symbol, size.reason)
+
+        processed_orders.append(Order(
+            id=order_id,
+            symbol=symbol,
+            stop_price=effective_stop,
+            latest_price=latest_price,
+            position_size=int(size.position_size),
+            size_reason=size.reason,
+        ))
+
+        logger.info(
+            "Processed %s | ID: %s | Stop: %.2f | Last: %.2f | Pos: %d",
+            symbol,
+            order_id,
+            effective_stop,
+            latest_price,
+            size.position_size
+        )
+
+    return processed_orders
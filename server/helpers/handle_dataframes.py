@@ -7,133 +7,144 @@ from typing import Optional, List,Dict
 # Tämä on erillinen koodikirjasto jolla käsittelen sisään tulevia bars dataa pandas dataframeiksi
 logger = logging.getLogger(__name__)  # module-specific logger
 
-from dataclasses import dataclass, asdict
+import numpy as np
 from datetime import datetime
 from typing import Optional
 from zoneinfo import ZoneInfo
+from common.volume_profile import minute_of_day
+from common.indicators import EMA_PERIOD, add_indicators
 
-@dataclass
-class IncomingBar:
-    date: datetime
-    open: float
-    high: float
-    low: float
-    close: float
-    volume: float
-    average: Optional[float]
-    barCount: Optional[int]
+# Bars move through this module as columns: int64 epoch (UTC seconds) + float64 OHLCV
+OHLCV_FIELDS = ("open", "high", "low", "close", "volume")
 
+# VWAP resets with the exchange session, not with the display time zone's midnight
+EXCHANGE_TZ = "America/New_York"
 
-def incoming_bars_to_datamodel_format(bars) -> List[IncomingBar]:
+
+def bars_to_columns(bars) -> Dict[str, np.ndarray]:
     """
-    Convert a list of raw IBKR bar objects into a list of IncomingBar dataclasses.
-    
-    Each bar must have attributes: date, open, high, low, close, volume
-    Optional: average, barCount
+    Convert raw IBKR bar objects (or a BAR_DTYPE structured array) straight into
+    NumPy columns without building per-bar dataclasses or dicts.
+
+    Returns {"epoch": int64[n], "open"/"high"/"low"/"close"/"volume": float64[n]}.
     """
-    incoming_bars = []
-    
-    for bar in bars:
-        incoming_bars.append(
-            IncomingBar(
-                date=bar.date,
-                open=bar.open,
-                high=bar.high,
-                low=bar.low,
-                close=bar.close,
-                volume=bar.volume,
-                average=getattr(bar, "average", None),
-                barCount=getattr(bar, "barCount", None)
-            )
-        )
+    if isinstance(bars, np.ndarray):
+        return {name: np.asarray(bars[name]) for name in ("epoch",) + OHLCV_FIELDS}
 
-    return incoming_bars
+    n = len(bars)
+    columns = {
+        # naive datetimes are treated as UTC
+        "epoch": pd.to_datetime([bar.date for bar in bars], utc=True).asi8 // 10**9
+        if n else np.empty(0, dtype=np.int64)
+    }
+    for name in OHLCV_FIELDS:
+        columns[name] = np.fromiter((getattr(bar, name) for bar in bars), dtype=np.float64, count=n)
 
+    return columns
 
 
-def intraday_datapipe(bars: List[IncomingBar], time_zone:str) -> pd.DataFrame:
+def intraday_datapipe(columns: Dict[str, np.ndarray], time_zone: str) -> pd.DataFrame:
     """
-    Convert a list of IncomingBar dataclasses to a pandas DataFrame.
-    Keeps datetime as timezone-aware and capitalizes all column names.
+    Build the intraday DataFrame from bar columns.
+    Timezone conversion is vectorized and time-of-day is kept as an integer
+    minute key ('Minute', 0..1439 in time_zone) instead of datetime.time objects.
     """
+    days, minutes = minute_of_day(columns["epoch"], time_zone)
 
-    # Convert dataclasses to DataFrame
-    df = pd.DataFrame([asdict(bar) for bar in bars])
-
-    # Drop optional columns if present
-    df = df.drop(columns=[c for c in ["average", "barCount"] if c in df.columns])
+    return pd.DataFrame({
+        "Date": days,
+        "Minute": minutes,
+        "Open": columns["open"],
+        "High": columns["high"],
+        "Low": columns["low"],
+        "Close": columns["close"],
+        "Volume": columns["volume"],
+    })
 
-    # --- Convert datetime to Helsinki timezone ---
-    df["date"] = pd.to_datetime(df["date"], utc=True)  # treat all as UTC
-    df["date"] = df["date"].dt.tz_convert(ZoneInfo(time_zone))  # convert to Helsinki coming from project config
 
-    # --- Split Date / Time for readability ---
-    df["Date"] = df["date"].dt.date      # keep only date part
-    df["Time"] = df["date"].dt.time      # optional: separate Time column
+def daily_datapipe(bars) -> pd.DataFrame:
+    """
+    Convert a list of daily IBKR bars to a pandas DataFrame with capitalized column names.
+    """
+    columns = {name: np.fromiter((getattr(bar, name) for bar in bars), dtype=np.float64, count=len(bars))
+               for name in OHLCV_FIELDS}
 
-    # Drop original 'date' column if you want
-    df = df.drop(columns=["date"])
+    df = pd.DataFrame(columns)
+    df.insert(0, "date", [bar.date for bar in bars])
 
     # Capitalize all remaining column names
     df.columns = [col.capitalize() for col in df.columns]
 
     return df
 
-def daily_datapipe(bars: List[IncomingBar]) -> pd.DataFrame:
+
+def split_session_bars(bars, exchange_tz: str = EXCHANGE_TZ) -> tuple[list, list]:
     """
-    Convert a list of IncomingBar dataclasses to a pandas DataFrame.
-    Keeps datetime as timezone-aware and capitalizes all column names.
+    Split a multi-day list of intraday IBKR bars into (current session, prior sessions).
+
+    Sessions are grouped by calendar date in the exchange timezone, so the
+    extended-hours session is never cut in half by a local midnight.
+    The most recent session date counts as the current session.
     """
+    if not bars:
+        return [], []
 
-    # Convert dataclasses to DataFrame
-    df = pd.DataFrame([asdict(bar) for bar in bars])
+    session_dates = (
+        pd.to_datetime([bar.date for bar in bars], utc=True)
+        .tz_convert(ZoneInfo(exchange_tz))
+        .date
+    )
+    current_session = session_dates.max()
 
-    # Capitalize all remaining column names
-    df.columns = [col.capitalize() for col in df.columns]
+    today_bars = [bar for bar, d in zip(bars, session_dates) if d == current_session]
+    prior_bars = [bar for bar, d in zip(bars, session_dates) if d != current_session]
 
-    return df
+    return today_bars, prior_bars
 
 
-def handle_incoming_dataframe_intraday(bars: List[IncomingBar], symbol:str, time_zone:str)-> pd.DataFrame:
+def handle_incoming_dataframe_intraday(bars, symbol:str, time_zone:str)-> pd.DataFrame:
     """
-    Process IBKR bars into a pandas DataFrame (or dataclasses if needed):
+    Process IBKR bars (or a BAR_DTYPE array) into a pandas DataFrame:
     - Adjust timezone
     - Calculate VWAP / EMA9
     """
-    # Step 1: Convert to dataclasses
-    incoming_bars = incoming_bars_to_datamodel_format(bars)
+    # Step 1: Convert to columns
+    columns = bars_to_columns(bars)
 
     # Step 2: Convert to DataFrame
-    df = intraday_datapipe(incoming_bars,time_zone)
+    df = intraday_datapipe(columns, time_zone)
 
     # Step 4: Assign symbol
     df["Symbol"] = symbol
 
     # Step 5: Calculate indicators
+    sessions, _ = minute_of_day(columns["epoch"], EXCHANGE_TZ)
+    df = add_indicators(df, sessions=sessions)
 
     # --- Reorder columns ---
     desired_order = [
-        "Symbol","Date", "Time","Open", "High", "Low", "Close", "Volume"
+        "Symbol","Date", "Minute","Open", "High", "Low", "Close", "Volume",
+        "VWAP", f"EMA{EMA_PERIOD}", "ATR", "Cum_volume"
     ]
     df = df[desired_order]
     return df
 
 
 
-def handle_incoming_dataframe_intradays_volume(bars: List[IncomingBar], symbol:str, time_zone:str)-> pd.DataFrame:
+def handle_incoming_dataframe_intradays_volume(bars, symbol:str, time_zone:str)-> pd.DataFrame:
 
-    # Step 1: Convert to dataclasses
-    incoming_bars = incoming_bars_to_datamodel_format(bars)
+    # Step 1: Convert to columns
+    columns = bars_to_columns(bars)
 
     # Step 2: Convert to DataFrame
-    df = intraday_datapipe(incoming_bars,time_zone)
+    df = intraday_datapipe(columns, time_zone)
 
     # Step 4: Assign symbol
     df["Symbol"] = symbol
 
     # --- Reorder columns ---
     desired_order = [
-        "Symbol","Date","Time", "Open", "High", "Low", "Close", "Volume"]
+        "Symbol","Date","Minute", "Open", "High", "Low", "Close", "Volume"]
     
     df = df[desired_order]
     # Step 5: Calculate average volume model
@@ -154,17 +165,17 @@ def handle_intraday_rvol_dataset(intraday_results: list[pd.DataFrame], avg_volum
         symbol = intraday_df['Symbol'].iloc[0]
 
         # Ensure avg_volume_df has the necessary columns
-        required_cols = ['Symbol', 'Time', 'Avg_volume']
+        required_cols = ['Symbol', 'Minute', 'Avg_volume']
         for col in required_cols:
             if col not in avg_volume_df.columns:
                 logger.error(f"Avg volume DataFrame for {symbol} missing column: {col}")
                 continue
 
-        # Merge intraday with avg volume on Symbol, Date, Time
+        # Merge intraday with avg volume on Symbol, Minute
         merged_df = pd.merge(
             intraday_df,
             avg_volume_df[required_cols],
-            on=['Symbol', 'Time'],
+            on=['Symbol', 'Minute'],
             how='left'
         )
         merged_df = calculate_rvol(merged_df)
@@ -2,9 +2,18 @@ from datetime import datetime, timedelta
 import pytz
 import pandas as pd
 import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from ibclient import REQUEST_TIMEOUT, run_until_complete
 
 logger = logging.getLogger(__name__)
 
+# Rolling window for the entries-per-hour throttles
+ENTRY_THROTTLE_WINDOW = 3600.0
+
 def is_entry_allowed(executions_df: pd.DataFrame, symbol: str, project_config: dict):
     """
     Returns (allowed: bool, message: str)
@@ -72,3 +81,193 @@ def is_entry_allowed(executions_df: pd.DataFrame, symbol: str, project_config: d
         message = f"Error in is_entry_allowed: {e}"
         logging.error(message)
         return False, message
+
+
+class ExecutionIndex:
+    """
+    In-memory execution index for the entry throttles, kept current from IB execDetails events.
+
+      - symbol -> last fill time               (max_entry_freq_minutes rule)
+      - entries per symbol / overall in the last ENTRY_THROTTLE_WINDOW
+                                               (max_entries_per_hour, max_entries_per_hour_total)
+
+    An entry is one order, counted on its first fill. Stop legs of a bracket
+    and market orders (position closes) are exits and not counted; fills whose
+    order is unknown count as entries.
+
+    Every check is O(1) apart from dropping expired entries. Register attach()
+    as an IB session connect callback; reads are safe from any thread.
+    """
+
+    def __init__(self, window: float = ENTRY_THROTTLE_WINDOW):
+        self.window = window
+
+        self._last_fill: Dict[str, float] = {}                     # symbol -> epoch seconds
+        self._entries: Dict[str, Deque[float]] = {}                # symbol -> entry epochs, oldest first
+        self._all_entries: Deque[Tuple[float, str]] = deque()      # (epoch, symbol), oldest first
+        self._seen_orders: Set[int] = set()                        # permIds already counted
+        self._lock = threading.Lock()
+        self._ready = False
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def attach(self, ib) -> None:
+        """Connect callback: rehydrate from IB executions and follow new fills."""
+        ib.execDetailsEvent -= self._on_exec_details
+        ib.execDetailsEvent += self._on_exec_details
+        self.rehydrate(ib)
+
+    def rehydrate(self, ib) -> None:
+        """Rebuild the index from the executions IB reports for this session."""
+        try:
+            fills = run_until_complete(ib, ib.reqExecutionsAsync(), REQUEST_TIMEOUT, "Executions request")
+        except Exception as e:
+            logging.warning(f"Execution index rehydrate falling back to cached fills: {e}")
+            fills = ib.fills()
+
+        trades = {t.order.permId: t for t in ib.trades() if t.order and t.order.permId}
+
+        with self._lock:
+            self._last_fill.clear()
+            self._entries.clear()
+            self._all_entries.clear()
+            self._seen_orders.clear()
+            for fill in sorted(fills, key=lambda f: f.execution.time):
+                self._record_fill_locked(fill, trades.get(fill.execution.permId))
+            self._ready = True
+
+        logging.info(
+            f"Execution index ready ({len(self._last_fill)} symbols with fills, "
+            f"{len(self._all_entries)} entries in the last {self.window / 60:.0f} min)"
+        )
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return self._ready
+
+    def record(self, symbol: str, epoch: float, perm_id: Optional[int] = None, is_entry: bool = True) -> None:
+        """Add one fill (e.g. from tests or another feed)."""
+        with self._lock:
+            self._record_locked(symbol, epoch, perm_id, is_entry)
+
+    def last_fill_epoch(self, symbol: str) -> Optional[float]:
+        with self._lock:
+            return self._last_fill.get(symbol)
+
+    def entries_in_window(self, symbol: Optional[str] = None) -> int:
+        """Entries in the rolling window for one symbol, or overall without a symbol."""
+        with self._lock:
+            self._expire_locked(time.time())
+            if symbol is None:
+                return len(self._all_entries)
+            return len(self._entries.get(symbol, ()))
+
+    def check_entry(self, symbol: str, project_config: dict):
+        """
+        Returns (allowed: bool, message: str)
+
+        Entry is allowed when:
+          - the symbol's last fill is older than max_entry_freq_minutes, AND
+          - the symbol has fewer than max_entries_per_hour entries in the window, AND
+          - all symbols together have fewer than max_entries_per_hour_total entries.
+        The two hourly limits are optional.
+        """
+        threshold_minutes = project_config["max_entry_freq_minutes"]
+        per_symbol_limit = project_config.get("max_entries_per_hour")
+        total_limit = project_config.get("max_entries_per_hour_total")
+        now = time.time()
+
+        with self._lock:
+            self._expire_locked(now)
+            last_fill = self._last_fill.get(symbol)
+            symbol_entries = len(self._entries.get(symbol, ()))
+            total_entries = len(self._all_entries)
+
+        if per_symbol_limit is not None and symbol_entries >= per_symbol_limit:
+            message = (
+                f"Entry NOT allowed for {symbol}: {symbol_entries} entries in the last "
+                f"{self.window / 60:.0f} minutes (limit: {per_symbol_limit})"
+            )
+            logging.info(message)
+            return False, message
+
+        if total_limit is not None and total_entries >= total_limit:
+            message = (
+                f"Entry NOT allowed for {symbol}: {total_entries} entries across all symbols in the last "
+                f"{self.window / 60:.0f} minutes (limit: {total_limit})"
+            )
+            logging.info(message)
+            return False, message
+
+        if last_fill is None:
+            message = f"No previous executions for {symbol}. Entry allowed."
+            logging.info(message)
+            return True, message
+
+        elapsed = now - last_fill
+        minutes = int(elapsed // 60)
+        seconds = int(elapsed % 60)
+
+        if elapsed <= threshold_minutes * 60:
+            message = (
+                f"Entry NOT allowed for {symbol}: last execution was "
+                f"{minutes}m {seconds}s ago (limit: {threshold_minutes} minutes)"
+            )
+            logging.info(message)
+            return False, message
+
+        message = (
+            f"Entry allowed for {symbol}: last execution was "
+            f"{minutes}m {seconds}s ago (limit: {threshold_minutes} minutes)"
+        )
+        logging.info(message)
+        return True, message
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _on_exec_details(self, trade, fill) -> None:
+        with self._lock:
+            self._record_fill_locked(fill, trade)
+
+    def _record_fill_locked(self, fill, trade=None) -> None:
+        try:
+            if not fill.execution or not fill.contract:
+                return
+            is_entry = True
+            if trade is not None and trade.order:
+                is_entry = not trade.order.parentId and trade.order.orderType != "MKT"
+            self._record_locked(
+                fill.contract.symbol,
+                fill.execution.time.timestamp(),
+                fill.execution.permId,
+                is_entry,
+            )
+        except Exception as e:
+            logging.error(f"Execution index could not record fill: {e}")
+
+    def _record_locked(self, symbol: str, epoch: float, perm_id: Optional[int], is_entry: bool) -> None:
+        if epoch > self._last_fill.get(symbol, 0.0):
+            self._last_fill[symbol] = epoch
+
+        # Partial fills of the same order count as one entry
+        if not is_entry or (perm_id and perm_id in self._seen_orders):
+            return
+        if perm_id:
+            self._seen_orders.add(perm_id)
+        if time.time() - epoch > self.window:
+            return
+
+        self._entries.setdefault(symbol, deque()).append(epoch)
+        self._all_entries.append((epoch, symbol))
+
+    def _expire_locked(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._all_entries and self._all_entries[0][0] < cutoff:
+            _, symbol = self._all_entries.popleft()
+            entries = self._entries.get(symbol)
+            if entries:
+                entries.popleft()
+                if not entries:
+                    del self._entries[symbol]
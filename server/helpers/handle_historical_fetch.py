@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ib_insync import IB, BarDataList, Contract
+from common.throttle import TokenBucket
+from ibsession.contract_cache import contract_cache
+
+logger = logging.getLogger(__name__)
+
+# IB historical-data pacing. A burst of HISTORICAL_BURST requests is let
+# through, then requests are released at HISTORICAL_RATE per second.
+# IB also caps the number of simultaneous historical requests (50).
+HISTORICAL_BURST = 40
+HISTORICAL_RATE = 1.0
+HISTORICAL_MAX_CONCURRENT = 10
+HISTORICAL_TIMEOUT = 30.0
+
+# Shared by every fetch in this process so back-to-back scans are paced together
+historical_bucket = TokenBucket(rate=HISTORICAL_RATE, capacity=HISTORICAL_BURST)
+
+
+@dataclass
+class HistoricalRequest:
+    symbol: str
+    duration: str
+    bar_size: str = "2 mins"
+    what_to_show: str = "TRADES"
+    use_rth: bool = False
+    end: str = ""
+    contract: Optional[Contract] = None
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return (self.symbol, self.duration, self.bar_size)
+
+
+async def qualify_requests_async(ib: IB, requests: List[HistoricalRequest]) -> None:
+    """Fill in missing contracts from the shared cache, qualifying all cache misses in one batch."""
+    symbols = [req.symbol for req in requests if req.contract is None]
+    if not symbols:
+        return
+
+    contracts = await contract_cache.qualify_async(ib, symbols)
+
+    for req in requests:
+        if req.contract is None:
+            req.contract = contracts.get(req.symbol.upper())
+
+
+async def _fetch_one(
+    ib: IB,
+    req: HistoricalRequest,
+    bucket: TokenBucket,
+    semaphore: asyncio.Semaphore,
+    timeout: float,
+) -> Tuple[HistoricalRequest, Optional[BarDataList]]:
+    if req.contract is None:
+        logger.warning(f"Could not qualify contract for {req.symbol}, skipping {req.duration} history")
+        return req, None
+
+    async with semaphore:
+        await bucket.acquire()
+        try:
+            bars = await ib.reqHistoricalDataAsync(
+                req.contract,
+                endDateTime=req.end,
+                durationStr=req.duration,
+                barSizeSetting=req.bar_size,
+                whatToShow=req.what_to_show,
+                useRTH=req.use_rth,
+                timeout=timeout,
+            )
+        except Exception as e:
+            logger.error(f"Historical request {req.key} failed: {e}")
+            return req, None
+
+    if not bars:
+        logger.warning(f"No historical data returned for {req.key}")
+        return req, None
+    return req, bars
+
+
+async def fetch_histories_async(
+    ib: IB,
+    requests: List[HistoricalRequest],
+    bucket: TokenBucket = historical_bucket,
+    max_concurrent: int = HISTORICAL_MAX_CONCURRENT,
+    timeout: float = HISTORICAL_TIMEOUT,
+) -> Dict[Tuple[str, str, str], Optional[BarDataList]]:
+    """
+    Fan out all historical requests concurrently through the async API,
+    paced by `bucket` and capped at `max_concurrent` in flight.
+    Results are collected as they finish and keyed by HistoricalRequest.key.
+    """
+    started = time.monotonic()
+    await qualify_requests_async(ib, requests)
+
+    semaphore = asyncio.Semaphore(max_concurrent)
+    tasks = [_fetch_one(ib, req, bucket, semaphore, timeout) for req in requests]
+
+    results = {}
+    for finished in asyncio.as_completed(tasks):
+        req, bars = await finished
+        results[req.key] = bars
+
+    logger.info(
+        f"Fetched {sum(b is not None for b in results.values())}/{len(requests)} "
+        f"historical series in {time.monotonic() - started:.2f}s"
+    )
+    return results
+
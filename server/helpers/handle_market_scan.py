@@ -2,6 +2,9 @@ from helpers.handle_dataframes import *
 import logging
 from ib_insync import *
 import pandas as pd
+from ibclient import request_snapshots
+from ibsession.contract_cache import contract_cache
+from helpers.handle_historical_fetch import HistoricalRequest, fetch_histories_async
 
 logger = logging.getLogger(__name__)
 
@@ -54,12 +57,8 @@ def handle_scandata_from_ib(df_scan: pd.DataFrame) -> list:
 
 
 def contract_from_dict(d: dict) -> Contract:
-    """Convert a raw contract dict back into an ib_insync Contract object."""
-    c = Contract()
-    for k, v in d.items():
-        # ib_insync Contract supports direct attribute assignment
-        setattr(c, k, v)
-    return c
+    """Convert a raw contract dict back into an ib_insync Contract object (cached by conId)."""
+    return contract_cache.from_dict(d)
 
 
 def fetch_snapshot_prices(ib: IB, results: list) -> dict:
@@ -71,7 +70,7 @@ def fetch_snapshot_prices(ib: IB, results: list) -> dict:
       }
     }
     """
-    tickers_raw = {}
+    contracts = {}
     output = {"Symbol": {}}
 
     for item in results:
@@ -81,26 +80,18 @@ def fetch_snapshot_prices(ib: IB, results: list) -> dict:
         if not cdict or not symbol:
             continue
 
-        contract = contract_from_dict(cdict)
+        contracts[symbol] = contract_from_dict(cdict)
 
-        ticker = ib.reqMktData(
-            contract=contract,
-            genericTickList="",
-            snapshot=True,
-            regulatorySnapshot=False
-        )
-
-        tickers_raw[symbol] = (contract, ticker)
+    # Returns as soon as IB has ended every snapshot (capped by SNAPSHOT_TIMEOUT)
+    tickers = request_snapshots(ib, list(contracts.values()))
 
-    ib.sleep(2)
-
-    for symbol, (contract, ticker) in tickers_raw.items():
+    for symbol, ticker in zip(contracts.keys(), tickers):
         last_price = getattr(ticker, "last", None)
         output["Symbol"][symbol] = {"last_price": last_price}
 
     return output
 
-def fetch_yesterday_close(ib: IB, results: list) -> dict:
+async def fetch_yesterday_close_async(ib: IB, results: list) -> dict:
     """
     Returns:
     {
@@ -108,9 +99,11 @@ def fetch_yesterday_close(ib: IB, results: list) -> dict:
         "SYM": { "yesterday_close": ... }
       }
     }
+    All daily bars are requested concurrently, awaited on the IB session loop.
     """
     output = {"Symbol": {}}
 
+    requests = {}
     for item in results:
         cdict = item.get("contract")
         symbol = item.get("symbol", "")
@@ -118,74 +111,31 @@ def fetch_yesterday_close(ib: IB, results: list) -> dict:
         if not cdict or not symbol:
             continue
 
-        contract = contract_from_dict(cdict)
-
-        bars = ib.reqHistoricalData(
-            contract=contract,
-            endDateTime='',
-            durationStr='1 D',
-            barSizeSetting='1 day',
-            whatToShow='TRADES',
-            useRTH=True
+        requests[symbol] = HistoricalRequest(
+            symbol=symbol, duration="1 D", bar_size="1 day", use_rth=True, contract=contract_from_dict(cdict)
         )
 
-        if bars:
-            yclose = bars[0].close
-        else:
-            yclose = None
+    histories = await fetch_histories_async(ib, list(requests.values()))
 
-        output["Symbol"][symbol] = {"yesterday_close": yclose}
+    for symbol, req in requests.items():
+        bars = histories.get(req.key)
+        output["Symbol"][symbol] = {"yesterday_close": bars[0].close if bars else None}
 
     return output
 
 
-# --- Historical fetch intraday until this moment---
-def fetch_intraday_history(ib: IB, symbol: str, time_zone: str):
-    logging.info(f"Requesting intraday data for {symbol}")
-
-    contract = Stock(symbol, "SMART", "USD")
-    ib.qualifyContracts(contract)
-
-    bars = ib.reqHistoricalData(
-        contract,
-        endDateTime="",
-        durationStr="1 D",
-        barSizeSetting="2 mins",
-        whatToShow="TRADES",
-        useRTH=False
-    )
-
-    if not bars:
-        logging.warning(f"No historical data returned for {symbol}")
-        return None
-    
-    # Process bars directly using the intraday handler
-    processed_df = handle_incoming_dataframe_intraday(bars, symbol,time_zone)
-
-    return processed_df
-        
-# --- Historical fetch for Rvol calculation ---
-def fetch_intraday_volume_history(ib: IB, symbol: str, time_zone: str):
-    logging.info(f"Requesting Rvol data for {symbol}")
-
-    contract = Stock(symbol, "SMART", "USD")
-    ib.qualifyContracts(contract)
-
-    bars = ib.reqHistoricalData(
-        contract,
-        endDateTime="",
-        durationStr="5 D",
-        barSizeSetting="2 mins",
-        whatToShow="TRADES",
-        useRTH=False
-    )
-
-    if not bars:
-        logging.warning(f"No 5-day historical data returned for {symbol}")
-        return None
-    
-    # Process bars directly using the intraday handler
-    processed_df = handle_incoming_dataframe_intradays_volume(bars, symbol,time_zone)
-
-    return processed_df
+def intraday_and_baseline_from_bars(bars, symbol: str, time_zone: str):
+    """Build (intraday_df, avg_volume_df) from one multi-day bar list."""
+    today_bars, prior_bars = split_session_bars(bars)
+    return intraday_and_baseline_from_sessions(today_bars, prior_bars, symbol, time_zone)
+
+
+def intraday_and_baseline_from_sessions(today_bars, prior_bars, symbol: str, time_zone: str):
+    """Build (intraday_df, avg_volume_df) from bars already split into current and prior sessions."""
+    intraday_df = handle_incoming_dataframe_intraday(today_bars, symbol, time_zone) if len(today_bars) else None
+    avg_df = handle_incoming_dataframe_intradays_volume(prior_bars, symbol, time_zone) if len(prior_bars) else None
+
+    if avg_df is None:
+        logging.warning(f"No prior sessions in history for {symbol}, Rvol baseline unavailable")
 
+    return intraday_df, avg_df
@@ -1,8 +1,13 @@
 import pandas as pd
-from dataclasses import dataclass, asdict,field
+import numpy as np
+from dataclasses import dataclass, field, fields
 from typing import Optional
 
 
+# Shown as OpenRisk when a position has no stop order
+NO_STOP_RISK = 999999999
+
+
 @dataclass
 class PortfolioPosition:
     Symbol: str
@@ -14,6 +19,34 @@ class PortfolioPosition:
     OpenRisk: Optional[float] = field(default=0.0)
 
 
+RISK_COLUMNS = [f.name for f in fields(PortfolioPosition)]
+
+
+def aggregate_stop_orders(orders_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per symbol from all of its STP orders:
+      - AuxPrice  quantity-weighted stop price over the stop legs
+      - StopQty   total quantity of the stop legs
+    Scaled-in stops (several legs per symbol) thus give one aggregate stop.
+    """
+    if orders_df is None or orders_df.empty or not {"Symbol", "OrderType", "AuxPrice"} <= set(orders_df.columns):
+        return pd.DataFrame(columns=["Symbol", "AuxPrice", "StopQty"])
+
+    stops = orders_df.loc[orders_df["OrderType"] == "STP", ["Symbol", "AuxPrice"]].copy()
+    stops["AuxPrice"] = pd.to_numeric(stops["AuxPrice"], errors="coerce")
+
+    qty = orders_df.loc[stops.index, "TotalQty"] if "TotalQty" in orders_df.columns else pd.Series(np.nan, index=stops.index)
+    qty = pd.to_numeric(qty, errors="coerce").abs()
+    # Legs without a usable quantity weigh as one
+    stops["StopQty"] = qty.where(qty > 0, 1.0)
+
+    stops = stops.dropna(subset=["AuxPrice"])
+    stops["Weighted"] = stops["AuxPrice"] * stops["StopQty"]
+
+    grouped = stops.groupby("Symbol", as_index=False)[["Weighted", "StopQty"]].sum()
+    grouped["AuxPrice"] = grouped["Weighted"] / grouped["StopQty"]
+    return grouped[["Symbol", "AuxPrice", "StopQty"]]
+
 
 def handle_open_risk(
     positions_df: pd.DataFrame, 
@@ -25,50 +58,33 @@ def handle_open_risk(
       - OpenRisk (based on stop)
       - NetLiquidity% exposure
       - Size (absolute position value)
+    Positions are joined to their (aggregated) stop orders in one merge,
+    everything else is column arithmetic.
     """
 
-    netliq = float(account_data.get("NetLiquidation", 0))
-
-    # Ensure orders_df has expected columns
-    if orders_df is None or orders_df.empty:
-        orders_df = pd.DataFrame(columns=["Symbol", "OrderType", "AuxPrice"])
-
-    risk_rows = []
-
-    for _, pos in positions_df.iterrows():
-        symbol = pos["Symbol"]
-        position = float(pos["Position"])
-        avgcost = float(pos["AvgCost"])
-        size = round(abs(position * avgcost), 2)
-        allocation = round((size / netliq) * 100, 2) if netliq > 0 else None
-
-        # Safe lookup for stop order
-        stop_order = orders_df[
-            (orders_df.get("Symbol", pd.Series(dtype=str)) == symbol) &
-            (orders_df.get("OrderType", pd.Series(dtype=str)) == "STP")
-        ].head(1)
-
-        if not stop_order.empty:
-            aux_price = float(stop_order.iloc[0]["AuxPrice"])
-            open_risk = round(abs(position * (aux_price - avgcost)), 2)
-        else:
-            aux_price = 0.0
-            open_risk = 999999999
-
-        # Append as dataclass dict
-        risk_rows.append(asdict(PortfolioPosition(
-            Symbol=symbol,
-            Allocation=allocation,
-            Size=size,
-            AvgCost=avgcost,
-            AuxPrice=aux_price,
-            Position=position,
-            OpenRisk=open_risk
-        )))
-
-    # Create DataFrame in one shot
-    risk_df = pd.DataFrame(risk_rows)
-
-
-    print(risk_df)
-    return risk_df
+    netliq = float(account_data.get("NetLiquidation", 0) or 0)
+
+    if positions_df is None or positions_df.empty:
+        return pd.DataFrame(columns=RISK_COLUMNS)
+
+    risk_df = positions_df[["Symbol", "Position", "AvgCost"]].copy()
+    risk_df["Position"] = risk_df["Position"].astype(float)
+    risk_df["AvgCost"] = risk_df["AvgCost"].astype(float)
+
+    risk_df = risk_df.merge(aggregate_stop_orders(orders_df), on="Symbol", how="left")
+
+    risk_df["Size"] = (risk_df["Position"] * risk_df["AvgCost"]).abs().round(2)
+    if netliq > 0:
+        risk_df["Allocation"] = (risk_df["Size"] / netliq * 100).round(2)
+    else:
+        risk_df["Allocation"] = None
+
+    has_stop = risk_df["AuxPrice"].notna()
+    risk_df["OpenRisk"] = np.where(
+        has_stop,
+        (risk_df["Position"] * (risk_df["AuxPrice"] - risk_df["AvgCost"])).abs().round(2),
+        NO_STOP_RISK,
+    )
+    risk_df["AuxPrice"] = risk_df["AuxPrice"].fillna(0.0)
+
+    return risk_df[RISK_COLUMNS]
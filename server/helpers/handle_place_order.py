@@ -2,9 +2,17 @@ from flask import Flask, request, jsonify
 from dataclasses import dataclass
 
 import logging
+import time
+
+from common.calculate import calculate_position_size
+from ibclient import place_bracket_order
 
 logger = logging.getLogger(__name__)
 
+# Max wait for a first ask on a symbol that is not streaming yet.
+# Pre-warmed symbols answer from the live ticker without waiting.
+FAST_QUOTE_TIMEOUT = 0.25
+
 
 @dataclass
 class Order:
@@ -56,3 +64,45 @@ def handle_place_order_request(data: dict):
                 entry_price=entry_price,
                 stop_price=stop_price
             )
+
+
+def submit_order_fast(ib, order: Order, quotes, risk: float, quote_timeout: float = FAST_QUOTE_TIMEOUT, risk_check=None):
+    """
+    Order-entry fast path, runs on the IB session thread.
+
+    Takes the ask from the shared quote service (live when the symbol is
+    pre-warmed), sizes the position and sends both bracket legs back to back
+    without waiting for IB's acknowledgement; order status then arrives through
+    the portfolio state's order events.
+    risk_check(order) -> (allowed, message) is called after sizing, before anything is sent.
+    Returns (parent, stoploss, transmit_ms, message); parent/stoploss are None when nothing was sent.
+    """
+    started = time.perf_counter()
+
+    ask_price = quotes.get_ask_price(ib, order.symbol, timeout=quote_timeout)
+    if ask_price:
+        order.entry_price = ask_price
+    else:
+        logger.warning(f"No live ask for {order.symbol}, using requested entry {order.entry_price}")
+
+    order.position_size = calculate_position_size(
+        entry_price=order.entry_price,
+        stop_price=order.stop_price,
+        risk=risk
+    )
+    if not order.position_size:
+        message = f"Position size 0 for {order.symbol}, order not sent"
+        logger.error(message)
+        return None, None, (time.perf_counter() - started) * 1000, message
+
+    if risk_check is not None:
+        allowed, message = risk_check(order)
+        if not allowed:
+            logger.warning(f"{order.symbol} blocked by portfolio risk caps: {message}")
+            return None, None, (time.perf_counter() - started) * 1000, message
+
+    parent, stoploss = place_bracket_order(ib, order, wait_ack=False)
+    transmit_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"{order.symbol} bracket transmitted in {transmit_ms:.1f} ms on the IB thread")
+
+    return parent, stoploss, transmit_ms, None
@@ -1,19 +1,48 @@
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
 import pandas as pd
 
 from ib_insync import IB, Stock
 
-from helpers.handle_market_scan import fetch_intraday_history, fetch_intraday_volume_history
-from helpers.handle_dataframes import handle_intraday_rvol_dataset
-
-def compute_rvol_from_clean_data(ib: IB, clean_data: list, time_zone: str) -> dict:
+from helpers.handle_historical_fetch import HistoricalRequest, fetch_histories_async
+from helpers.handle_market_scan import intraday_and_baseline_from_bars, intraday_and_baseline_from_sessions
+from database.bar_store import BarStore
+from common.volume_profile import VolumeProfileStore
+from helpers.handle_dataframes import (
+    handle_incoming_dataframe_intraday,
+    handle_incoming_dataframe_intradays_volume,
+    handle_intraday_rvol_dataset,
+)
+
+# Sessions pulled per symbol in single-fetch mode (current session + prior days)
+SINGLE_FETCH_DAYS = 5
+SINGLE_FETCH_DURATION = f"{SINGLE_FETCH_DAYS} D"
+BAR_SIZE = "2 mins"
+
+
+async def compute_rvol_from_clean_data_async(
+    ib: IB,
+    clean_data: list,
+    time_zone: str,
+    single_fetch: bool = True,
+    bar_store: Optional[BarStore] = None,
+    volume_profiles: Optional[VolumeProfileStore] = None,
+) -> dict:
     """
-    High-level RVOL builder that uses:
-        - fetch_intraday_history()  (1 day)
-        - fetch_intraday_volume_history()  (5 days)
+    High-level RVOL builder, awaited on the IB session loop (ib_session.run_async), that uses:
+        - fetch_histories_async()  (all symbols fetched concurrently)
+            single_fetch=True:  one 5-day series per symbol, split into today
+                                (cumulative volume) and prior days (avg volume baseline)
+            single_fetch=False: separate 1-day and 5-day series per symbol
+            bar_store:          (single-fetch only) closed sessions come from the local
+                                bar cache, IB is only asked for bars newer than the cache
+            volume_profiles:    (with bar_store) RVOL is read from the per-symbol average
+                                volume curve instead of the DataFrame merge below
         - handle_intraday_rvol_dataset()  (merge + Rvol calc)
 
+    time_zone keys the DataFrame path's Minute column; pass the exchange time zone
+    (volume_profiles.exchange_tz) so both paths use the same minute slots.
+
     Returns a dictionary indexed by symbol containing:
         {
             symbol: {
@@ -24,20 +53,63 @@ def compute_rvol_from_clean_data(ib: IB, clean_data: list, time_zone: str) -> di
         }
     """
 
+    symbols = [item.get("symbol") for item in clean_data if item.get("symbol")]
+
+    # current session + the prior sessions the baseline needs
+    days = volume_profiles.lookback + 1 if volume_profiles is not None else SINGLE_FETCH_DAYS
+
+    # 1️⃣ + 2️⃣ Fetch TODAY intraday (Open → Now) and the avg volume history for every symbol at once
+    requests = {}
+    for symbol in symbols:
+        if single_fetch:
+            duration = (
+                bar_store.plan_duration(symbol, BAR_SIZE, days)
+                if bar_store is not None else SINGLE_FETCH_DURATION
+            )
+            requests[symbol] = [HistoricalRequest(symbol=symbol, duration=duration, bar_size=BAR_SIZE)]
+        else:
+            requests[symbol] = [
+                HistoricalRequest(symbol=symbol, duration="1 D", bar_size=BAR_SIZE),
+                HistoricalRequest(symbol=symbol, duration="5 D", bar_size=BAR_SIZE),
+            ]
+
+    histories = await fetch_histories_async(ib, [req for reqs in requests.values() for req in reqs])
+
     intraday_results = []
     avg_volume_results = []
+    profile_rvols = {}
 
-    for item in clean_data:
-        symbol = item.get("symbol")
-        if not symbol:
-            continue
-
+    for symbol in symbols:
         try:
-            # 1️⃣ Fetch TODAY intraday (Open → Now)
-            intraday_df = fetch_intraday_history(ib, symbol, time_zone)
-
-            # 2️⃣ Fetch 5-DAY intraday for avg volume model
-            avg_df = fetch_intraday_volume_history(ib, symbol, time_zone)
+            fetched = [histories.get(req.key) for req in requests[symbol]]
+
+            if single_fetch and bar_store is not None:
+                if fetched[0]:
+                    bar_store.merge(symbol, BAR_SIZE, fetched[0])
+                today_arr, prior_arr = bar_store.sessions(symbol, BAR_SIZE, days)
+
+                if volume_profiles is not None:
+                    profile = volume_profiles.get_or_build(symbol, prior_arr)
+                    if profile is None:
+                        raise ValueError("no prior sessions for the volume profile")
+                    profile_rvols[symbol] = volume_profiles.rvol_for_session(profile, today_arr)
+                    continue
+
+                intraday_df, avg_df = intraday_and_baseline_from_sessions(today_arr, prior_arr, symbol, time_zone)
+            elif single_fetch:
+                if not fetched[0]:
+                    raise ValueError("missing historical data")
+                intraday_df, avg_df = intraday_and_baseline_from_bars(fetched[0], symbol, time_zone)
+            else:
+                intraday_bars, volume_bars = fetched
+                if not intraday_bars or not volume_bars:
+                    raise ValueError("missing historical data")
+
+                intraday_df = handle_incoming_dataframe_intraday(intraday_bars, symbol, time_zone)
+                avg_df = handle_incoming_dataframe_intradays_volume(volume_bars, symbol, time_zone)
+
+            if intraday_df is None or avg_df is None:
+                raise ValueError("history does not cover both today and prior sessions")
 
             intraday_results.append(intraday_df)
             avg_volume_results.append(avg_df)
@@ -51,7 +123,7 @@ def compute_rvol_from_clean_data(ib: IB, clean_data: list, time_zone: str) -> di
     rvol_datasets = handle_intraday_rvol_dataset(intraday_results, avg_volume_results)
 
     # 4️⃣ Convert DataFrame result → simple map for frontend
-    rvol_map = {}
+    rvol_map = dict(profile_rvols)
 
     for symbol, df in rvol_datasets.items():
         if df is None or df.empty:
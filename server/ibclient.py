@@ -1,4 +1,5 @@
 from ib_insync import *
+import asyncio
 import pandas as pd
 import time
 import logging
@@ -6,6 +7,8 @@ import pytz
 from datetime import datetime
 from typing import List
 
+from ibsession.contract_cache import contract_cache
+
 logger = logging.getLogger(__name__)
 
 ESSENTIAL_ACCOUNT_FIELDS = {
@@ -17,41 +20,135 @@ ESSENTIAL_ACCOUNT_FIELDS = {
     "ExcessLiquidity",
 }
 
-def get_last_ask_price(ib: IB, symbol: str) -> float:
+# Upper bounds (seconds) for the completion-awaiting request helpers below.
+# They return as soon as IB has answered, these only cap a slow session.
+QUOTE_TIMEOUT = 1.0
+SNAPSHOT_TIMEOUT = 2.0
+REQUEST_TIMEOUT = 5.0
+ORDER_ACK_TIMEOUT = 2.0
+
 
+# --- Completion-awaiting request helpers ---
+def run_until_complete(ib: IB, awaitable, timeout: float, what: str):
+    """
+    Run an ib_insync *Async request until IB signals end-of-data, or until timeout.
+    Raises TimeoutError so callers can tell a slow answer from an empty one.
+    """
     try:
-        # Define and qualify contract
-        contract = Stock(symbol=symbol, exchange="SMART", currency="USD")
-        ib.qualifyContracts(contract)
+        return ib.run(asyncio.wait_for(awaitable, timeout))
+    except asyncio.TimeoutError:
+        logging.warning(f"{what} did not complete within {timeout}s")
+        raise TimeoutError(f"{what} timed out after {timeout}s")
 
-        # Request market data
-        ticker = ib.reqMktData(contract, "", False, False)
 
-        # Wait for IB to respond
-        ib.sleep(1)
+def ticker_has_data(ticker: Ticker, fields) -> bool:
+    """True when any of the given ticker fields holds a real (non-NaN) value."""
+    for field in fields:
+        value = getattr(ticker, field, None)
+        if value is not None and not util.isNan(value) and value != -1:
+            return True
+    return False
 
-        ask_price = ticker.ask
-        if ask_price is None:
-            logging.warning(f"Warning: No ask price available for {symbol}")
-        else:
-            logging.info(f"{symbol} last ask price: {ask_price}")
 
-        return ask_price
+def wait_for_tickers(ib: IB, tickers: list, fields=("last",), timeout: float = QUOTE_TIMEOUT) -> bool:
+    """
+    Process IB events until every ticker has data in one of `fields`.
+    Returns True when all tickers are filled, False if the timeout hit first.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if all(ticker_has_data(t, fields) for t in tickers):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            missing = [t.contract.symbol for t in tickers if not ticker_has_data(t, fields)]
+            logging.warning(f"No {'/'.join(fields)} within {timeout}s for: {missing}")
+            return False
+        ib.waitOnUpdate(timeout=remaining)
+
+
+def request_snapshots(ib: IB, contracts: list, timeout: float = SNAPSHOT_TIMEOUT) -> List[Ticker]:
+    """
+    Request one-shot market data snapshots and wait for IB's snapshot-end for all of them.
+    On timeout the partially filled tickers are returned instead of failing the batch.
+    """
+    if not contracts:
+        return []
+    try:
+        return run_until_complete(ib, ib.reqTickersAsync(*contracts), timeout, "Snapshot request")
+    except TimeoutError:
+        return [ib.ticker(c) or Ticker(contract=c) for c in contracts]
 
-    except Exception as e:
-        logging.error(f"Error fetching last ask price for {symbol}: {e}")
-        return None
+
+def wait_for_order_ack(ib: IB, trades: List[Trade], timeout: float = ORDER_ACK_TIMEOUT) -> bool:
+    """
+    Wait until IB has acknowledged every trade (status left PendingSubmit).
+    Returns True when all were acknowledged, False if the timeout hit first.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        pending = [t for t in trades if t.orderStatus.status == OrderStatus.PendingSubmit]
+        if not pending:
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logging.warning(f"No order ack within {timeout}s for orderIds: {[t.order.orderId for t in pending]}")
+            return False
+        ib.waitOnUpdate(timeout=remaining)
+
+
+def trade_to_order_row(t: Trade) -> dict:
+    """Flatten an ib_insync Trade into the open-orders row format used by the API."""
+    return {
+        "OrderId": t.order.permId if t.order else None,
+        "Symbol": t.contract.symbol if t.contract else None,
+        "Action": t.order.action if t.order else None,
+        "OrderType": t.order.orderType if t.order else None,
+        "TotalQty": t.order.totalQuantity if t.order else None,
+        "LmtPrice": getattr(t.order, "lmtPrice", None) if t.order else None,
+        "AuxPrice": getattr(t.order, "auxPrice", None) if t.order else None,
+        "Status": t.orderStatus.status if t.orderStatus else None,
+        "Filled": t.orderStatus.filled if t.orderStatus else None,
+        "Remaining": t.orderStatus.remaining if t.orderStatus else None,
+        # client-local ids, to match bracket children (ParentId) to their parent order
+        "ClientId": t.order.clientId if t.order else None,
+        "LocalOrderId": t.order.orderId if t.order else None,
+        "ParentId": t.order.parentId if t.order else None
+    }
+
+
+def position_to_row(p: Position) -> dict:
+    """Flatten an ib_insync Position into the positions row format used by the API."""
+    return {
+        "Account": p.account,
+        "Symbol": p.contract.symbol if p.contract else None,
+        "SecType": p.contract.secType if p.contract else None,
+        "Currency": p.contract.currency if p.contract else None,
+        "Position": p.position,
+        "AvgCost": p.avgCost
+    }
+
+
+def account_value_to_number(value):
+    """Convert numeric account fields to float safely, keep the raw value otherwise."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
 
 
-def place_bracket_order(ib: IB, order:Order)-> None:
+def place_bracket_order(ib: IB, order:Order, wait_ack: bool = True)-> None:
     """
     Places a bracket order with a parent limit order and a stop loss.
     Returns the parent and stoploss orders, or (None, None) if failed.
+    wait_ack=False returns right after both legs are written to the socket.
     """
     try:
-        # qualify contract
-        contract = Stock(symbol=order.symbol, exchange='SMART', currency='USD')
-        ib.qualifyContracts(contract)
+        # qualified contract from the shared cache
+        contract = contract_cache.qualify_one(ib, order.symbol)
+        if contract is None:
+            logging.error(f"Could not qualify contract for {order.symbol}")
+            return None, None
 
         # determine reverse action
         reverse_action = 'SELL' if order.action.upper() == 'BUY' else 'BUY'
@@ -76,20 +173,23 @@ def place_bracket_order(ib: IB, order:Order)-> None:
             outsideRth=True,
         )
 
-        # place orders
-        for order in [parent, stoploss]:
+        # place orders, the socket keeps them in sequence so no delay is needed between legs
+        trades = []
+        for leg in [parent, stoploss]:
             try:
-                logging.info(f"Going live with: {order}")
-                ib.placeOrder(contract, order)
-                ib.sleep(0.1)  # small delay helps IB handle sequencing
+                logging.info(f"Going live with: {leg}")
+                trades.append(ib.placeOrder(contract, leg))
             except Exception as e:
-                logging.error(f"Error placing order {order}: {e}")
+                logging.error(f"Error placing order {leg}: {e}")
                 return None, None
 
+        if wait_ack:
+            wait_for_order_ack(ib, trades, timeout=ORDER_ACK_TIMEOUT)
+
         return parent, stoploss
 
     except Exception as e:
-        print(f"Error in place_bracket_order for {order.symbol}: {e}")
+        logging.error(f"Error in place_bracket_order for {order.symbol}: {e}")
         return None, None
 
 
@@ -98,23 +198,11 @@ def get_stop_orders(ib: IB) -> pd.DataFrame:
     Fetch all open orders and return as a DataFrame.
     """
     try:
-        # Request all open orders (returns list of Trade objects)
-        trades = ib.reqAllOpenOrders()
-        ib.sleep(1)  # small delay to ensure IB has processed the orders
+        # Request all open orders (returns list of Trade objects once IB sent openOrderEnd)
+        trades = run_until_complete(ib, ib.reqAllOpenOrdersAsync(), REQUEST_TIMEOUT, "Open orders request")
 
         # Convert to DataFrame
-        orders_df = pd.DataFrame([{
-            "OrderId": t.order.permId if t.order else None,
-            "Symbol": t.contract.symbol if t.contract else None,
-            "Action": t.order.action if t.order else None,
-            "OrderType": t.order.orderType if t.order else None,
-            "TotalQty": t.order.totalQuantity if t.order else None,
-            "LmtPrice": getattr(t.order, "lmtPrice", None) if t.order else None,
-            "AuxPrice": getattr(t.order, "auxPrice", None) if t.order else None,
-            "Status": t.orderStatus.status if t.orderStatus else None,
-            "Filled": t.orderStatus.filled if t.orderStatus else None,
-            "Remaining": t.orderStatus.remaining if t.orderStatus else None
-        } for t in trades])
+        orders_df = pd.DataFrame([trade_to_order_row(t) for t in trades])
 
         logging.info(f"Fetched {orders_df}")
         return orders_df
@@ -133,17 +221,12 @@ def get_positions(ib: IB) -> pd.DataFrame:
     Fetch all positions and return as a DataFrame.
     """
     try:
-        positions = ib.reqPositions()  # returns list of ib_insync Position objects
-        time.sleep(1)  # wait to ensure all data is fetched
+        # returns list of ib_insync Position objects once IB sent positionEnd
+        positions = run_until_complete(ib, ib.reqPositionsAsync(), REQUEST_TIMEOUT, "Positions request")
         # Convert to DataFrame
-        positions_df = pd.DataFrame([{
-            "Account": p.account,
-            "Symbol": p.contract.symbol if p.contract else None,
-            "SecType": p.contract.secType if p.contract else None,
-            "Currency": p.contract.currency if p.contract else None,
-            "Position": p.position,
-            "AvgCost": p.avgCost
-        } for p in positions if p.position != 0])  # only non-zero positions
+        positions_df = pd.DataFrame([
+            position_to_row(p) for p in positions if p.position != 0
+        ])  # only non-zero positions
 
         logging.info(f"Fetched {positions_df}")
         return positions_df
@@ -163,11 +246,7 @@ def get_account_summary(ib: IB) -> dict:
 
         for item in summary:
             if item.tag in ESSENTIAL_ACCOUNT_FIELDS:
-                # Convert numeric fields to float safely
-                try:
-                    filtered[item.tag] = float(item.value)
-                except:
-                    filtered[item.tag] = item.value
+                filtered[item.tag] = account_value_to_number(item.value)
 
         return filtered
 
@@ -183,37 +262,35 @@ def get_executed_trades(ib: IB) -> pd.DataFrame:
     """
     try:
         helsinki_tz = pytz.timezone("Europe/Helsinki")
-        trades = ib.trades()
-        ib.sleep(1)
+        # Returns the session's fills once IB sent execDetailsEnd
+        fills = run_until_complete(ib, ib.reqExecutionsAsync(), REQUEST_TIMEOUT, "Executions request")
 
         executed = []
 
-        for t in trades:
-            if not t.fills:
+        for fill in fills:
+            if not fill.execution:
                 continue
 
-            for fill in t.fills:
-
-                # Convert IB timestamp (UTC) → Helsinki
-                time_utc = fill.execution.time  # datetime in UTC
-
-                # Convert
-                time_helsinki = time_utc.astimezone(helsinki_tz)
-
-                executed.append({
-                    "TradeId": t.order.permId if t.order else None,
-                    "Symbol": t.contract.symbol if t.contract else None,
-                    "SecType": t.contract.secType if t.contract else None,
-                    "Action": fill.execution.side if fill.execution else None,
-                    "Quantity": fill.execution.shares if fill.execution else None,
-                    "Price": fill.execution.price if fill.execution else None,    # keep original
-                    "Time": time_helsinki.isoformat(),  # converted
-                    "Exchange": fill.execution.exchange if fill.execution else None,
-                    "Commission": (
-                        fill.commissionReport.commission
-                        if fill.commissionReport else None
-                    ),
-                })
+            # Convert IB timestamp (UTC) → Helsinki
+            time_utc = fill.execution.time  # datetime in UTC
+
+            # Convert
+            time_helsinki = time_utc.astimezone(helsinki_tz)
+
+            executed.append({
+                "TradeId": fill.execution.permId,
+                "Symbol": fill.contract.symbol if fill.contract else None,
+                "SecType": fill.contract.secType if fill.contract else None,
+                "Action": fill.execution.side,
+                "Quantity": fill.execution.shares,
+                "Price": fill.execution.price,    # keep original
+                "Time": time_helsinki.isoformat(),  # converted
+                "Exchange": fill.execution.exchange,
+                "Commission": (
+                    fill.commissionReport.commission
+                    if fill.commissionReport else None
+                ),
+            })
 
         trades_df = pd.DataFrame(executed)
         logging.info(f"Fetched executed trades: {len(trades_df)}")
@@ -236,8 +313,10 @@ def close_position(ib: IB, symbol: str, quantity: int, action: str) -> None:
     :param action: "SELL" or "BUY"
     """
     try:
-        contract = Stock(symbol=symbol, exchange="SMART", currency="USD")
-        ib.qualifyContracts(contract)
+        contract = contract_cache.qualify_one(ib, symbol)
+        if contract is None:
+            logging.error(f"Could not qualify contract for {symbol}, position not closed")
+            return
 
         order = MarketOrder(
             action=action,
@@ -245,8 +324,8 @@ def close_position(ib: IB, symbol: str, quantity: int, action: str) -> None:
             outsideRth=True
         )
 
-        ib.placeOrder(contract, order)
-        ib.sleep(0.2)
+        trade = ib.placeOrder(contract, order)
+        wait_for_order_ack(ib, [trade], timeout=ORDER_ACK_TIMEOUT)
 
         logging.info(
             f"Sent {action} market order to close "
@@ -0,0 +1,209 @@
+import dataclasses
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from ib_insync import IB, Contract, Stock
+
+logger = logging.getLogger(__name__)
+
+# Nested contract fields, never set for the stocks cached here
+_SKIPPED_FIELDS = ("comboLegs", "deltaNeutralContract")
+
+
+def contract_to_dict(contract: Contract) -> dict:
+    """Plain, JSON-serializable dict of a contract's fields."""
+    return {
+        f.name: getattr(contract, f.name)
+        for f in dataclasses.fields(contract)
+        if f.name not in _SKIPPED_FIELDS
+    }
+
+
+def contract_from_fields(d: dict) -> Contract:
+    """Rebuild a contract (Stock, Option, ... by secType) from a field dict."""
+    fields = {f.name for f in dataclasses.fields(Contract)}
+    return Contract.create(**{k: v for k, v in d.items() if k in fields and k not in _SKIPPED_FIELDS})
+
+
+class ContractCache:
+    """
+    Process-wide cache of qualified contracts, keyed by conId and, for
+    stocks on the default exchange (SMART), by symbol.
+
+    Cache misses are qualified together in one batch. With a path set the
+    cache is persisted as JSON, so a restarted backend does not qualify its
+    usual symbols again.
+    """
+
+    def __init__(self, path: Optional[str] = None, exchange: str = "SMART", currency: str = "USD"):
+        self.exchange = exchange
+        self.currency = currency
+        self.path = None
+
+        self._by_symbol: Dict[str, Contract] = {}
+        self._by_conid: Dict[int, Contract] = {}
+        self._lock = threading.Lock()
+
+        if path:
+            self.configure(path)
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def configure(self, path: str) -> None:
+        """Enable disk persistence and load what was saved there."""
+        self.path = path
+        self._load()
+
+    def get(self, symbol: str) -> Optional[Contract]:
+        with self._lock:
+            return self._by_symbol.get(symbol.upper())
+
+    def get_by_conid(self, con_id: int) -> Optional[Contract]:
+        with self._lock:
+            return self._by_conid.get(int(con_id))
+
+    def put(self, contract: Contract) -> Optional[Contract]:
+        """Store a qualified contract; unqualified ones (no conId) are ignored."""
+        if not contract or not contract.conId:
+            return None
+        with self._lock:
+            self._store_locked(contract)
+        return contract
+
+    def from_dict(self, d: dict) -> Optional[Contract]:
+        """
+        Contract for a raw contract dict (e.g. from scanner results).
+        A dict with a conId is already qualified, it is cached and reused as is.
+        """
+        if not d:
+            return None
+        con_id = d.get("conId")
+        if con_id:
+            cached = self.get_by_conid(con_id)
+            if cached is not None:
+                return cached
+        contract = contract_from_fields(d)
+        if contract.conId:
+            with self._lock:
+                self._store_locked(contract)
+        return contract
+
+    def qualify(self, ib: IB, symbols: Iterable[str]) -> Dict[str, Contract]:
+        """Qualified contracts for the symbols; misses are qualified with IB in one batch."""
+        hits, misses = self._split(symbols)
+        if misses:
+            qualified = ib.qualifyContracts(*[self._stock(s) for s in misses])
+            hits.update(self._store_qualified(misses, qualified))
+        return hits
+
+    async def qualify_async(self, ib: IB, symbols: Iterable[str]) -> Dict[str, Contract]:
+        """Same as qualify(), for code already running in the IB event loop."""
+        hits, misses = self._split(symbols)
+        if misses:
+            qualified = await ib.qualifyContractsAsync(*[self._stock(s) for s in misses])
+            hits.update(self._store_qualified(misses, qualified))
+        return hits
+
+    def qualify_one(self, ib: IB, symbol: str) -> Optional[Contract]:
+        return self.qualify(ib, [symbol]).get(symbol.upper())
+
+    def invalidate(self, symbol: Optional[str] = None) -> None:
+        """Forget one symbol (e.g. after a ticker change) or, without a symbol, everything."""
+        with self._lock:
+            if symbol is None:
+                self._by_symbol.clear()
+                self._by_conid.clear()
+            else:
+                contract = self._by_symbol.pop(symbol.upper(), None)
+                if contract is not None:
+                    self._by_conid.pop(contract.conId, None)
+        self._save()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._by_symbol)
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _stock(self, symbol: str) -> Stock:
+        return Stock(symbol, self.exchange, self.currency)
+
+    def _split(self, symbols: Iterable[str]):
+        hits: Dict[str, Contract] = {}
+        misses: List[str] = []
+        with self._lock:
+            for symbol in dict.fromkeys(s.upper() for s in symbols if s):
+                contract = self._by_symbol.get(symbol)
+                if contract is None:
+                    misses.append(symbol)
+                else:
+                    hits[symbol] = contract
+        return hits, misses
+
+    def _store_qualified(self, symbols: List[str], qualified: List[Contract]) -> Dict[str, Contract]:
+        found = {}
+        with self._lock:
+            for contract in qualified:
+                if contract and contract.conId:
+                    self._store_locked(contract)
+                    found[contract.symbol.upper()] = contract
+
+        missing = [s for s in symbols if s not in found]
+        if missing:
+            logger.warning(f"Could not qualify contracts for: {missing}")
+        if found:
+            logger.info(f"Qualified {len(found)} contracts ({len(self)} cached)")
+            self._save()
+        return found
+
+    def _store_locked(self, contract: Contract) -> None:
+        # The symbol key is the plain SMART/USD stock the call sites ask for; contracts
+        # routed to a primary exchange (e.g. from scanner results) stay conId-only,
+        # so orders and quotes never inherit their direct routing
+        smart = contract.secType == "STK" and contract.currency == self.currency and contract.exchange == self.exchange
+        if smart:
+            self._by_symbol[contract.symbol.upper()] = contract
+
+        # Same conId on another exchange must not replace the SMART contract
+        cached = self._by_conid.get(contract.conId)
+        if smart or cached is None or cached.exchange != self.exchange:
+            self._by_conid[contract.conId] = contract
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+            with self._lock:
+                for d in saved:
+                    contract = contract_from_fields(d)
+                    if contract.conId:
+                        self._store_locked(contract)
+            logger.info(f"Loaded {len(self)} cached contracts from {self.path}")
+        except Exception as e:
+            logger.error(f"Could not load contract cache {self.path}: {e}")
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        try:
+            with self._lock:
+                # the symbol entries too, so a SMART contract always survives a restart
+                contracts = {id(c): c for c in (*self._by_conid.values(), *self._by_symbol.values())}
+                saved = [contract_to_dict(c) for c in contracts.values()]
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(saved, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Could not save contract cache {self.path}: {e}")
+
+
+# Shared by every IB call site in this process
+contract_cache = ContractCache()
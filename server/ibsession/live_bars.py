@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from ib_insync import IB, BarDataList
+
+from common.indicators import IndicatorEngine
+from common.volume_profile import VolumeProfile, VolumeProfileStore
+from database.bar_store import bars_to_array, session_dates
+from helpers.handle_historical_fetch import historical_bucket
+from ibsession.contract_cache import contract_cache
+
+logger = logging.getLogger(__name__)
+
+LIVE_BAR_SIZE = "2 mins"
+
+# IB keeps at most ~50 historical keepUpToDate requests open per connection
+MAX_LIVE_BAR_SYMBOLS = 40
+
+# datetime64[D] day numbers -> date.toordinal(), the session key of IndicatorEngine
+_UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@dataclass
+class LiveRvol:
+    symbol: str
+    session: Optional[date] = None
+    closed_volume: float = 0.0       # today's volume of bars that have completed
+    cum_volume: float = 0.0          # closed_volume + volume of the bar still forming
+    bar_epoch: Optional[int] = None  # start of the bar still forming
+    bar_volume: float = 0.0
+    minute: Optional[int] = None     # minute-of-day slot of the forming bar
+    rvol: Optional[float] = None
+    avg_volume: Optional[float] = None
+    updated_at: Optional[float] = None
+
+
+class LiveBarEngine:
+    """
+    Keep-up-to-date 2-min bars for watched symbols with RVOL maintained incrementally.
+
+    watch() opens one reqHistoricalData(keepUpToDate=True) per symbol. The
+    initial download (cut down to the gap after the bar store's last bar)
+    seeds today's cumulative volume and, through the bar store, the symbol's
+    VolumeProfile. After that every bar update is O(1): the volume of a bar
+    that just completed moves into the running total, and RVOL is that total
+    plus the forming bar divided by the profile's cum_avg at the bar's minute.
+    The same bars keep `indicators` (VWAP / EMA / ATR per symbol) current.
+
+    rvol() / snapshot() are plain dict reads, safe from any thread. Register
+    attach() as an IB session connect callback to resubscribe after a reconnect.
+    """
+
+    def __init__(self, volume_profiles: VolumeProfileStore, bar_store=None, max_symbols: int = MAX_LIVE_BAR_SYMBOLS,
+                 indicators: Optional[IndicatorEngine] = None):
+        self.volume_profiles = volume_profiles
+        self.bar_store = bar_store
+        self.max_symbols = max_symbols
+        self.indicators = indicators or IndicatorEngine()
+        self.exchange_tz = ZoneInfo(volume_profiles.exchange_tz)
+
+        self._bars: Dict[str, BarDataList] = {}          # IB thread only
+        self._profiles: Dict[str, VolumeProfile] = {}    # IB thread only
+        self._states: Dict[str, LiveRvol] = {}
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # PUBLIC METHODS (any thread)
+    # ----------------------------
+    def rvol(self, symbol: str) -> Optional[dict]:
+        """{"rvol", "current_volume", "avg_volume"} like compute_rvol_from_clean_data_async, None if not watched."""
+        with self._lock:
+            state = self._states.get(symbol.upper())
+            if state is None or state.updated_at is None:
+                return None
+            return {"rvol": state.rvol, "current_volume": state.bar_volume, "avg_volume": state.avg_volume}
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [vars(s).copy() for s in self._states.values()]
+
+    def watched(self) -> List[str]:
+        with self._lock:
+            return list(self._states)
+
+    # ----------------------------
+    # PUBLIC METHODS (IB thread, pass to ib_session.run)
+    # ----------------------------
+    def watch(self, ib: IB, symbols: Iterable[str]) -> List[str]:
+        """Blocking watch_async() for code on the session thread outside the loop (connect callbacks)."""
+        return ib.run(self.watch_async(ib, symbols))
+
+    async def watch_async(self, ib: IB, symbols: Iterable[str]) -> List[str]:
+        """
+        Start live bars for the symbols not watched yet, return every watched symbol.
+        Runs as a loop task (ib_session.run_async), the initial downloads are awaited
+        concurrently so queued jobs are served meanwhile.
+        """
+        with self._lock:
+            missing = [s for s in dict.fromkeys(s.upper() for s in symbols if s) if s not in self._states]
+            free = self.max_symbols - len(self._states)
+            if len(missing) > free:
+                logger.warning(f"Live bar limit {self.max_symbols} reached, not watching: {missing[max(free, 0):]}")
+                missing = missing[:max(free, 0)]
+            # reserve the slots so a concurrent watch cannot go over max_symbols
+            for symbol in missing:
+                self._states[symbol] = LiveRvol(symbol=symbol)
+
+        if missing:
+            try:
+                qualified = await contract_cache.qualify_async(ib, missing)
+            except Exception as e:
+                logger.error(f"Could not qualify live bar symbols {missing}: {e}")
+                qualified = {}
+            results = await asyncio.gather(
+                *(self._subscribe_async(ib, symbol, qualified.get(symbol)) for symbol in missing),
+                return_exceptions=True,
+            )
+            for symbol, result in zip(missing, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Could not start live bars for {symbol}: {result}")
+                    with self._lock:
+                        self._states.pop(symbol, None)
+
+        return self.watched()
+
+    def unwatch(self, ib: IB, symbols: Iterable[str]) -> List[str]:
+        for symbol in {s.upper() for s in symbols if s}:
+            bars = self._bars.pop(symbol, None)
+            self._profiles.pop(symbol, None)
+            self.indicators.forget(symbol)
+            with self._lock:
+                self._states.pop(symbol, None)
+            if bars is not None:
+                try:
+                    ib.cancelHistoricalData(bars)
+                except Exception as e:
+                    logger.warning(f"Could not cancel live bars for {symbol}: {e}")
+                logger.info(f"Live bars for {symbol} stopped")
+        return self.watched()
+
+    def attach(self, ib: IB) -> None:
+        """Connect callback: keepUpToDate requests die with the connection, open them again."""
+        symbols = self.watched()
+        self._bars.clear()
+        if symbols:
+            logger.info(f"Resubscribing live bars for {len(symbols)} symbols")
+            with self._lock:
+                self._states.clear()
+            self.watch(ib, symbols)
+
+    # ----------------------------
+    # IB THREAD
+    # ----------------------------
+    async def _subscribe_async(self, ib: IB, symbol: str, contract) -> None:
+        if contract is None:
+            raise ValueError("contract could not be qualified")
+
+        days = self.volume_profiles.lookback + 1
+        duration = (
+            self.bar_store.plan_duration(symbol, LIVE_BAR_SIZE, days)
+            if self.bar_store is not None else f"{days} D"
+        )
+        await historical_bucket.acquire()
+        bars = await ib.reqHistoricalDataAsync(
+            contract,
+            endDateTime="",
+            durationStr=duration,
+            barSizeSetting=LIVE_BAR_SIZE,
+            whatToShow="TRADES",
+            useRTH=False,
+            formatDate=2,
+            keepUpToDate=True,
+        )
+
+        with self._lock:
+            unwatched = symbol not in self._states
+            if not unwatched:
+                self._states[symbol] = LiveRvol(symbol=symbol)
+        if unwatched:
+            # unwatch() ran while the download was in flight
+            ib.cancelHistoricalData(bars)
+            return
+
+        self._bars[symbol] = bars
+        self._seed(symbol, bars)
+
+        bars.updateEvent += lambda bar_list, _has_new_bar, s=symbol: self._on_bar_update(s, bar_list)
+        logger.info(f"Live bars for {symbol} subscribed ({duration}, {len(bars)} initial bars)")
+
+    def _seed(self, symbol: str, bars: BarDataList) -> None:
+        """Full pass over the downloaded bars: profile and today's closed volume. Once per subscription / session."""
+        arr = bars_to_array(bars)
+        if self.bar_store is not None:
+            self.bar_store.merge(symbol, LIVE_BAR_SIZE, arr)
+            today_arr, prior_arr = self.bar_store.sessions(symbol, LIVE_BAR_SIZE, self.volume_profiles.lookback + 1)
+        else:
+            days = session_dates(arr["epoch"], self.volume_profiles.exchange_tz)
+            last = days[-1] if len(days) else None
+            today_arr, prior_arr = arr[days == last], arr[days != last]
+
+        profile = self.volume_profiles.get_or_build(symbol, prior_arr)
+        if profile is None:
+            logger.warning(f"No volume profile for {symbol}, live RVOL unavailable")
+        else:
+            self._profiles[symbol] = profile
+
+        history = np.concatenate([prior_arr, today_arr])
+        self.indicators.seed(
+            symbol, history["epoch"], history["high"], history["low"], history["close"], history["volume"],
+            sessions=session_dates(history["epoch"], self.volume_profiles.exchange_tz).astype("int64")
+            + _UNIX_EPOCH_ORDINAL,
+        )
+
+        with self._lock:
+            state = self._states.get(symbol)
+            if state is None:
+                return
+            # the last bar may still be forming, it is counted separately
+            state.closed_volume = float(today_arr["volume"][:-1].sum()) if len(today_arr) > 1 else 0.0
+            state.bar_epoch = None
+            state.session = None
+
+        if len(today_arr):
+            last = today_arr[-1]
+            self._apply_bar(symbol, int(last["epoch"]), float(last["high"]), float(last["low"]),
+                            float(last["close"]), float(last["volume"]))
+
+    def _on_bar_update(self, symbol: str, bars: BarDataList) -> None:
+        if not bars or symbol not in self._bars:
+            return
+
+        epoch = self._epoch(bars[-1])
+        with self._lock:
+            state = self._states.get(symbol)
+            if state is None:
+                return
+            rollover = state.session is not None and self._session_minute(epoch)[0] != state.session
+
+        if rollover:
+            logger.info(f"New session for {symbol}, rebuilding live RVOL baseline")
+            self._profiles.pop(symbol, None)
+            self._seed(symbol, bars)
+            return
+
+        bar = bars[-1]
+        self._apply_bar(symbol, epoch, bar.high, bar.low, bar.close, float(bar.volume))
+
+    def _apply_bar(self, symbol: str, epoch: int, high: float, low: float, close: float, volume: float) -> None:
+        """O(1) update from the newest (possibly still forming) bar."""
+        session, minute = self._session_minute(epoch)
+        profile = self._profiles.get(symbol)
+        self.indicators.update(symbol, epoch, high, low, close, volume, session=session.toordinal())
+
+        with self._lock:
+            state = self._states.get(symbol)
+            if state is None:
+                return
+            # a newer bar started: the previous one is complete
+            if state.bar_epoch is not None and epoch > state.bar_epoch:
+                state.closed_volume += state.bar_volume
+            elif state.bar_epoch is not None and epoch < state.bar_epoch:
+                return
+
+            state.session = session
+            state.minute = minute
+            state.bar_epoch = epoch
+            state.bar_volume = volume
+            state.cum_volume = state.closed_volume + volume
+            if profile is not None:
+                state.rvol = profile.rvol(state.cum_volume, minute)
+                state.avg_volume = float(profile.avg[minute])
+            state.updated_at = time.time()
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    @staticmethod
+    def _epoch(bar) -> int:
+        # naive datetimes are treated as UTC, like bars_to_columns
+        dt = bar.date
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp())
+
+    def _session_minute(self, epoch: int) -> Tuple[date, int]:
+        local = datetime.fromtimestamp(epoch, self.exchange_tz)
+        return local.date(), local.hour * 60 + local.minute
@@ -0,0 +1,142 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from ib_insync import IB, Ticker
+
+from ibclient import QUOTE_TIMEOUT, ticker_has_data, wait_for_tickers
+from ibsession.contract_cache import contract_cache
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteService:
+    """
+    Shared streaming quotes for the IB session.
+
+    Symbols are qualified and subscribed in one batch, live subscriptions are
+    reused by every later request, and idle ones are cancelled (TTL first,
+    then least recently used) so the number of open market data lines stays
+    under `max_lines`.
+
+    All methods run on the IB session thread (pass them to ib_session.run),
+    so no locking is needed. Register attach() as a connect callback: a
+    reconnect invalidates every subscription.
+    """
+
+    def __init__(self, max_lines: int = 80, ttl: float = 300.0, wait_timeout: float = QUOTE_TIMEOUT):
+        if max_lines < 1:
+            raise ValueError(f"max_lines must be positive, got {max_lines}")
+
+        self.max_lines = max_lines
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+
+        # symbol -> (ticker, last_used), least recently used first
+        self._subscriptions: "OrderedDict[str, tuple]" = OrderedDict()
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def attach(self, ib: IB) -> None:
+        """Connect callback: forget subscriptions of the previous connection."""
+        if self._subscriptions:
+            logger.info(f"Dropping {len(self._subscriptions)} quote subscriptions after (re)connect")
+        self._subscriptions.clear()
+
+    def get_tickers(self, ib: IB, symbols: Iterable[str], fields=("ask",), timeout: Optional[float] = None) -> Dict[str, Ticker]:
+        """
+        Return live tickers for the symbols, subscribing the missing ones in one batch.
+        Waits (up to timeout) only for tickers that have no data in `fields` yet.
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols if s))
+        if not symbols:
+            return {}
+
+        self.evict_idle(ib, keep=symbols)
+        self._subscribe_missing(ib, [s for s in symbols if s not in self._subscriptions])
+
+        now = time.monotonic()
+        tickers = {}
+        for symbol in symbols:
+            entry = self._subscriptions.get(symbol)
+            if entry is None:
+                continue
+            tickers[symbol] = entry[0]
+            self._subscriptions[symbol] = (entry[0], now)
+            self._subscriptions.move_to_end(symbol)
+
+        waiting = [t for t in tickers.values() if not ticker_has_data(t, fields)]
+        if waiting:
+            wait_for_tickers(ib, waiting, fields=fields, timeout=self.wait_timeout if timeout is None else timeout)
+
+        return tickers
+
+    def get_ask_prices(self, ib: IB, symbols: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Latest ask per symbol, None where IB sent no ask in time."""
+        tickers = self.get_tickers(ib, symbols, fields=("ask",), timeout=timeout)
+        return {symbol: self._value(ticker.ask) for symbol, ticker in tickers.items()}
+
+    def get_ask_price(self, ib: IB, symbol: str, timeout: Optional[float] = None) -> Optional[float]:
+        return self.get_ask_prices(ib, [symbol], timeout=timeout).get(symbol.upper())
+
+    def evict_idle(self, ib: IB, keep: Iterable[str] = ()) -> None:
+        """Cancel subscriptions idle longer than ttl, then the least recently used ones over max_lines."""
+        keep = set(keep)
+        now = time.monotonic()
+
+        for symbol, (_, last_used) in list(self._subscriptions.items()):
+            if symbol not in keep and now - last_used > self.ttl:
+                self._cancel(ib, symbol)
+
+        # Leave room for the symbols about to be subscribed
+        incoming = len([s for s in keep if s not in self._subscriptions])
+        for symbol in list(self._subscriptions):
+            if len(self._subscriptions) + incoming <= self.max_lines:
+                break
+            if symbol not in keep:
+                self._cancel(ib, symbol)
+
+    def close(self, ib: IB) -> None:
+        """Cancel every subscription."""
+        for symbol in list(self._subscriptions):
+            self._cancel(ib, symbol)
+
+    def subscribed(self) -> List[str]:
+        return list(self._subscriptions)
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _subscribe_missing(self, ib: IB, symbols: List[str]) -> None:
+        if not symbols:
+            return
+
+        free = self.max_lines - len(self._subscriptions)
+        if len(symbols) > free:
+            logger.warning(f"Market data line limit {self.max_lines} reached, not subscribing: {symbols[free:]}")
+            symbols = symbols[:max(free, 0)]
+
+        qualified = contract_cache.qualify(ib, symbols)
+
+        now = time.monotonic()
+        for symbol, contract in qualified.items():
+            ticker = ib.reqMktData(contract, "", False, False)
+            self._subscriptions[symbol] = (ticker, now)
+
+        logger.info(f"Subscribed quotes for {len(qualified)} symbols ({len(self._subscriptions)} lines open)")
+
+    def _cancel(self, ib: IB, symbol: str) -> None:
+        ticker, _ = self._subscriptions.pop(symbol)
+        try:
+            ib.cancelMktData(ticker.contract)
+        except Exception as e:
+            logger.warning(f"Could not cancel market data for {symbol}: {e}")
+
+    @staticmethod
+    def _value(value) -> Optional[float]:
+        if value is None or math.isnan(value) or value == -1:
+            return None
+        return float(value)
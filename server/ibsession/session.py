@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, List, Optional
+
+from ib_insync import IB
+
+logger = logging.getLogger(__name__)
+
+
+class JobOutcomeUnknown(TimeoutError):
+    """The job timed out after the session thread had started it, it may still complete."""
+
+
+class IBSession:
+    """
+    Long-lived IB connection owned by one dedicated thread.
+
+    The thread owns its own asyncio event loop and a connected IB instance.
+    Waitress worker threads never touch the IB object directly; they submit
+    callables through run(), which are queued and executed on the session
+    thread as fn(ib, *args, **kwargs). Between jobs the thread keeps pumping
+    the event loop so streaming updates (positions, orders, ticks) keep flowing.
+
+    Jobs submitted with priority=True (order entry, cancels, exits) go to a
+    separate queue that is drained before the normal one. Long multi-request
+    work is submitted with run_async() instead: it runs as a task on the loop,
+    so queued jobs keep being served while it awaits IB.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        client_id: int,
+        connect_timeout: float = 5.0,
+        poll_interval: float = 0.05,
+        health_interval: float = 10.0,
+        health_timeout: float = 5.0,
+        reconnect_delay: float = 2.0,
+        max_reconnect_delay: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.connect_timeout = connect_timeout
+        self.poll_interval = poll_interval
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.ib: Optional[IB] = None
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._priority_jobs: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = threading.Event()
+        self._ready = threading.Event()
+        self._on_connect: List[Callable[[IB], None]] = []
+        self._next_health_check = 0.0
+        self._next_reconnect = 0.0
+        self._current_delay = reconnect_delay
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def start(self) -> None:
+        """Start the session thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run_forever, name="ib-session", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=self.connect_timeout + 1)
+
+    def stop(self) -> None:
+        """Ask the session thread to disconnect and exit."""
+        self._stopping.set()
+        self._wake()
+        if self._thread:
+            self._thread.join(timeout=self.connect_timeout + 1)
+
+    def run(self, fn: Callable, *args, timeout: float = 30.0, priority: bool = False, **kwargs):
+        """
+        Execute fn(ib, *args, **kwargs) on the session thread and return its result.
+        Raises whatever fn raised, ConnectionError if IB is unreachable
+        or TimeoutError if the job did not finish in time. A job that timed
+        out before the session thread picked it up is cancelled and never runs;
+        one that had already started raises JobOutcomeUnknown.
+        """
+        if not self._thread or not self._thread.is_alive():
+            self.start()
+
+        future: Future = Future()
+        (self._priority_jobs if priority else self._jobs).put((fn, args, kwargs, future))
+        self._wake()
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            name = getattr(fn, "__name__", fn)
+            if future.cancel():
+                logger.warning(f"IB job {name} timed out after {timeout}s while queued, cancelled")
+                raise TimeoutError(f"IB job {name} did not finish within {timeout}s")
+            logger.warning(f"IB job {name} timed out after {timeout}s while running")
+            raise JobOutcomeUnknown(f"IB job {name} still running after {timeout}s, outcome unknown")
+
+    def run_async(self, coro_fn: Callable, *args, timeout: float = 30.0, **kwargs):
+        """
+        Run the coroutine coro_fn(ib, *args, **kwargs) as a task on the session loop
+        and return its result. The session thread keeps draining jobs while the
+        task awaits IB, so a long fetch does not hold up order entry.
+        On timeout the task is cancelled and TimeoutError is raised.
+        """
+        future: Future = Future()
+        tasks = []
+
+        def start(ib: IB) -> None:
+            task = self._loop.create_task(coro_fn(ib, *args, **kwargs))
+            task.add_done_callback(lambda t: self._resolve(future, t))
+            tasks.append(task)
+
+        deadline = time.monotonic() + timeout
+        self.run(start, timeout=timeout)
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            name = getattr(coro_fn, "__name__", coro_fn)
+            for task in tasks:
+                self._loop.call_soon_threadsafe(task.cancel)
+            logger.warning(f"IB task {name} timed out after {timeout}s, cancelled")
+            raise TimeoutError(f"IB task {name} did not finish within {timeout}s")
+
+    def add_connect_callback(self, callback: Callable[[IB], None]) -> None:
+        """
+        Register a callback(ib) executed on the session thread after every
+        (re)connect. Used by caches that need to subscribe to IB events.
+        If already connected, the callback is scheduled right away.
+        """
+        self._on_connect.append(callback)
+        if self.is_connected():
+            self._jobs.put((callback, (), {}, Future()))
+            self._wake()
+
+    def is_connected(self) -> bool:
+        return self.ib is not None and self.ib.isConnected()
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    @staticmethod
+    def _resolve(future: Future, task: "asyncio.Task") -> None:
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def _wake(self) -> None:
+        """Interrupt the loop pump so a queued job is picked up immediately."""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def _run_forever(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self.ib = IB()
+        self.ib.disconnectedEvent += self._on_disconnected
+
+        try:
+            self._connect()
+            self._ready.set()
+
+            while not self._stopping.is_set():
+                self._maintain_connection()
+                self._drain_jobs()
+                self._pump()
+        finally:
+            self._ready.set()
+            self._fail_pending(ConnectionError("IB session stopped"))
+            if self.ib.isConnected():
+                self.ib.disconnect()
+            self._loop.close()
+            logger.info("IB session thread stopped")
+
+    def _pump(self) -> None:
+        """Run the event loop until a job arrives or poll_interval elapses."""
+        self._wakeup.clear()
+        if not self._jobs.empty() or not self._priority_jobs.empty():
+            return
+        try:
+            self._loop.run_until_complete(asyncio.wait_for(self._wakeup.wait(), self.poll_interval))
+        except asyncio.TimeoutError:
+            pass
+
+    def _next_job(self):
+        """Priority jobs first, then the normal queue. None when both are empty."""
+        for jobs in (self._priority_jobs, self._jobs):
+            try:
+                return jobs.get_nowait()
+            except queue.Empty:
+                continue
+        return None
+
+    def _drain_jobs(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            fn, args, kwargs, future = job
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            # Reconnecting is left to _maintain_connection and its backoff,
+            # queued jobs fail fast instead of each trying to connect
+            if not self.is_connected():
+                future.set_exception(ConnectionError(
+                    f"IB not connected ({self.host}:{self.port}, clientId={self.client_id})"
+                ))
+                continue
+
+            try:
+                future.set_result(fn(self.ib, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _connect(self) -> bool:
+        """Connect (or reconnect) and run all connect callbacks."""
+        if self.is_connected():
+            return True
+        try:
+            self.ib.connect(
+                host=self.host,
+                port=self.port,
+                clientId=self.client_id,
+                timeout=self.connect_timeout,
+            )
+        except Exception as e:
+            logger.error(f"IB session connect failed: {e}")
+            self._next_reconnect = time.monotonic() + self._current_delay
+            self._current_delay = min(self._current_delay * 2, self.max_reconnect_delay)
+            return False
+
+        logger.info(f"IB session connected to {self.host}:{self.port} clientId={self.client_id}")
+        self._current_delay = self.reconnect_delay
+        self._next_health_check = time.monotonic() + self.health_interval
+
+        for callback in self._on_connect:
+            try:
+                callback(self.ib)
+            except Exception as e:
+                logger.error(f"IB session connect callback {callback} failed: {e}")
+        return True
+
+    def _maintain_connection(self) -> None:
+        """Periodic health check and automatic reconnect with backoff."""
+        now = time.monotonic()
+
+        if not self.is_connected():
+            if now >= self._next_reconnect:
+                logger.warning("IB session disconnected, reconnecting")
+                self._connect()
+            return
+
+        if now < self._next_health_check:
+            return
+        self._next_health_check = now + self.health_interval
+
+        try:
+            # Bounded, so a half-open socket cannot block the session thread and its queue
+            self._loop.run_until_complete(asyncio.wait_for(self.ib.reqCurrentTimeAsync(), self.health_timeout))
+        except Exception as e:
+            logger.warning(f"IB session health check failed, dropping connection: {e!r}")
+            self.ib.disconnect()
+            self._next_reconnect = now
+
+    def _on_disconnected(self) -> None:
+        logger.warning("IB session lost connection")
+        self._next_reconnect = time.monotonic() + self._current_delay
+
+    def _fail_pending(self, error: Exception) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            future = job[3]
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
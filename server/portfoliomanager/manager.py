@@ -2,7 +2,8 @@ import logging
 import pandas as pd
 from ib_insync import *
 from ibclient import get_positions, get_stop_orders, close_position
-from typing import List
+from typing import List, Optional
+from portfoliomanager.portfolio_state import PortfolioState
 
 logger = logging.getLogger(__name__)
 
@@ -13,8 +14,9 @@ class PortfolioManager:
     Decides if a close order should be placed based on positions and open orders.
     """
 
-    def __init__(self, ib: IB):
+    def __init__(self, ib: IB, state: Optional[PortfolioState] = None):
         self.ib = ib
+        self.state = state if state is not None and state.is_ready() else None
         self.positions_df = self.get_positions()
         self.open_orders_df = self.get_open_orders()
 
@@ -47,16 +49,20 @@ class PortfolioManager:
     # INTERNAL METHODS
     # ----------------------------
     def get_positions(self) -> pd.DataFrame:
-        """Fetch positions safely"""
+        """Fetch positions safely, from the streaming snapshot when available"""
         try:
+            if self.state is not None:
+                return self.state.positions_df()
             return get_positions(self.ib)
         except Exception as e:
             logger.error(f"Error fetching positions: {e}")
             return pd.DataFrame()
 
     def get_open_orders(self) -> pd.DataFrame:
-        """Fetch open orders safely"""
+        """Fetch open orders safely, from the streaming snapshot when available"""
         try:
+            if self.state is not None:
+                return self.state.orders_df()
             return get_stop_orders(self.ib)
         except Exception as e:
             logger.error(f"Error fetching open orders: {e}")
@@ -144,4 +150,10 @@ class PortfolioManager:
 
 
             else:
-                logger.warning(f"Trade has no order attached: {trade}")
\ No newline at end of file
+                logger.warning(f"Trade has no order attached: {trade}")
+
+
+def run_automated_exit(ib: IB, symbol: str, state: Optional[PortfolioState] = None) -> str:
+    """Build a PortfolioManager on the given IB connection and process an exit for symbol."""
+    manager = PortfolioManager(ib, state)
+    return manager.handle_automated_exit(symbol)
@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+import pandas as pd
+from typing import Callable, Dict, List, Optional
+
+from ib_insync import IB, AccountValue, OrderStatus, Position, Trade
+from ibclient import (
+    ESSENTIAL_ACCOUNT_FIELDS,
+    account_value_to_number,
+    position_to_row,
+    trade_to_order_row,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioState:
+    """
+    In-memory snapshot of positions, open orders and essential account values.
+
+    attach(ib) does one full sync and then subscribes to the IB streaming
+    events, so readers (Flask routes, PortfolioManager) get the current state
+    from memory instead of polling IB. Every change bumps `version` and
+    `last_update` so callers can tell how fresh the snapshot is.
+
+    Event handlers run on the IB session thread; readers may be on any thread.
+    Listeners registered with add_listener(fn) get every change as
+    fn(kind, key, row) with kind "position" / "order" / "account" (row None
+    when removed) and ("resync", None, None) after a full sync.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._positions: Dict[tuple, dict] = {}
+        self._orders: Dict[tuple, dict] = {}
+        self._account: Dict[str, object] = {}
+        self._ib: Optional[IB] = None
+        self._listeners: List[Callable[[str, object, object], None]] = []
+        self.version = 0
+        self.last_update: Optional[float] = None
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def attach(self, ib: IB) -> None:
+        """
+        Subscribe to IB events and load the initial snapshot.
+        Safe to call again after a reconnect (e.g. as an IBSession connect callback).
+        """
+        if self._ib is not ib:
+            if self._ib is not None:
+                self._unsubscribe(self._ib)
+            ib.positionEvent += self._on_position
+            ib.openOrderEvent += self._on_trade
+            ib.orderStatusEvent += self._on_trade
+            ib.accountSummaryEvent += self._on_account_value
+            ib.accountValueEvent += self._on_account_value
+            self._ib = ib
+
+        self.resync(ib)
+
+    def add_listener(self, listener: Callable[[str, object, object], None]) -> None:
+        """Call listener(kind, key, row) after every change (on the IB session thread)."""
+        self._listeners.append(listener)
+
+    def resync(self, ib: IB) -> None:
+        """Replace the whole snapshot with a fresh one pulled from IB."""
+        positions = ib.reqPositions()
+        trades = ib.reqAllOpenOrders()
+        summary = ib.accountSummary()
+
+        with self._lock:
+            self._positions = {self._position_key(p): position_to_row(p) for p in positions if p.position != 0}
+            self._orders = {
+                self._trade_key(t): trade_to_order_row(t)
+                for t in trades if t.orderStatus.status not in OrderStatus.DoneStates
+            }
+            self._account = {
+                v.tag: account_value_to_number(v.value)
+                for v in summary if v.tag in ESSENTIAL_ACCOUNT_FIELDS
+            }
+            self._touch()
+
+        self._notify("resync", None, None)
+
+        logger.info(
+            f"Portfolio state synced: {len(self._positions)} positions, "
+            f"{len(self._orders)} open orders (version {self.version})"
+        )
+
+    def positions_df(self) -> pd.DataFrame:
+        """Current non-zero positions, same shape as ibclient.get_positions()."""
+        with self._lock:
+            rows = list(self._positions.values())
+        return pd.DataFrame(rows)
+
+    def orders_df(self) -> pd.DataFrame:
+        """Current open orders, same shape as ibclient.get_stop_orders()."""
+        with self._lock:
+            rows = list(self._orders.values())
+        return pd.DataFrame(rows)
+
+    def account_summary(self) -> dict:
+        """Essential account fields, same shape as ibclient.get_account_summary()."""
+        with self._lock:
+            return dict(self._account)
+
+    def keyed_rows(self):
+        """(positions, orders, account) dicts keyed like the listener notifications, copied under one lock."""
+        with self._lock:
+            return dict(self._positions), dict(self._orders), dict(self._account)
+
+    def is_ready(self) -> bool:
+        return self.last_update is not None
+
+    def freshness(self) -> dict:
+        """Version counter and age of the snapshot for API responses."""
+        age = None if self.last_update is None else round(time.time() - self.last_update, 3)
+        return {"version": self.version, "last_update": self.last_update, "age_seconds": age}
+
+    # ----------------------------
+    # EVENT HANDLERS
+    # ----------------------------
+    def _on_position(self, position: Position) -> None:
+        key = self._position_key(position)
+        row = None if position.position == 0 else position_to_row(position)
+        with self._lock:
+            if row is None:
+                self._positions.pop(key, None)
+            else:
+                self._positions[key] = row
+            self._touch()
+        self._notify("position", key, row)
+
+    def _on_trade(self, trade: Trade) -> None:
+        key = self._trade_key(trade)
+        local_key = ("local", trade.order.clientId, trade.order.orderId)
+        row = None if trade.orderStatus.status in OrderStatus.DoneStates else trade_to_order_row(trade)
+        with self._lock:
+            replaced_local = trade.order.permId and self._orders.pop(local_key, None) is not None
+            if row is None:
+                self._orders.pop(key, None)
+            else:
+                self._orders[key] = row
+            self._touch()
+        if replaced_local:
+            self._notify("order", local_key, None)
+        self._notify("order", key, row)
+
+    def _on_account_value(self, value: AccountValue) -> None:
+        if value.tag not in ESSENTIAL_ACCOUNT_FIELDS:
+            return
+        number = account_value_to_number(value.value)
+        with self._lock:
+            self._account[value.tag] = number
+            self._touch()
+        self._notify("account", value.tag, number)
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _touch(self) -> None:
+        self.version += 1
+        self.last_update = time.time()
+
+    def _notify(self, kind: str, key, row) -> None:
+        for listener in self._listeners:
+            try:
+                listener(kind, key, row)
+            except Exception as e:
+                logger.error(f"Portfolio state listener {listener} failed: {e}")
+
+    def _unsubscribe(self, ib: IB) -> None:
+        ib.positionEvent -= self._on_position
+        ib.openOrderEvent -= self._on_trade
+        ib.orderStatusEvent -= self._on_trade
+        ib.accountSummaryEvent -= self._on_account_value
+        ib.accountValueEvent -= self._on_account_value
+
+    @staticmethod
+    def _position_key(position: Position) -> tuple:
+        return (position.account, position.contract.conId)
+
+    @staticmethod
+    def _trade_key(trade: Trade) -> tuple:
+        # permId is unique across clients but only known after TWS accepted the order
+        if trade.order.permId:
+            return ("perm", trade.order.permId)
+        return ("local", trade.order.clientId, trade.order.orderId)
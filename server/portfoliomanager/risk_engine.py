@@ -0,0 +1,325 @@
+import logging
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from ib_insync import IB
+
+from portfoliomanager.portfolio_state import PortfolioState
+
+logger = logging.getLogger(__name__)
+
+# Used for what-if margin when the account does not report a usable ratio yet
+DEFAULT_INITIAL_MARGIN_RATE = 0.25
+
+
+@dataclass
+class SymbolRisk:
+    Symbol: str
+    Position: float = 0.0
+    AvgCost: float = 0.0
+    StopPrice: Optional[float] = None   # quantity-weighted over the active stop legs
+    StopQty: float = 0.0                # shares covered by active stop legs, at most |Position|
+    UnprotectedQty: float = 0.0         # |Position| - StopQty
+    OpenRisk: float = 0.0               # sum of leg qty * |stop - AvgCost|, + unprotected qty * AvgCost
+    LiveRisk: Optional[float] = None    # sum of leg qty * |Last - stop|, + unprotected qty * Last; needs a price
+    Last: Optional[float] = None
+
+
+@dataclass
+class WhatIfResult:
+    allowed: bool
+    reasons: List[str] = field(default_factory=list)
+    order_risk: float = 0.0
+    order_notional: float = 0.0
+    order_margin: float = 0.0
+    open_risk_after: float = 0.0
+    open_risk_pct_after: Optional[float] = None
+    margin_headroom_after: Optional[float] = None
+
+
+class RiskEngine:
+    """
+    Portfolio-level risk kept up to date incrementally.
+
+    Listens to PortfolioState changes (positions, open orders, account
+    values) and, when attached to IB, to ticker updates. Each event only
+    recomputes the affected symbol and adjusts the portfolio totals by the
+    difference; a full rebuild happens only on PortfolioState resync.
+
+    Totals:
+      - open risk (stop based) in money and as % of NetLiquidation
+      - live risk (last price to stop) for symbols with a quote
+      - margin headroom from AvailableFunds (ExcessLiquidity as fallback)
+      - positions not fully covered by stop orders
+
+    Risk is computed per stop leg. Shares no stop covers count with their
+    whole value (AvgCost for open risk, Last for live risk). Child stops of a
+    bracket whose parent order is still open are not active yet and are ignored.
+
+    what_if() evaluates a proposed order against the caps from project_config
+    (max_portfolio_risk_pct, max_order_risk_pct, min_margin_headroom) without
+    any IB request.
+    """
+
+    def __init__(self, state: PortfolioState, project_config: Optional[dict] = None):
+        self.state = state
+        self.config = project_config or {}
+
+        self._lock = threading.Lock()
+        self._positions: Dict[tuple, dict] = {}        # PortfolioState position key -> row
+        self._stops: Dict[tuple, dict] = {}            # PortfolioState order key -> STP order row
+        self._open_ids: Dict[tuple, tuple] = {}        # order key -> (ClientId, LocalOrderId) of open orders
+        self._keys_by_symbol: Dict[str, Set[tuple]] = {}
+        self._stops_by_symbol: Dict[str, Set[tuple]] = {}
+        self._prices: Dict[str, float] = {}
+        self._account: Dict[str, object] = {}
+
+        self._symbols: Dict[str, SymbolRisk] = {}
+        self._total_open_risk = 0.0
+        self._total_live_risk = 0.0
+
+        state.add_listener(self._on_state_change)
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def attach(self, ib: IB) -> None:
+        """Connect callback: follow ticker updates for live (price-to-stop) risk."""
+        ib.pendingTickersEvent -= self._on_tickers
+        ib.pendingTickersEvent += self._on_tickers
+
+    def rebuild(self) -> None:
+        """Recompute everything from the current PortfolioState snapshot."""
+        positions, orders, account = self.state.keyed_rows()
+
+        with self._lock:
+            self._positions.clear()
+            self._stops.clear()
+            self._open_ids.clear()
+            self._keys_by_symbol.clear()
+            self._stops_by_symbol.clear()
+            self._account = account
+
+            for key, row in positions.items():
+                self._set_position_locked(key, row)
+            for key, row in orders.items():
+                self._set_order_locked(key, row)
+
+            self._symbols.clear()
+            self._total_open_risk = 0.0
+            self._total_live_risk = 0.0
+            for symbol in set(self._keys_by_symbol) | set(self._stops_by_symbol):
+                self._recompute_symbol_locked(symbol)
+
+        logger.info(f"Risk engine rebuilt: {len(self._symbols)} symbols, open risk {self._total_open_risk:.2f}")
+
+    def on_price(self, symbol: str, price: float) -> None:
+        """Feed a last price (also done automatically from IB ticker events)."""
+        if price is None or math.isnan(price) or price <= 0:
+            return
+        with self._lock:
+            self._prices[symbol] = float(price)
+            if symbol in self._symbols:
+                self._recompute_symbol_locked(symbol)
+
+    def snapshot(self) -> dict:
+        """Current portfolio totals and the per-symbol breakdown."""
+        with self._lock:
+            netliq = self._netliq_locked()
+            headroom = self._margin_headroom_locked()
+            return {
+                "open_risk": round(self._total_open_risk, 2),
+                "open_risk_pct": round(self._total_open_risk / netliq * 100, 2) if netliq else None,
+                "live_risk": round(self._total_live_risk, 2),
+                "net_liquidation": netliq,
+                "margin_headroom": headroom,
+                "margin_headroom_pct": round(headroom / netliq * 100, 2) if netliq and headroom is not None else None,
+                "unprotected": sorted(s for s, r in self._symbols.items() if r.UnprotectedQty > 0),
+                "symbols": [vars(r).copy() for r in self._symbols.values()],
+            }
+
+    def what_if(self, symbol: str, action: str, quantity: float, entry_price: float, stop_price: float) -> WhatIfResult:
+        """
+        Evaluate a proposed bracket order (e.g. sized by calculate_position_size).
+        Risk of the order is quantity * |entry - stop|; margin uses the account's
+        current initial margin rate.
+        """
+        quantity = abs(float(quantity or 0))
+        order_risk = quantity * abs(float(entry_price) - float(stop_price))
+        notional = quantity * float(entry_price)
+
+        with self._lock:
+            netliq = self._netliq_locked()
+            headroom = self._margin_headroom_locked()
+            order_margin = notional * self._initial_margin_rate_locked()
+            open_risk_after = self._total_open_risk + order_risk
+
+        result = WhatIfResult(
+            allowed=True,
+            order_risk=round(order_risk, 2),
+            order_notional=round(notional, 2),
+            order_margin=round(order_margin, 2),
+            open_risk_after=round(open_risk_after, 2),
+            open_risk_pct_after=round(open_risk_after / netliq * 100, 2) if netliq else None,
+            margin_headroom_after=round(headroom - order_margin, 2) if headroom is not None else None,
+        )
+
+        max_portfolio_risk_pct = self.config.get("max_portfolio_risk_pct")
+        max_order_risk_pct = self.config.get("max_order_risk_pct")
+        min_margin_headroom = self.config.get("min_margin_headroom")
+
+        if max_portfolio_risk_pct is not None and result.open_risk_pct_after is not None \
+                and result.open_risk_pct_after > max_portfolio_risk_pct:
+            result.reasons.append(
+                f"Portfolio open risk would be {result.open_risk_pct_after}% of NetLiquidation "
+                f"(limit {max_portfolio_risk_pct}%)"
+            )
+        if max_order_risk_pct is not None and netliq and order_risk / netliq * 100 > max_order_risk_pct:
+            result.reasons.append(
+                f"{symbol} order risk {order_risk / netliq * 100:.2f}% of NetLiquidation "
+                f"(limit {max_order_risk_pct}%)"
+            )
+        if min_margin_headroom is not None and result.margin_headroom_after is not None \
+                and result.margin_headroom_after < min_margin_headroom:
+            result.reasons.append(
+                f"Margin headroom would drop to {result.margin_headroom_after} (minimum {min_margin_headroom})"
+            )
+
+        result.allowed = not result.reasons
+        logger.info(f"What-if {action} {quantity:g} {symbol}: allowed={result.allowed} {result.reasons}")
+        return result
+
+    # ----------------------------
+    # EVENT HANDLERS
+    # ----------------------------
+    def _on_state_change(self, kind: str, key, row) -> None:
+        if kind == "resync":
+            self.rebuild()
+            return
+
+        with self._lock:
+            if kind == "position":
+                symbols = self._set_position_locked(key, row)
+            elif kind == "order":
+                symbols = self._set_order_locked(key, row)
+            elif kind == "account":
+                self._account[key] = row
+                return
+            else:
+                return
+
+            for symbol in symbols:
+                self._recompute_symbol_locked(symbol)
+
+    def _on_tickers(self, tickers) -> None:
+        for ticker in tickers:
+            symbol = ticker.contract.symbol if ticker.contract else None
+            if symbol and symbol in self._symbols:
+                self.on_price(symbol, ticker.last if ticker.last == ticker.last else ticker.close)
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _set_position_locked(self, key, row) -> set:
+        """Store / remove one position row, return the symbols to recompute."""
+        touched = set()
+        old = self._positions.pop(key, None)
+        if old is not None:
+            touched.add(old["Symbol"])
+            self._keys_by_symbol.get(old["Symbol"], set()).discard(key)
+        if row is not None and row.get("Symbol"):
+            self._positions[key] = row
+            self._keys_by_symbol.setdefault(row["Symbol"], set()).add(key)
+            touched.add(row["Symbol"])
+        return touched
+
+    def _set_order_locked(self, key, row) -> set:
+        """Store / remove one order row (only stop orders matter), return the symbols to recompute."""
+        touched = set()
+        old = self._stops.pop(key, None)
+        if old is not None:
+            touched.add(old["Symbol"])
+            self._stops_by_symbol.get(old["Symbol"], set()).discard(key)
+        # Any open order can be a bracket parent; its symbol changes when it fills or goes away
+        self._open_ids.pop(key, None)
+        if row is not None and row.get("LocalOrderId"):
+            self._open_ids[key] = (row.get("ClientId"), row["LocalOrderId"])
+            if row.get("Symbol"):
+                touched.add(row["Symbol"])
+        if row is not None and row.get("OrderType") == "STP" and row.get("Symbol"):
+            self._stops[key] = row
+            self._stops_by_symbol.setdefault(row["Symbol"], set()).add(key)
+            touched.add(row["Symbol"])
+        return touched
+
+    def _recompute_symbol_locked(self, symbol: str) -> None:
+        """Recompute one symbol and move the totals by the difference."""
+        old = self._symbols.pop(symbol, None)
+        if old is not None:
+            self._total_open_risk -= old.OpenRisk
+            self._total_live_risk -= old.LiveRisk or 0.0
+
+        rows = [self._positions[k] for k in self._keys_by_symbol.get(symbol, ())]
+        position = sum(float(r["Position"]) for r in rows)
+        if not position:
+            return
+
+        avg_cost = sum(float(r["Position"]) * float(r["AvgCost"]) for r in rows) / position
+        last = self._prices.get(symbol)
+
+        open_parents = set(self._open_ids.values())
+        legs = []
+        for k in self._stops_by_symbol.get(symbol, ()):
+            leg = self._stops[k]
+            # bracket child of an entry that has not filled yet: not protecting anything
+            if leg.get("ParentId") and (leg.get("ClientId"), leg["ParentId"]) in open_parents:
+                continue
+            try:
+                price = float(leg["AuxPrice"])
+            except (TypeError, ValueError):
+                continue
+            if math.isnan(price):
+                continue
+            qty = abs(float(leg.get("Remaining") or leg.get("TotalQty") or 0))
+            if qty:
+                legs.append((price, qty))
+
+        # Stops for more shares than held are scaled down to the position
+        size = abs(position)
+        leg_qty = sum(qty for _, qty in legs)
+        scale = min(1.0, size / leg_qty) if leg_qty else 0.0
+        stop_qty = leg_qty * scale
+        unprotected = max(size - stop_qty, 0.0)
+
+        risk = SymbolRisk(Symbol=symbol, Position=position, AvgCost=avg_cost, StopQty=stop_qty,
+                          UnprotectedQty=unprotected, Last=last)
+        if legs:
+            risk.StopPrice = sum(price * qty for price, qty in legs) / leg_qty
+        risk.OpenRisk = sum(qty * scale * abs(price - avg_cost) for price, qty in legs) + unprotected * abs(avg_cost)
+        if last is not None:
+            risk.LiveRisk = sum(qty * scale * abs(last - price) for price, qty in legs) + unprotected * last
+
+        self._symbols[symbol] = risk
+        self._total_open_risk += risk.OpenRisk
+        self._total_live_risk += risk.LiveRisk or 0.0
+
+    def _netliq_locked(self) -> Optional[float]:
+        value = self._account.get("NetLiquidation")
+        return float(value) if isinstance(value, (int, float)) and value > 0 else None
+
+    def _margin_headroom_locked(self) -> Optional[float]:
+        # AvailableFunds is what initial margin of a new order is taken from
+        for tag in ("AvailableFunds", "ExcessLiquidity"):
+            value = self._account.get(tag)
+            if isinstance(value, (int, float)):
+                return float(value)
+        return None
+
+    def _initial_margin_rate_locked(self) -> float:
+        init_margin = self._account.get("InitMarginReq")
+        gross = self._account.get("GrossPositionValue")
+        if isinstance(init_margin, (int, float)) and isinstance(gross, (int, float)) and gross > 0:
+            return float(init_margin) / float(gross)
+        return self.config.get("initial_margin_rate", DEFAULT_INITIAL_MARGIN_RATE)
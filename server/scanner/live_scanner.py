@@ -0,0 +1,240 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from ib_insync import IB, ScanDataList, ScannerSubscription
+
+from ibsession.contract_cache import contract_cache
+from scanner.scan import get_presets
+from scanner.scan_results import enrich_scan_results
+from helpers.utils import sanitize_for_json
+
+logger = logging.getLogger(__name__)
+
+# IB allows only a handful of simultaneous scanner subscriptions
+MAX_LIVE_SCANS = 10
+
+# Enriched fields copied from enrich_scan_results rows
+ENRICHED_FIELDS = ("last_price", "yesterday_close", "change", "rvol", "current_volume", "avg_volume")
+
+# Read from live_bars.indicators on every read()
+INDICATOR_FIELDS = ("vwap", "ema", "atr")
+
+
+@dataclass
+class LiveScan:
+    preset: str
+    subscription: ScannerSubscription
+    scan_data: Optional[ScanDataList] = None
+    rows: List[dict] = field(default_factory=list)     # rank order: {"symbol", "rank", "contract"}
+    updated_at: Optional[float] = None
+    last_read: float = field(default_factory=time.monotonic)
+
+
+class LiveScanner:
+    """
+    Streaming IB scanner subscriptions for SCANNER_PRESETS entries.
+
+    Each started preset keeps a reqScannerSubscription open. Every update is
+    diffed against the previous rank list; only symbols that newly entered
+    (or whose enrichment is older than `refresh_after`) are queued for the
+    snapshot / close / RVOL enrichment, which a worker thread runs through the
+    IB session. read() then just joins the current ranks with the per-symbol
+    enrichment from memory (RVOL and VWAP / EMA / ATR from live_bars when the
+    symbol is watched there).
+
+    Presets nobody read for `idle_timeout` seconds are cancelled. Register
+    attach() as an IB session connect callback to resubscribe after a reconnect.
+    """
+
+    def __init__(self, ib_session, time_zone: str, bar_store=None, volume_profiles=None, live_bars=None,
+                 refresh_after: float = 300.0, idle_timeout: float = 600.0, max_scans: int = MAX_LIVE_SCANS):
+        self.ib_session = ib_session
+        self.time_zone = time_zone
+        self.bar_store = bar_store
+        self.volume_profiles = volume_profiles
+        self.live_bars = live_bars
+        self.refresh_after = refresh_after
+        self.idle_timeout = idle_timeout
+        self.max_scans = max_scans
+
+        self._scans: Dict[str, LiveScan] = {}
+        self._enriched: Dict[str, dict] = {}           # symbol -> enriched fields + "enriched_at"
+        self._pending: Dict[str, dict] = {}            # symbol -> scanner row waiting for enrichment
+        self._work: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    def start(self, preset: str) -> None:
+        """Open the streaming subscription for a preset (no-op when already live)."""
+        params = get_presets(preset)
+        with self._lock:
+            if preset in self._scans:
+                self._scans[preset].last_read = time.monotonic()
+                return
+            if len(self._scans) >= self.max_scans:
+                raise RuntimeError(f"At most {self.max_scans} live scans, stop one first")
+            scan = LiveScan(preset=preset, subscription=ScannerSubscription(**params))
+            self._scans[preset] = scan
+
+        self._ensure_worker()
+        try:
+            self.ib_session.run(self._subscribe, scan)
+        except Exception:
+            with self._lock:
+                self._scans.pop(preset, None)
+            raise
+
+    def stop(self, preset: str) -> None:
+        with self._lock:
+            scan = self._scans.pop(preset, None)
+        if scan is not None and scan.scan_data is not None:
+            self.ib_session.run(self._cancel, scan)
+            logger.info(f"Live scan '{preset}' stopped")
+
+    def read(self, preset: str) -> Optional[dict]:
+        """Current ranks of a live preset joined with the cached enrichment, None if not live."""
+        with self._lock:
+            scan = self._scans.get(preset)
+            if scan is None:
+                return None
+            scan.last_read = time.monotonic()
+
+            results = []
+            for row in scan.rows:
+                enriched = self._enriched.get(row["symbol"], {})
+                item = {"contract": row["contract"], "rank": row["rank"], "symbol": row["symbol"]}
+                item.update({k: enriched.get(k) for k in ENRICHED_FIELDS})
+                live = self.live_bars.rvol(row["symbol"]) if self.live_bars is not None else None
+                if live is not None:
+                    item.update(live)
+                indicators = (self.live_bars.indicators.get(row["symbol"]) if self.live_bars is not None else None) or {}
+                item.update({k: indicators.get(k) for k in INDICATOR_FIELDS})
+                item["enriched"] = row["symbol"] in self._enriched
+                results.append(item)
+
+            age = None if scan.updated_at is None else round(time.time() - scan.updated_at, 3)
+
+        return {"results": sanitize_for_json(results), "live": True, "age_seconds": age}
+
+    def live_presets(self) -> List[str]:
+        with self._lock:
+            return list(self._scans)
+
+    def attach(self, ib: IB) -> None:
+        """Connect callback: subscriptions die with the connection, open them again."""
+        with self._lock:
+            scans = list(self._scans.values())
+        for scan in scans:
+            self._subscribe(ib, scan)
+
+    # ----------------------------
+    # IB THREAD
+    # ----------------------------
+    def _subscribe(self, ib: IB, scan: LiveScan) -> None:
+        scan.scan_data = ib.reqScannerSubscription(scan.subscription)
+        scan.scan_data.updateEvent += lambda data, preset=scan.preset: self._on_update(preset, data)
+        logger.info(f"Live scan '{scan.preset}' subscribed")
+
+    @staticmethod
+    def _cancel(ib: IB, scan: LiveScan) -> None:
+        ib.cancelScannerSubscription(scan.scan_data)
+
+    def _on_update(self, preset: str, scan_data: ScanDataList) -> None:
+        rows = []
+        for item in scan_data:
+            contract = item.contractDetails.contract if item.contractDetails else None
+            if contract is None or not contract.symbol:
+                continue
+            contract_cache.put(contract)
+            rows.append({"symbol": contract.symbol, "rank": item.rank, "contract": dict(contract.__dict__)})
+
+        now = time.monotonic()
+        with self._lock:
+            scan = self._scans.get(preset)
+            if scan is None:
+                return
+            previous = {r["symbol"] for r in scan.rows}
+            current = {r["symbol"] for r in rows}
+            scan.rows = rows
+            scan.updated_at = time.time()
+
+            # Symbols that stayed listed keep their enrichment; new entrants (unless
+            # another preset already enriched them) and stale ones go to the worker
+            to_enrich = [
+                r for r in rows
+                if r["symbol"] not in self._pending
+                and now - self._enriched.get(r["symbol"], {}).get("enriched_at", float("-inf")) > self.refresh_after
+            ]
+            for row in to_enrich:
+                self._pending[row["symbol"]] = row
+
+        entered, left = current - previous, previous - current
+        if entered or left:
+            logger.info(f"Live scan '{preset}': +{sorted(entered)} -{sorted(left)}")
+        if to_enrich:
+            logger.info(f"Live scan '{preset}': enriching {[r['symbol'] for r in to_enrich]}")
+            self._work.put(to_enrich)
+
+    # ----------------------------
+    # WORKER THREAD
+    # ----------------------------
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, name="live-scanner", daemon=True)
+                self._worker.start()
+
+    def _run_worker(self) -> None:
+        while True:
+            try:
+                batch = self._work.get(timeout=30)
+            except queue.Empty:
+                self._stop_idle()
+                continue
+
+            # Merge whatever else is queued into one enrichment round
+            while not self._work.empty():
+                batch.extend(self._work.get_nowait())
+
+            try:
+                enriched = enrich_scan_results(
+                    self.ib_session, batch, self.time_zone, self.bar_store, self.volume_profiles, self.live_bars
+                )
+            except Exception as e:
+                logger.error(f"Live scan enrichment failed: {e}")
+                enriched = []
+
+            now = time.monotonic()
+            with self._lock:
+                for item in enriched:
+                    fields = {k: item.get(k) for k in ENRICHED_FIELDS}
+                    fields["enriched_at"] = now
+                    self._enriched[item["symbol"]] = fields
+                for row in batch:
+                    self._pending.pop(row["symbol"], None)
+
+            self._stop_idle()
+
+    def _stop_idle(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            idle = [p for p, s in self._scans.items() if now - s.last_read > self.idle_timeout]
+
+            # Forget enrichment of symbols that dropped out of every scan
+            listed = {r["symbol"] for s in self._scans.values() for r in s.rows}
+            for symbol in [s for s, e in self._enriched.items()
+                           if s not in listed and now - e["enriched_at"] > self.refresh_after]:
+                del self._enriched[symbol]
+        for preset in idle:
+            logger.info(f"Live scan '{preset}' not read for {self.idle_timeout}s")
+            try:
+                self.stop(preset)
+            except Exception as e:
+                logger.error(f"Could not stop live scan '{preset}': {e}")
@@ -1,4 +1,7 @@
 
+import asyncio
+import logging
+
 from ib_async import IB, ScannerSubscription
 from ib_async.contract import Contract, Stock,util
 import pandas as pd
@@ -10,6 +13,8 @@ from datetime import datetime
 from scanner.scanner_presets import SCANNER_PRESETS
 from typing import Tuple,Dict,List, Optional
 
+logger = logging.getLogger(__name__)
+
 
 def get_presets(name: str) -> dict:
 
@@ -36,3 +41,26 @@ def run_scanner(ib: IB, preset_name: str, **overrides) -> Tuple[ScannerSubscript
 
     return sub, df_scan
 
+
+def run_scanners(ib: IB, preset_names: List[str], **overrides) -> Dict[str, pd.DataFrame]:
+    """
+    Run several presets at once: all scanner requests are in flight together
+    instead of one after another. A failing preset gets an empty DataFrame.
+    """
+    subs = {}
+    for name in preset_names:
+        params = get_presets(name).copy()
+        params.update(overrides)
+        subs[name] = ScannerSubscription(**params)
+
+    async def request_all():
+        return await asyncio.gather(*(ib.reqScannerDataAsync(sub) for sub in subs.values()), return_exceptions=True)
+
+    results = {}
+    for name, scan in zip(subs, ib.run(request_all())):
+        if isinstance(scan, Exception):
+            logger.error(f"Scanner preset '{name}' failed: {scan}")
+            results[name] = pd.DataFrame()
+        else:
+            results[name] = util.df(scan) if scan else pd.DataFrame()
+    return results
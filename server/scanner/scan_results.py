@@ -0,0 +1,280 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.calculate import calculate_position_sizes
+from helpers.handle_market_scan import fetch_snapshot_prices, fetch_yesterday_close_async, handle_scandata_from_ib
+from helpers.handle_rvol_operations import compute_rvol_from_clean_data_async
+from helpers.utils import log_scan_results, sanitize_for_json
+from scanner.scan import run_scanner, run_scanners
+
+logger = logging.getLogger(__name__)
+
+
+def enrich_scan_results(ib_session, clean_data: list, time_zone: str, bar_store=None, volume_profiles=None,
+                        live_bars=None) -> List[dict]:
+    """
+    Add last price, yesterday close, change % and RVOL to scanner rows
+    (rank + symbol + contract dicts from handle_scandata_from_ib).
+    Symbols watched by live_bars (LiveBarEngine) take their RVOL from memory,
+    only the others are downloaded; they also get VWAP / EMA / ATR from live_bars.indicators.
+    """
+    if not clean_data:
+        return []
+
+    # Fetch snapshot last prices and yesterday close
+    # Multi-symbol history runs as a loop task so order jobs are not queued behind it
+    snapshot = ib_session.run(fetch_snapshot_prices, clean_data)
+    yclose = ib_session.run_async(fetch_yesterday_close_async, clean_data, timeout=120)
+
+    # Compute RVOL
+    rvol_map = {}
+    if live_bars is not None:
+        for item in clean_data:
+            live = live_bars.rvol(item.get("symbol") or "")
+            if live is not None:
+                rvol_map[item["symbol"]] = live
+    missing = [item for item in clean_data if item.get("symbol") not in rvol_map]
+    if missing:
+        rvol_map.update(ib_session.run_async(
+            compute_rvol_from_clean_data_async, missing, time_zone,
+            bar_store=bar_store, volume_profiles=volume_profiles, timeout=300
+        ))
+
+    for symbol, rvol_info in rvol_map.items():
+        logger.info(f"{symbol}: RVOL={rvol_info.get('rvol')}, "
+                    f"Current Volume={rvol_info.get('current_volume')}, "
+                    f"Avg Volume={rvol_info.get('avg_volume')}")
+
+    # Merge into results in desired order
+    flat_results = []
+    for item in clean_data:
+        symbol = item.get("symbol")
+
+        last_price = snapshot["Symbol"].get(symbol, {}).get("last_price")
+        yesterday_close = yclose["Symbol"].get(symbol, {}).get("yesterday_close")
+
+        if last_price is not None and yesterday_close:
+            change_pct = round((last_price - yesterday_close) / yesterday_close * 100, 2)
+        else:
+            change_pct = None
+
+        rvol_info = rvol_map.get(symbol, {})
+        indicators = (live_bars.indicators.get(symbol) if live_bars is not None else None) or {}
+
+        flat_results.append({
+            "contract": item.get("contract"),  # keep untouched
+            "last_price": last_price,
+            "rank": item.get("rank"),
+            "symbol": symbol,
+            "yesterday_close": yesterday_close,
+            "change": change_pct,
+            "rvol": rvol_info.get("rvol"),
+            "current_volume": rvol_info.get("current_volume"),
+            "avg_volume": rvol_info.get("avg_volume"),
+            "vwap": indicators.get("vwap"),
+            "ema": indicators.get("ema"),
+            "atr": indicators.get("atr"),
+        })
+
+    return flat_results
+
+
+def build_scan_results(ib_session, preset_name: str, time_zone: str, overrides: Optional[dict] = None,
+                       bar_store=None, volume_profiles=None, live_bars=None) -> List[dict]:
+    """Run one scanner preset and return its enriched, JSON-safe result rows."""
+    sub, df_scan = ib_session.run(run_scanner, preset_name, **(overrides or {}))
+    if df_scan is None or df_scan.empty:
+        logger.warning(f"Scanner returned NO RESULTS for preset '{preset_name}'")
+        return []
+
+    # Extract clean data (rank + symbol + contract dict)
+    clean_data = handle_scandata_from_ib(df_scan)
+    logger.info(f"Scanner returned {len(clean_data)} results for preset '{preset_name}'")
+
+    flat_results = enrich_scan_results(ib_session, clean_data, time_zone, bar_store, volume_profiles, live_bars)
+
+    # Sanitize results before returning to UI
+    clean_output = sanitize_for_json(flat_results)
+    # Dump readable results into ib_scanner.log
+    log_scan_results(preset_name, clean_output)
+    logger.info(f"Final scanner results prepared with {len(clean_output)} entries.")
+    return clean_output
+
+
+def build_multi_scan_results(ib_session, preset_names: List[str], time_zone: str, overrides: Optional[dict] = None,
+                             bar_store=None, volume_profiles=None, live_bars=None) -> List[dict]:
+    """
+    Run several presets together and merge them by symbol.
+    Each row carries the presets that found the symbol with its rank in each
+    ("presets", "ranks") and the best rank; every unique symbol is enriched once.
+    Rows are ordered by number of hits, then best rank.
+    """
+    scans = ib_session.run(run_scanners, preset_names, **(overrides or {}))
+
+    merged: Dict[str, dict] = {}
+    for preset_name in preset_names:
+        df_scan = scans.get(preset_name)
+        if df_scan is None or df_scan.empty:
+            logger.warning(f"Scanner returned NO RESULTS for preset '{preset_name}'")
+            continue
+
+        for item in handle_scandata_from_ib(df_scan):
+            symbol = item.get("symbol")
+            if not symbol:
+                continue
+            row = merged.setdefault(symbol, {"symbol": symbol, "contract": item.get("contract"), "ranks": {}})
+            row["ranks"][preset_name] = item.get("rank")
+
+    unique = []
+    for row in merged.values():
+        ranks = [r for r in row["ranks"].values() if r is not None]
+        unique.append({"symbol": row["symbol"], "contract": row["contract"], "rank": min(ranks) if ranks else None})
+
+    total_hits = sum(len(r["ranks"]) for r in merged.values())
+    logger.info(
+        f"Presets {preset_names} returned {total_hits} rows, {len(unique)} unique symbols to enrich"
+    )
+
+    flat_results = enrich_scan_results(ib_session, unique, time_zone, bar_store, volume_profiles, live_bars)
+    for item in flat_results:
+        ranks = merged[item["symbol"]]["ranks"]
+        item["presets"] = list(ranks)
+        item["ranks"] = ranks
+        item["best_rank"] = item.pop("rank")
+
+    flat_results.sort(key=lambda r: (-len(r["presets"]), r["best_rank"] if r["best_rank"] is not None else float("inf")))
+
+    clean_output = sanitize_for_json(flat_results)
+    log_scan_results("+".join(preset_names), clean_output)
+    return clean_output
+
+
+def size_scan_rows(rows: List[dict], risk: float, lot_size: int = 1, max_notional=None,
+                   atr_multiplier: float = 1.5) -> List[dict]:
+    """
+    Size a whole scanner table in one calculate_position_sizes pass.
+    Entry is last_price, the stop last_price - atr_multiplier * atr (long side);
+    rows without an ATR (symbol not watched by live bars) get position_size 0
+    and reason invalid_input. Returns copies, cached rows are not modified.
+    """
+    if not rows:
+        return []
+
+    entries = np.array([r.get("last_price") if r.get("last_price") is not None else np.nan for r in rows], dtype=float)
+    atrs = np.array([r.get("atr") if r.get("atr") is not None else np.nan for r in rows], dtype=float)
+    stops = entries - atr_multiplier * atrs
+
+    sizes = calculate_position_sizes(entries, stops, risk, lot_size=lot_size, max_notional=max_notional)
+
+    sized = []
+    for row, stop, size in zip(rows, stops, sizes.itertuples()):
+        item = dict(row)
+        item["stop_price"] = round(float(stop), 2) if np.isfinite(stop) else None
+        item["position_size"] = int(size.position_size)
+        item["size_reason"] = size.reason
+        sized.append(item)
+    return sized
+
+
+class ScanResultCache:
+    """
+    Scanner results per (preset, overrides) with single-flight and stale-while-revalidate.
+
+      - younger than `ttl`:              served from the cache
+      - older, but younger than `stale_ttl`: served right away, one background
+                                         refresh is started
+      - missing / older than `stale_ttl`: computed; concurrent identical requests
+                                         wait for that one computation instead of
+                                         starting their own
+    Failed computations are not cached, every waiter gets the exception.
+    """
+
+    def __init__(self, ttl: float = 30.0, stale_ttl: float = 300.0):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+
+        self._entries: Dict[tuple, Tuple[float, object]] = {}   # key -> (computed_at, result)
+        self._in_flight: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # PUBLIC METHODS
+    # ----------------------------
+    @staticmethod
+    def make_key(preset_name: str, overrides: Optional[dict] = None) -> tuple:
+        return (preset_name, tuple(sorted((overrides or {}).items())))
+
+    def get(self, key: tuple, producer: Callable[[], object], force: bool = False, timeout: Optional[float] = None):
+        """
+        Return (result, info) for the key, computing it with producer() when needed.
+        info: {"cached": bool, "stale": bool, "age_seconds": float}
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            age = now - entry[0] if entry else None
+
+            if entry and not force and age < self.ttl:
+                return entry[1], self._info(True, False, age)
+
+            if entry and not force and age < self.stale_ttl:
+                if key not in self._in_flight:
+                    self._start_locked(key, producer, background=True)
+                return entry[1], self._info(True, True, age)
+
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._start_locked(key, producer, background=False)
+
+        if leader:
+            self._compute(key, producer, future)
+        else:
+            logger.info(f"Waiting for in-flight scan {key}")
+
+        result = future.result(timeout=timeout)
+        return result, self._info(not leader, False, 0.0 if leader else time.monotonic() - now)
+
+    def invalidate(self, key: Optional[tuple] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    # ----------------------------
+    # INTERNAL METHODS
+    # ----------------------------
+    def _start_locked(self, key: tuple, producer: Callable[[], object], background: bool) -> Future:
+        future: Future = Future()
+        self._in_flight[key] = future
+        if background:
+            logger.info(f"Serving stale scan {key}, refreshing in background")
+            threading.Thread(
+                target=self._compute, args=(key, producer, future), name="scan-refresh", daemon=True
+            ).start()
+        return future
+
+    def _compute(self, key: tuple, producer: Callable[[], object], future: Future) -> None:
+        try:
+            result = producer()
+        except Exception as e:
+            logger.error(f"Scan {key} failed: {e}")
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._in_flight.pop(key, None)
+        future.set_result(result)
+
+    @staticmethod
+    def _info(cached: bool, stale: bool, age: float) -> dict:
+        return {"cached": cached, "stale": stale, "age_seconds": round(age, 3)}